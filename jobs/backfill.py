@@ -9,12 +9,15 @@ from run_jobs import (
     sb_exec,
     fetch_schedule,
     upsert_games_and_results,
-    upsert_game_results_from_gamecenter,
-    upsert_player_stats_from_boxscore,
+    ingest_game,
+    drain_retry_queue,
+    flush_play_by_play,
     ensure_model_version,
     generate_poc_projections,
     upsert_team_directory,
 )
+from retry_queue import RetryQueue
+from work_claims import WorkClaimer
 
 load_dotenv(dotenv_path=".env")
 
@@ -26,8 +29,15 @@ def _parse_date(s: str) -> date:
     return date.fromisoformat(s)
 
 
-def backfill(start_date: date, end_date: date, include_projections: bool, model_version: str):
+def backfill(
+    start_date: date, end_date: date, include_projections: bool, model_version: str, redo_after_hours: float = 12.0
+):
     sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    # Several backfill workers can run over the same range; each game is ingested by one of them.
+    claimer = WorkClaimer(sb, "game_ingest", redo_after_seconds=int(redo_after_hours * 3600))
+    queue = RetryQueue(sb).load()
+    # ingest_game hands back the rows it wrote; backfill doesn't need them, so they're dropped per batch.
+    ingested: dict[str, list[dict]] = {"games": [], "game_results": [], "player_game_stats": []}
 
     run = sb_exec(sb.table("ingestion_runs").insert({"job_name": "historical_backfill"}), "ingestion_runs")
     run_id = run.data[0]["run_id"] if run.data else None
@@ -39,6 +49,8 @@ def backfill(start_date: date, end_date: date, include_projections: bool, model_
         except Exception as e:
             print(f"[teams] directory refresh failed (continuing): {e}")
 
+        drain_retry_queue(sb, queue, claimer, ingested)
+
         all_game_ids: list[int] = []
 
         d = start_date
@@ -49,17 +61,18 @@ def backfill(start_date: date, end_date: date, include_projections: bool, model_
             g_rows = sb.table("games").select("game_id").eq("game_date", d.isoformat()).execute()
             print(f"[games] {d.isoformat()} -> {len(g_rows.data or [])} games in DB")
 
-            for r in (g_rows.data or []):
-                gid = r["game_id"]
-                try:
-                    upsert_game_results_from_gamecenter(sb, gid)
-                    upsert_player_stats_from_boxscore(sb, gid)
-                except Exception as e:
-                    print(f"[backfill] failed for game_id={gid}: {e}")
+            for batch in claimer.claim_batches(r["game_id"] for r in (g_rows.data or [])):
+                done = [gid for gid in batch if ingest_game(sb, gid, ingested, queue)]
+                claimer.release(done)
+                claimer.release(set(batch) - set(done), completed=False)
+                ingested["game_results"].clear()
+                ingested["player_game_stats"].clear()
 
             all_game_ids.extend([r["game_id"] for r in (g_rows.data or [])])
             d += timedelta(days=1)
 
+        flush_play_by_play()
+
         if include_projections and all_game_ids:
             ensure_model_version(sb, model_version)
             generate_poc_projections(sb, sorted(set(all_game_ids)), model_version=model_version)
@@ -88,6 +101,12 @@ def main():
     parser.add_argument("--end", required=True, help="End date (YYYY-MM-DD)")
     parser.add_argument("--include-projections", action="store_true", help="Also generate projections")
     parser.add_argument("--model-version", default="0.1.0", help="Model version for projections")
+    parser.add_argument(
+        "--redo-after-hours",
+        type=float,
+        default=12.0,
+        help="Skip games any worker ingested more recently than this (0 redoes everything)",
+    )
     args = parser.parse_args()
 
     start_date = _parse_date(args.start)
@@ -95,7 +114,13 @@ def main():
     if end_date < start_date:
         raise ValueError("end date must be >= start date")
 
-    backfill(start_date, end_date, include_projections=args.include_projections, model_version=args.model_version)
+    backfill(
+        start_date,
+        end_date,
+        include_projections=args.include_projections,
+        model_version=args.model_version,
+        redo_after_hours=args.redo_after_hours,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+"""
+Walk-forward backtest of the baseline model over historical seasons.
+
+History is loaded from Supabase once. Slates are replayed in date order with as-of features
+(only games before the slate date are visible, league average included), and the moneyline
+probabilities are scored against game_results. Date ranges are sharded across a process pool.
+
+    python jobs/backtest.py --start 2024-10-04 --end 2025-04-17 --workers 4
+"""
+import bisect
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import cast
+
+from supabase import create_client
+
+from model_pipeline import (
+    MODEL_VERSION,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    build_game_projections,
+    build_team_game_rows,
+    compute_team_features_for_games,
+    fetch_game_results,
+    fetch_games,
+    to_date,
+)
+
+CALIBRATION_BUCKETS = 10
+PROB_EPS = 1e-6
+
+# Worker state, set once per process by _init_worker.
+_STATE: dict = {}
+
+
+def league_avg_index(team_rows: list[dict]) -> tuple[list[date], list[int], list[int]]:
+    """
+    Cumulative league goals/team-games by date: (dates, goals, rows) where goals[i] and rows[i]
+    cover every team row strictly before dates[i] (the last entry covers everything).
+    """
+    goals_by_date: dict[date, list[int]] = defaultdict(lambda: [0, 0])
+    for r in team_rows:
+        acc = goals_by_date[r["game_date"]]
+        acc[0] += r.get("goals_for") or 0
+        acc[1] += 1
+    dates = sorted(goals_by_date)
+    goals = [0]
+    rows = [0]
+    for d in dates:
+        goals.append(goals[-1] + goals_by_date[d][0])
+        rows.append(rows[-1] + goals_by_date[d][1])
+    return dates, goals, rows
+
+
+def league_avg_as_of(index: tuple[list[date], list[int], list[int]], d: date, default: float) -> float:
+    dates, goals, rows = index
+    i = bisect.bisect_left(dates, d)
+    return goals[i] / rows[i] if rows[i] else default
+
+
+def empty_metrics() -> dict:
+    return {
+        "games": 0,
+        "log_loss_sum": 0.0,
+        "brier_sum": 0.0,
+        "correct": 0,
+        "buckets": [[0, 0.0, 0] for _ in range(CALIBRATION_BUCKETS)],  # [count, sum_pred, wins]
+    }
+
+
+def score_game(metrics: dict, p_home: float, home_won: bool):
+    p = min(1.0 - PROB_EPS, max(PROB_EPS, p_home))
+    y = 1.0 if home_won else 0.0
+    metrics["games"] += 1
+    metrics["log_loss_sum"] += -(y * math.log(p) + (1.0 - y) * math.log(1.0 - p))
+    metrics["brier_sum"] += (p_home - y) ** 2
+    metrics["correct"] += int((p_home >= 0.5) == home_won)
+    b = metrics["buckets"][min(CALIBRATION_BUCKETS - 1, int(p_home * CALIBRATION_BUCKETS))]
+    b[0] += 1
+    b[1] += p_home
+    b[2] += int(home_won)
+
+
+def merge_metrics(parts: list[dict]) -> dict:
+    out = empty_metrics()
+    for m in parts:
+        out["games"] += m["games"]
+        out["log_loss_sum"] += m["log_loss_sum"]
+        out["brier_sum"] += m["brier_sum"]
+        out["correct"] += m["correct"]
+        for acc, b in zip(out["buckets"], m["buckets"]):
+            acc[0] += b[0]
+            acc[1] += b[1]
+            acc[2] += b[2]
+    return out
+
+
+def summarize(metrics: dict) -> dict:
+    n = metrics["games"]
+    return {
+        "games": n,
+        "log_loss": metrics["log_loss_sum"] / n if n else None,
+        "brier": metrics["brier_sum"] / n if n else None,
+        "accuracy": metrics["correct"] / n if n else None,
+        "calibration": [
+            {
+                "bucket": f"{i / CALIBRATION_BUCKETS:.1f}-{(i + 1) / CALIBRATION_BUCKETS:.1f}",
+                "games": b[0],
+                "mean_pred": b[1] / b[0],
+                "observed": b[2] / b[0],
+            }
+            for i, b in enumerate(metrics["buckets"])
+            if b[0]
+        ],
+    }
+
+
+def _init_worker(team_rows: list[dict], results_by_game: dict[int, dict], window: int):
+    _STATE["team_rows"] = team_rows
+    _STATE["results_by_game"] = results_by_game
+    _STATE["window"] = window
+    _STATE["league_avg_index"] = league_avg_index(team_rows)
+    _STATE["default_league_avg"] = (
+        sum(r.get("goals_for") or 0 for r in team_rows) / max(1, len(team_rows))
+    )
+
+
+def backtest_shard(slates: list[tuple[date, list[dict]]]) -> dict:
+    team_rows = _STATE["team_rows"]
+    results_by_game = _STATE["results_by_game"]
+    metrics = empty_metrics()
+    if not slates:
+        return metrics
+
+    # Features are as-of each game's date (strictly earlier games only), so one call covers the shard.
+    shard_games = [g for _, games in slates for g in games]
+    team_features = compute_team_features_for_games(team_rows, shard_games, window=_STATE["window"])
+
+    for d, games in slates:
+        league_avg = league_avg_as_of(_STATE["league_avg_index"], d, _STATE["default_league_avg"])
+        for proj in build_game_projections(games, team_features, league_avg):
+            res = results_by_game[proj["game_id"]]
+            score_game(metrics, proj["home_win_prob"], res["home_goals"] > res["away_goals"])
+    return metrics
+
+
+def shard_slates(slates: list[tuple[date, list[dict]]], n_shards: int) -> list[list[tuple[date, list[dict]]]]:
+    """Split date-ordered slates into contiguous shards of roughly equal game counts."""
+    total = sum(len(games) for _, games in slates)
+    target = max(1, math.ceil(total / max(1, n_shards)))
+    shards: list[list[tuple[date, list[dict]]]] = [[]]
+    count = 0
+    for slate in slates:
+        if count >= target and len(shards) < n_shards:
+            shards.append([])
+            count = 0
+        shards[-1].append(slate)
+        count += len(slate[1])
+    return [s for s in shards if s]
+
+
+def run_backtest(
+    games: list[dict],
+    results_by_game: dict[int, dict],
+    start: date,
+    end: date,
+    window: int = 10,
+    workers: int = 1,
+) -> dict:
+    team_rows = build_team_game_rows(games, results_by_game)
+
+    by_date: dict[date, list[dict]] = defaultdict(list)
+    for g in games:
+        gdate = to_date(g["game_date"])
+        if start <= gdate <= end and g["game_id"] in results_by_game:
+            res = results_by_game[g["game_id"]]
+            if res.get("home_goals") is not None and res.get("away_goals") is not None:
+                by_date[gdate].append(g)
+    slates = sorted(by_date.items())
+
+    if workers <= 1:
+        _init_worker(team_rows, results_by_game, window)
+        return summarize(backtest_shard(slates))
+
+    shards = shard_slates(slates, workers)
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+    with ProcessPoolExecutor(
+        max_workers=len(shards) or 1,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(team_rows, results_by_game, window),
+    ) as pool:
+        parts = list(pool.map(backtest_shard, shards))
+    return summarize(merge_metrics(parts))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=f"Walk-forward backtest of {MODEL_VERSION}.")
+    parser.add_argument("--start", required=True, help="First slate date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Last slate date (YYYY-MM-DD)")
+    parser.add_argument("--history-days", type=int, default=730, help="History loaded before --start")
+    parser.add_argument("--window", type=int, default=10, help="Rolling window (games)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", help="Write metrics JSON here")
+    args = parser.parse_args()
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end)
+    if end < start:
+        raise ValueError("end date must be >= start date")
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    t0 = time.perf_counter()
+    games = fetch_games(sb, start - timedelta(days=args.history_days), end)
+    results_by_game = fetch_game_results(sb, [g["game_id"] for g in games])
+    t1 = time.perf_counter()
+    summary = run_backtest(games, results_by_game, start, end, window=args.window, workers=args.workers)
+    t2 = time.perf_counter()
+
+    summary.update(
+        {
+            "model_version": MODEL_VERSION,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "load_seconds": round(t1 - t0, 3),
+            "backtest_seconds": round(t2 - t1, 3),
+        }
+    )
+    print(
+        f"[backtest] {summary['games']} games  log_loss={summary['log_loss']}  brier={summary['brier']}  "
+        f"(load {summary['load_seconds']}s, backtest {summary['backtest_seconds']}s)"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[backtest] wrote {args.out}")
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Benchmark player feature building: the dict/bisect implementation the pipeline used to ship
+against the array-backed PlayerHistoryIndex. Uses synthetic data shaped like a real history
+pull (~100k skater rows over two seasons) and a season of projection games.
+
+    python jobs/bench_player_features.py --rows 100000 --proj-games 1300
+
+Each variant runs in its own process so peak RSS is measured independently.
+"""
+import bisect
+import multiprocessing as mp
+import random
+import resource
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import cast
+
+from model_pipeline import build_player_features_for_games, season_string_for_date, to_date
+
+
+def legacy_build_player_features_for_games(
+    stats_rows: list[dict],
+    game_date_by_id: dict[int, date],
+    proj_games: list[dict],
+    rosters_by_team_season: dict[tuple[int, str], list[int]],
+    window: int = 10,
+) -> dict[tuple[int, int], dict]:
+    by_player = defaultdict(list)
+    for r in stats_rows:
+        if r.get("is_goalie"):
+            continue
+        gid = r.get("game_id")
+        if gid is None:
+            continue
+        gdate = game_date_by_id.get(int(gid))
+        if not gdate:
+            continue
+        rr = dict(r)
+        rr["game_date"] = gdate
+        by_player[int(r["player_id"])].append(rr)
+
+    player_dates: dict[int, list[date]] = {}
+    for pid in by_player:
+        by_player[pid].sort(key=lambda x: x["game_date"])
+        player_dates[pid] = [cast(date, r["game_date"]) for r in by_player[pid]]
+
+    features: dict[tuple[int, int], dict] = {}
+    for g in proj_games:
+        gid = int(g["game_id"])
+        gdate = to_date(g["game_date"])
+        season = season_string_for_date(gdate)
+        for team_id in (int(g["home_team_id"]), int(g["away_team_id"])):
+            roster_ids = rosters_by_team_season.get((team_id, season)) or []
+            for pid in roster_ids:
+                rows = by_player.get(pid) or []
+                dates = player_dates.get(pid) or []
+                idx = bisect.bisect_left(dates, gdate)
+                recent = rows[max(0, idx - window) : idx]
+                if recent:
+                    shots = sum(x.get("shots") or 0 for x in recent) / len(recent)
+                    goals = sum(x.get("goals") or 0 for x in recent) / len(recent)
+                    toi = sum(x.get("toi_seconds") or 0 for x in recent) / len(recent)
+                    shooting_pct = (goals / shots) if shots else None
+                else:
+                    shots = goals = toi = shooting_pct = None
+                features[(gid, pid)] = {
+                    "shots_avg": shots,
+                    "goals_avg": goals,
+                    "toi_avg": toi,
+                    "shooting_pct": shooting_pct,
+                    "team_id": team_id,
+                }
+    return features
+
+
+def synthetic_inputs(n_rows: int, n_proj_games: int, seed: int = 7):
+    rng = random.Random(seed)
+    n_teams = 32
+    skaters_per_team = 18
+    roster = {t: list(range(t * 100, t * 100 + skaters_per_team + 4)) for t in range(1, n_teams + 1)}
+
+    stats_rows: list[dict] = []
+    game_date_by_id: dict[int, date] = {}
+    start = date(2024, 10, 1)
+    gid = 1
+    day = 0
+    while len(stats_rows) < n_rows:
+        d = start + timedelta(days=day % 560)
+        teams = list(roster)
+        rng.shuffle(teams)
+        for home, away in zip(teams[0::2][:8], teams[1::2][:8]):
+            game_date_by_id[gid] = d
+            for tid in (home, away):
+                for pid in rng.sample(roster[tid], skaters_per_team):
+                    shots = rng.randint(0, 6)
+                    stats_rows.append(
+                        {
+                            "game_id": gid,
+                            "player_id": pid,
+                            "team_id": tid,
+                            "is_goalie": False,
+                            "toi_seconds": rng.randint(500, 1500),
+                            "goals": int(rng.random() < 0.1 * shots),
+                            "assists": rng.randint(0, 1),
+                            "points": None,
+                            "shots": shots,
+                        }
+                    )
+            gid += 1
+        day += 1
+
+    proj_games: list[dict] = []
+    proj_start = date(2025, 10, 1)
+    for i in range(n_proj_games):
+        home, away = rng.sample(range(1, n_teams + 1), 2)
+        d = proj_start + timedelta(days=i // 8)
+        game_id = 900000 + i
+        game_date_by_id[game_id] = d
+        proj_games.append({"game_id": game_id, "game_date": d.isoformat(), "home_team_id": home, "away_team_id": away})
+
+    rosters = {
+        (t, season_string_for_date(g_date)): roster[t]
+        for t in roster
+        for g_date in {to_date(g["game_date"]) for g in proj_games}
+    }
+    return stats_rows, game_date_by_id, proj_games, rosters
+
+
+def _run_variant(name: str, n_rows: int, n_proj_games: int, window: int, out):
+    inputs = synthetic_inputs(n_rows, n_proj_games)
+    fn = legacy_build_player_features_for_games if name == "legacy" else build_player_features_for_games
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    features = fn(*inputs, window=window)
+    elapsed = time.perf_counter() - t0
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Second, traced pass: tracemalloc overhead would distort the timing above.
+    tracemalloc.start()
+    fn(*inputs, window=window)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    checksum = sum((f["shots_avg"] or 0) + (f["toi_avg"] or 0) for f in features.values())
+    out.put(
+        {
+            "variant": name,
+            "seconds": elapsed,
+            "traced_peak_mb": traced_peak / 1e6,
+            "peak_rss_mb": rss_after / 1024,
+            "rss_growth_mb": (rss_after - rss_before) / 1024,
+            "features": len(features),
+            "checksum": round(checksum, 6),
+        }
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark player feature building.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic skater stat rows")
+    parser.add_argument("--proj-games", type=int, default=1_300, help="Projection games")
+    parser.add_argument("--window", type=int, default=10)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for name in ("legacy", "index"):
+        q = ctx.Queue()
+        p = ctx.Process(target=_run_variant, args=(name, args.rows, args.proj_games, args.window, q))
+        p.start()
+        results.append(q.get())
+        p.join()
+
+    for r in results:
+        print(
+            f"[bench] {r['variant']:>6}: {r['seconds']:.3f}s  traced_peak={r['traced_peak_mb']:.1f}MB  "
+            f"peak_rss={r['peak_rss_mb']:.1f}MB (+{r['rss_growth_mb']:.1f}MB)  "
+            f"features={r['features']}  checksum={r['checksum']}"
+        )
+    if results[0]["checksum"] != results[1]["checksum"]:
+        print("[bench] WARNING: outputs differ between variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Incremental market consensus with de-vigging.
+
+ConsensusBuilder keeps, per (game, market, line, team, player, prop), each book's latest two-sided
+prices and the last consensus written. Each batch of new market_lines only touches the keys it
+contains: the vig is removed from every book's pair of prices (multiplicative normalization), the
+books are averaged with configurable weights, and market_consensus rows are emitted only when the
+consensus moves by more than a threshold.
+
+Used by ingest_market_lines.py as lines are written; can also be run on lines since a timestamp:
+
+    python jobs/consensus.py --since 2026-10-19T00:00:00Z
+"""
+import os
+from datetime import datetime, timezone
+from typing import Iterable, cast
+
+from supabase import create_client
+
+from model_pipeline import (
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    american_odds_from_prob,
+    sb_exec,
+    sb_fetch_all,
+)
+
+SIDES_BY_MARKET = {
+    "moneyline": ("home", "away"),
+    "spread": ("home", "away"),
+    "total": ("over", "under"),
+    "team_total": ("over", "under"),
+    "player_prop": ("over", "under"),
+}
+
+CONSENSUS_SOURCE = "devig_multiplicative"
+MARKET_LINE_COLUMNS = "market_line_id,game_id,market,side,line_value,line_value_key,odds_american,book,as_of,team_id,player_id,prop"
+
+
+def implied_prob(odds_american: int | float) -> float:
+    o = float(odds_american)
+    return 100.0 / (o + 100.0) if o > 0 else -o / (-o + 100.0)
+
+
+def parse_book_weights(value: str | None) -> dict[str, float]:
+    """'pinnacle=3,circa=2' -> {'pinnacle': 3.0, 'circa': 2.0}."""
+    weights: dict[str, float] = {}
+    for part in (value or "").split(","):
+        name, sep, w = part.partition("=")
+        if sep and name.strip():
+            weights[name.strip().lower()] = float(w)
+    return weights
+
+
+def consensus_key(r: dict) -> tuple:
+    """
+    Pair both sides of a line under one key. Spreads are keyed from the home perspective, since a
+    home -1.5 is priced against an away +1.5.
+    """
+    lvk = r.get("line_value_key")
+    if r["market"] == "spread" and lvk is not None and r["side"] == "away":
+        lvk = -int(lvk)
+    return (int(r["game_id"]), r["market"], lvk, r.get("team_id"), r.get("player_id"), r.get("prop"))
+
+
+class ConsensusBuilder:
+    def __init__(
+        self,
+        book_weights: dict[str, float] | None = None,
+        default_weight: float = 1.0,
+        min_move: float = 0.005,
+        source: str = CONSENSUS_SOURCE,
+    ):
+        self.book_weights = book_weights or {}
+        self.default_weight = default_weight
+        self.min_move = min_move
+        self.source = source
+        # key -> {"books": {book: {side: (prob, as_of, line_value)}}, "last": {side: prob} | None}
+        self.state: dict[tuple, dict] = {}
+        self.loaded_games: set[int] = set()
+
+    def _entry(self, key: tuple) -> dict:
+        entry = self.state.get(key)
+        if entry is None:
+            entry = self.state[key] = {"books": {}, "last": None}
+        return entry
+
+    def _apply(self, r: dict) -> tuple | None:
+        if r.get("odds_american") is None or r["side"] not in SIDES_BY_MARKET.get(r["market"], ()):
+            return None
+        key = consensus_key(r)
+        book = (r.get("book") or "unknown").lower()
+        sides = self._entry(key)["books"].setdefault(book, {})
+        prev = sides.get(r["side"])
+        as_of = str(r["as_of"])
+        if prev is not None and prev[1] > as_of:
+            return None  # out-of-order snapshot
+        sides[r["side"]] = (implied_prob(r["odds_american"]), as_of, r.get("line_value"))
+        return key
+
+    def seed(self, lines: Iterable[dict], consensus_rows: Iterable[dict]):
+        """Load existing book prices and last-written consensus without emitting anything."""
+        for r in lines:
+            self._apply(r)
+        for c in consensus_rows:
+            if c.get("odds_american") is None:
+                continue
+            entry = self._entry(consensus_key(c))
+            last = entry["last"] or {}
+            last[c["side"]] = implied_prob(c["odds_american"])
+            entry["last"] = last
+
+    def compute(self, key: tuple) -> tuple[dict[str, float], str, dict[str, float | None]] | None:
+        """De-vigged, weighted consensus for one key: ({side: prob}, latest as_of, {side: line_value})."""
+        market = key[1]
+        side_a, side_b = SIDES_BY_MARKET[market]
+        total_w = 0.0
+        acc = 0.0
+        as_of = ""
+        lines: dict[str, float | None] = {side_a: None, side_b: None}
+        for book, sides in self.state[key]["books"].items():
+            a = sides.get(side_a)
+            b = sides.get(side_b)
+            if a is None or b is None:
+                continue
+            overround = a[0] + b[0]
+            if overround <= 0:
+                continue
+            w = self.book_weights.get(book, self.default_weight)
+            if w <= 0:
+                continue
+            acc += w * a[0] / overround
+            total_w += w
+            as_of = max(as_of, a[1], b[1])
+            lines[side_a] = a[2]
+            lines[side_b] = b[2]
+        if total_w <= 0:
+            return None
+        p_a = acc / total_w
+        return {side_a: p_a, side_b: 1.0 - p_a}, as_of, lines
+
+    def update(self, rows: Iterable[dict]) -> list[dict]:
+        """Apply new market_lines rows; return market_consensus rows for keys that moved."""
+        dirty: set[tuple] = set()
+        for r in rows:
+            key = self._apply(r)
+            if key is not None:
+                dirty.add(key)
+
+        out: list[dict] = []
+        for key in dirty:
+            result = self.compute(key)
+            if result is None:
+                continue
+            probs, as_of, lines = result
+            entry = self.state[key]
+            last = entry["last"]
+            if last is not None and all(abs(probs[s] - last.get(s, -1.0)) <= self.min_move for s in probs):
+                continue
+            entry["last"] = dict(probs)
+            game_id, market, lvk, team_id, player_id, prop = key
+            for side, p in probs.items():
+                side_lvk = -lvk if (market == "spread" and side == "away" and lvk is not None) else lvk
+                out.append(
+                    {
+                        "game_id": game_id,
+                        "market": market,
+                        "side": side,
+                        "line_value": lines[side] if lines[side] is not None else (side_lvk / 10 if side_lvk is not None else None),
+                        "line_value_key": side_lvk,
+                        "odds_american": american_odds_from_prob(p),
+                        "as_of": as_of or datetime.now(timezone.utc).isoformat(),
+                        "team_id": team_id,
+                        "player_id": player_id,
+                        "prop": prop,
+                        "source": self.source,
+                    }
+                )
+        return out
+
+    def ensure_games_loaded(self, sb, game_ids: Iterable[int]):
+        """
+        Seed state for games this process hasn't seen yet: each book's latest line and the last
+        consensus written. Happens once per game; later batches are purely incremental.
+        """
+        new_ids = sorted({int(g) for g in game_ids} - self.loaded_games)
+        if not new_ids:
+            return
+        lines = sb_fetch_all(
+            lambda: sb.table("market_lines")
+            .select(MARKET_LINE_COLUMNS)
+            .in_("game_id", new_ids)
+            .eq("is_consensus", False)
+            .order("as_of")
+            .order("market_line_id"),
+            "fetch market_lines",
+        )
+        consensus = sb_fetch_all(
+            lambda: sb.table("market_consensus")
+            .select("consensus_id,game_id,market,side,line_value_key,odds_american,as_of,team_id,player_id,prop")
+            .in_("game_id", new_ids)
+            .eq("source", self.source)
+            .order("as_of")
+            .order("consensus_id"),
+            "fetch market_consensus",
+        )
+        self.seed(lines, consensus)
+        self.loaded_games.update(new_ids)
+
+
+def builder_from_env() -> ConsensusBuilder:
+    return ConsensusBuilder(
+        book_weights=parse_book_weights(os.environ.get("CONSENSUS_BOOK_WEIGHTS")),
+        min_move=float(os.environ.get("CONSENSUS_MIN_MOVE", "0.005")),
+    )
+
+
+def write_consensus(sb, rows: list[dict], chunk_size: int = 500) -> int:
+    for i in range(0, len(rows), chunk_size):
+        sb_exec(sb.table("market_consensus").insert(rows[i : i + chunk_size]), "insert market_consensus")
+    return len(rows)
+
+
+def update_and_write(sb, builder: ConsensusBuilder, rows: list[dict]) -> int:
+    """Feed one batch of freshly written market_lines through the builder and persist any moves."""
+    builder.ensure_games_loaded(sb, {r["game_id"] for r in rows})
+    return write_consensus(sb, builder.update(rows))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Update market_consensus from recent market_lines.")
+    parser.add_argument("--since", required=True, help="Process market_lines with as_of after this timestamp")
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    new_lines = sb_fetch_all(
+        lambda: sb.table("market_lines")
+        .select(MARKET_LINE_COLUMNS)
+        .gt("as_of", args.since)
+        .eq("is_consensus", False)
+        .order("as_of")
+        .order("market_line_id"),
+        "fetch market_lines since",
+    )
+    builder = builder_from_env()
+    # Seed only from lines before the window so the new ones register as moves.
+    game_ids = sorted({int(r["game_id"]) for r in new_lines})
+    if game_ids:
+        prior = sb_fetch_all(
+            lambda: sb.table("market_lines")
+            .select(MARKET_LINE_COLUMNS)
+            .in_("game_id", game_ids)
+            .lte("as_of", args.since)
+            .eq("is_consensus", False)
+            .order("as_of")
+            .order("market_line_id"),
+            "fetch market_lines before",
+        )
+        consensus = sb_fetch_all(
+            lambda: sb.table("market_consensus")
+            .select("consensus_id,game_id,market,side,line_value_key,odds_american,as_of,team_id,player_id,prop")
+            .in_("game_id", game_ids)
+            .eq("source", builder.source)
+            .order("as_of")
+            .order("consensus_id"),
+            "fetch market_consensus",
+        )
+        builder.seed(prior, consensus)
+        builder.loaded_games.update(game_ids)
+    written = write_consensus(sb, builder.update(new_lines))
+    print(f"[consensus] {len(new_lines)} new lines -> {written} consensus rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Long-running scheduler for the ingest -> project cycle (orchestrator.py).
+
+Compared with a cold hourly job, one process keeps its Supabase client, the pooled NHL API session
+(run_jobs.HTTP), the team directory, team abbrevs, fresh rosters and the in-memory HistoryStore
+across cycles, so each cycle only does the new work.
+
+Cycles run in the main thread, one at a time: a cycle that overruns the interval delays the next
+tick instead of overlapping it (missed ticks are dropped, not queued). An exclusive file lock
+(DAEMON_LOCK_PATH) also keeps a second daemon, or any other holder of the lock, from running a
+cycle at the same time. SIGTERM/SIGINT let the running stage finish, skip the remaining stages and
+exit.
+
+With --calendar the fixed interval is replaced by game_calendar.py: the daemon wakes when finals
+sweeps, pre-puck-drop projections or the schedule refresh are due, runs only the stages those need,
+and otherwise sleeps (at most CALENDAR_MAX_SLEEP_MINUTES between re-plans).
+
+    python jobs/daemon.py
+    python jobs/daemon.py --interval-minutes 30
+    python jobs/daemon.py --calendar
+    python jobs/daemon.py --once
+"""
+import fcntl
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, cast
+
+from supabase import create_client
+
+import model_pipeline
+from game_calendar import due_kinds, fetch_calendar_inputs, plan_runs, stages_for
+from model_pipeline import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+from orchestrator import HISTORY_CACHE_PATH, STAGES, run_dag
+from profiling import StageProfiler
+
+DAEMON_INTERVAL_MINUTES = float(os.environ.get("DAEMON_INTERVAL_MINUTES", "60"))
+DAEMON_LOCK_PATH = os.environ.get("DAEMON_LOCK_PATH", ".cache/daemon.lock")
+CALENDAR_MAX_SLEEP_MINUTES = float(os.environ.get("CALENDAR_MAX_SLEEP_MINUTES", "360"))
+# Floor between calendar cycles, so work that stays due (e.g. ingestion failing) isn't hammered.
+CALENDAR_MIN_GAP_MINUTES = float(os.environ.get("CALENDAR_MIN_GAP_MINUTES", "5"))
+
+# Per-cycle outputs; everything else in the context (client, history) carries over.
+CYCLE_KEYS = ("ingested", "projection_runs")
+
+
+@contextmanager
+def cycle_lock(path: str) -> Iterator[bool]:
+    """Non-blocking exclusive lock; yields False if another process holds it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def run_cycle(ctx: dict, stop: threading.Event, lock_path: str, skip: set[str] | None = None) -> dict[str, dict] | None:
+    with cycle_lock(lock_path) as locked:
+        if not locked:
+            print(f"[daemon] {lock_path} is held by another process; skipping this cycle")
+            return None
+        for key in CYCLE_KEYS:
+            ctx.pop(key, None)
+        ctx["prof"] = StageProfiler(enabled=False)
+        return run_dag(STAGES, ctx, skip=skip, should_stop=stop.is_set)
+
+
+def _stop_event() -> threading.Event:
+    stop = threading.Event()
+
+    def request_stop(signum, _frame):
+        print(f"[daemon] {signal.Signals(signum).name} received; finishing the current stage")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    return stop
+
+
+def _logged_cycle(cycle: int, ctx: dict, stop: threading.Event, lock_path: str, skip: set[str] | None = None):
+    started = time.monotonic()
+    print(f"[daemon] cycle {cycle} starting at {datetime.now(timezone.utc).isoformat()}")
+    try:
+        outcomes = run_cycle(ctx, stop, lock_path, skip=skip)
+        if outcomes is not None:
+            summary = ", ".join(f"{name}={o['status']}" for name, o in outcomes.items())
+            print(f"[daemon] cycle {cycle} done in {time.monotonic() - started:.1f}s: {summary}")
+    except Exception as e:
+        # Keep serving; the next cycle starts from the same warm state.
+        print(f"[daemon] cycle {cycle} failed: {e}")
+
+
+def serve(ctx: dict, interval_s: float, lock_path: str, once: bool = False):
+    stop = _stop_event()
+    cycle = 0
+    next_at = time.monotonic()
+    while not stop.is_set():
+        cycle += 1
+        _logged_cycle(cycle, ctx, stop, lock_path)
+        if once:
+            break
+
+        next_at += interval_s
+        now = time.monotonic()
+        if next_at <= now:
+            missed = int((now - next_at) // interval_s) + 1
+            print(f"[daemon] cycle {cycle} overran the interval; dropping {missed} tick(s)")
+            next_at += missed * interval_s
+        stop.wait(next_at - now)
+    print("[daemon] stopped")
+
+
+def serve_calendar(ctx: dict, lock_path: str, once: bool = False):
+    stop = _stop_event()
+    all_stages = {s["name"] for s in STAGES}
+    max_sleep = timedelta(minutes=CALENDAR_MAX_SLEEP_MINUTES)
+    min_gap = timedelta(minutes=CALENDAR_MIN_GAP_MINUTES)
+    cycle = 0
+    last_cycle_at: datetime | None = None
+    while not stop.is_set():
+        now = datetime.now(timezone.utc)
+        try:
+            events = plan_runs(now=now, **fetch_calendar_inputs(ctx["sb"], now))
+        except Exception as e:
+            print(f"[daemon] calendar planning failed: {e}")
+            stop.wait(min_gap.total_seconds())
+            continue
+        kinds = due_kinds(events, now)
+        if kinds and (last_cycle_at is None or now - last_cycle_at >= min_gap):
+            cycle += 1
+            last_cycle_at = now
+            print(f"[daemon] due: {', '.join(sorted(kinds))}")
+            _logged_cycle(cycle, ctx, stop, lock_path, skip=all_stages - stages_for(kinds))
+            if once:
+                break
+            continue
+        if once:
+            print("[daemon] nothing due")
+            break
+
+        upcoming = [e for e in events if e["at"] > now]
+        wake = min([now + max_sleep] + [e["at"] for e in upcoming])
+        if kinds:
+            wake = min(wake, last_cycle_at + min_gap)
+        nxt = upcoming[0] if upcoming else None
+        print(f"[daemon] sleeping until {wake.isoformat()}" + (f" (next: {nxt['kind']})" if nxt and nxt["at"] == wake else ""))
+        stop.wait(max(0.0, (wake - now).total_seconds()))
+    print("[daemon] stopped")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the ingest -> project cycle on a schedule in one process.")
+    parser.add_argument(
+        "--interval-minutes", type=float, default=DAEMON_INTERVAL_MINUTES, help="Minutes between cycle starts (env DAEMON_INTERVAL_MINUTES)"
+    )
+    parser.add_argument("--lock-path", default=DAEMON_LOCK_PATH, help="Overlap lock file (env DAEMON_LOCK_PATH)")
+    parser.add_argument("--history-cache", default=HISTORY_CACHE_PATH, help="Local history cache (env HISTORY_CACHE_PATH)")
+    parser.add_argument("--no-cache", action="store_true", help="Hold history in memory only")
+    parser.add_argument("--calendar", action="store_true", help="Plan cycles from the game calendar instead of a fixed interval")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    args = parser.parse_args()
+    if args.interval_minutes <= 0:
+        parser.error("--interval-minutes must be positive")
+
+    ctx = {
+        "sb": create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY)),
+        "cache_path": None if args.no_cache else args.history_cache,
+        "model_args": model_pipeline.parse_args([]),
+    }
+    if args.calendar:
+        serve_calendar(ctx, args.lock_path, once=args.once)
+    else:
+        serve(ctx, args.interval_minutes * 60, args.lock_path, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Calendar-aware planning from games.start_time_utc / status instead of a fixed hourly cron.
+
+Three kinds of work are planned:
+
+    finals    expected end (start + GAME_DURATION_MINUTES + FINAL_SWEEP_BUFFER_MINUTES), then every
+              FINAL_RETRY_MINUTES after the last ingest until the game is final (given up after
+              FINAL_GIVE_UP_HOURS, e.g. postponements). Runs the full ingest -> project cycle.
+    project   PROJECT_LEAD_MINUTES before each distinct puck drop, unless a projection run was
+              already attempted since. No ingestion. Acted on only by daemon.py --calendar; the
+              Actions cron gate runs jobs for finals and schedule only.
+    schedule  ingest every SCHEDULE_REFRESH_HOURS to pick up schedule changes, including on
+              days without games (offseason, breaks). Ingestion only.
+
+With no games in the window only the schedule refresh remains. The planner is stateless: progress
+comes from games.last_ingested_at, ingestion_runs and projection_runs, so the daemon and the
+cron gate agree on what is due.
+
+    python jobs/game_calendar.py                  # print the plan
+    python jobs/game_calendar.py --due-within 15  # print (and export to GITHUB_OUTPUT) what is due
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+from model_pipeline import parse_utc, sb_exec, sb_fetch_all
+
+GAME_DURATION_MINUTES = float(os.environ.get("GAME_DURATION_MINUTES", "150"))
+FINAL_SWEEP_BUFFER_MINUTES = float(os.environ.get("FINAL_SWEEP_BUFFER_MINUTES", "20"))
+FINAL_RETRY_MINUTES = float(os.environ.get("FINAL_RETRY_MINUTES", "15"))
+FINAL_GIVE_UP_HOURS = float(os.environ.get("FINAL_GIVE_UP_HOURS", "8"))
+PROJECT_LEAD_MINUTES = float(os.environ.get("PROJECT_LEAD_MINUTES", "90"))
+SCHEDULE_REFRESH_HOURS = float(os.environ.get("SCHEDULE_REFRESH_HOURS", "24"))
+CALENDAR_LOOKAHEAD_HOURS = 48
+
+# Orchestrator stages each kind of work needs.
+STAGES_BY_KIND = {
+    "finals": {"ingest", "history", "project", "market_eval", "player_ratings"},
+    "project": {"history", "project", "market_eval"},
+    "schedule": {"ingest"},
+}
+
+
+def fetch_calendar_inputs(sb, now: datetime) -> dict:
+    games = sb_fetch_all(
+        lambda: sb.table("games")
+        .select("game_id,start_time_utc,status,last_ingested_at")
+        .gte("start_time_utc", (now - timedelta(hours=FINAL_GIVE_UP_HOURS)).isoformat())
+        .lte("start_time_utc", (now + timedelta(hours=CALENDAR_LOOKAHEAD_HOURS)).isoformat())
+        .order("game_id"),
+        "calendar games",
+    )
+    ingest = sb_exec(
+        sb.table("ingestion_runs")
+        .select("finished_at")
+        .eq("status", "success")
+        .order("finished_at", desc=True)
+        .limit(1),
+        "calendar ingestion_runs",
+    ).data or []
+    projection = sb_exec(
+        sb.table("projection_runs").select("generated_at").order("generated_at", desc=True).limit(1),
+        "calendar projection_runs",
+    ).data or []
+    return {
+        "games": games,
+        "last_ingest_at": parse_utc(ingest[0]["finished_at"]) if ingest else None,
+        "last_projection_at": parse_utc(projection[0]["generated_at"]) if projection else None,
+    }
+
+
+def plan_runs(
+    games: list[dict], now: datetime, last_ingest_at: datetime | None, last_projection_at: datetime | None
+) -> list[dict]:
+    """Planned runs as {"at", "kind", "game_ids"}, earliest first. Runs with at <= now are due."""
+    events: list[dict] = []
+    game_duration = timedelta(minutes=GAME_DURATION_MINUTES + FINAL_SWEEP_BUFFER_MINUTES)
+    retry = timedelta(minutes=FINAL_RETRY_MINUTES)
+    lead = timedelta(minutes=PROJECT_LEAD_MINUTES)
+
+    starts: dict[datetime, list[int]] = {}
+    for g in games:
+        start = parse_utc(g.get("start_time_utc"))
+        status = g.get("status") or "scheduled"
+        if start is None or status == "final":
+            continue
+        if now - start > timedelta(hours=FINAL_GIVE_UP_HOURS):
+            continue
+        expected_end = start + game_duration
+        last = parse_utc(g.get("last_ingested_at"))
+        at = expected_end if last is None or last < expected_end else last + retry
+        events.append({"at": at, "kind": "finals", "game_ids": [int(g["game_id"])]})
+        if status == "scheduled" and start > now:
+            starts.setdefault(start, []).append(int(g["game_id"]))
+
+    for start, game_ids in starts.items():
+        at = start - lead
+        if last_projection_at is None or last_projection_at < at:
+            events.append({"at": at, "kind": "project", "game_ids": sorted(game_ids)})
+
+    schedule_at = now if last_ingest_at is None else last_ingest_at + timedelta(hours=SCHEDULE_REFRESH_HOURS)
+    events.append({"at": schedule_at, "kind": "schedule", "game_ids": []})
+
+    events.sort(key=lambda e: (e["at"], e["kind"]))
+    return events
+
+
+def due_kinds(events: list[dict], now: datetime, within: timedelta = timedelta(0)) -> set[str]:
+    return {e["kind"] for e in events if e["at"] <= now + within}
+
+
+def stages_for(kinds: set[str]) -> set[str]:
+    stages: set[str] = set()
+    for kind in kinds:
+        stages |= STAGES_BY_KIND[kind]
+    return stages
+
+
+def main():
+    import argparse
+
+    from supabase import create_client
+
+    from model_pipeline import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+
+    parser = argparse.ArgumentParser(description="Plan ingestion/projection runs from the game calendar.")
+    parser.add_argument("--due-within", type=float, default=None, help="Only report kinds due within this many minutes")
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    now = datetime.now(timezone.utc)
+    events = plan_runs(now=now, **fetch_calendar_inputs(sb, now))
+
+    if args.due_within is None:
+        for e in events:
+            ids = f" games={e['game_ids']}" if e["game_ids"] else ""
+            print(f"[calendar] {e['at'].isoformat()} {e['kind']}{ids}")
+        return
+
+    due = ",".join(sorted(due_kinds(events, now, timedelta(minutes=args.due_within))))
+    print(f"[calendar] due: {due or 'nothing'}")
+    if os.environ.get("GITHUB_OUTPUT"):
+        with open(os.environ["GITHUB_OUTPUT"], "a") as f:
+            f.write(f"due={due}\n")
+
+
+if __name__ == "__main__":
+    main()
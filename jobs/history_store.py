@@ -0,0 +1,122 @@
+"""
+In-memory model history (games, game_results, player_game_stats) with an optional local pickle
+cache, so a cycle only reads from Supabase what it doesn't already hold.
+
+Games older than SETTLED_DAYS are treated as final: once cached they are not re-read. Newer days
+are refreshed from the DB each cycle, except games whose rows the caller just ingested and merged.
+"""
+import os
+import pickle
+from datetime import date, timedelta
+from typing import Iterable
+
+from model_pipeline import fetch_game_results, fetch_games, fetch_player_game_stats, to_date
+
+SETTLED_DAYS = 3
+# Bumped when caches written by older code can't be trusted (2: caches built from truncated reads).
+CACHE_FORMAT = 2
+
+
+class HistoryStore:
+    def __init__(self):
+        self.games: dict[int, dict] = {}
+        self.results: dict[int, dict] = {}
+        self.player_stats: dict[int, dict[int, dict]] = {}
+        self.start: date | None = None
+        self.settled_through: date | None = None
+
+    @classmethod
+    def load(cls, path: str) -> "HistoryStore":
+        store = cls()
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return store
+        except Exception as e:
+            print(f"[history] ignoring unreadable cache {path}: {e}")
+            return store
+        if state.get("format") != CACHE_FORMAT:
+            return store
+        store.games = state["games"]
+        store.results = state["results"]
+        store.player_stats = state["player_stats"]
+        store.start = state["start"]
+        store.settled_through = state["settled_through"]
+        return store
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {
+                    "format": CACHE_FORMAT,
+                    "games": self.games,
+                    "results": self.results,
+                    "player_stats": self.player_stats,
+                    "start": self.start,
+                    "settled_through": self.settled_through,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, path)
+
+    def merge(self, games=(), game_results=(), player_game_stats=()):
+        """Apply rows with upsert semantics: columns present in a row overwrite the stored ones."""
+        for g in games:
+            self.games.setdefault(int(g["game_id"]), {}).update(g)
+        for r in game_results:
+            self.results.setdefault(int(r["game_id"]), {}).update(r)
+        for r in player_game_stats:
+            if r.get("player_id") is None:
+                continue
+            self.player_stats.setdefault(int(r["game_id"]), {}).setdefault(int(r["player_id"]), {}).update(r)
+
+    def refresh(self, sb, start: date, end: date, today: date, fresh_game_ids: Iterable[int] = ()) -> int:
+        """
+        Read from Supabase the part of [start, end] not already held as settled. Results and stats of
+        fresh_game_ids are not read: the caller merges those from rows it just ingested. Every other
+        game in the range (including ones another worker or an earlier run ingested) comes from the DB.
+        Returns games whose rows were read.
+        """
+        if self.start is None or start < self.start:
+            fetch_start = start
+        else:
+            fetch_start = (self.settled_through or start - timedelta(days=1)) + timedelta(days=1)
+        fresh = {int(gid) for gid in fresh_game_ids}
+
+        read = 0
+        if fetch_start <= end:
+            # Paged reads either return every row or raise, so nothing is merged (or marked settled)
+            # from a partial read.
+            games = fetch_games(sb, fetch_start, end)
+            game_ids = [g["game_id"] for g in games if int(g["game_id"]) not in fresh]
+            results = fetch_game_results(sb, game_ids)
+            stats = fetch_player_game_stats(sb, game_ids)
+            self.merge(games, results.values(), stats)
+            read = len(game_ids)
+            # Everything read up to the settled horizon won't change; later days are re-read next cycle.
+            settled = min(end, today - timedelta(days=SETTLED_DAYS))
+            self.settled_through = settled if self.settled_through is None else max(self.settled_through, settled)
+        self.start = start if self.start is None else min(self.start, start)
+        self.prune(start)
+        return read
+
+    def prune(self, start: date):
+        """Drop games (and their rows) that fell out of the history window."""
+        old = [gid for gid, g in self.games.items() if to_date(g["game_date"]) < start]
+        for gid in old:
+            self.games.pop(gid, None)
+            self.results.pop(gid, None)
+            self.player_stats.pop(gid, None)
+        if old:
+            self.start = start
+
+    def snapshot(self, start: date, end: date) -> tuple[list[dict], dict[int, dict], list[dict]]:
+        games = [g for g in self.games.values() if start <= to_date(g["game_date"]) <= end]
+        games.sort(key=lambda g: (str(g["game_date"]), int(g["game_id"])))
+        results = {int(g["game_id"]): self.results[int(g["game_id"])] for g in games if int(g["game_id"]) in self.results}
+        stats = [row for g in games for row in self.player_stats.get(int(g["game_id"]), {}).values()]
+        return games, results, stats
@@ -0,0 +1,452 @@
+"""
+Stream sportsbook odds dumps (CSV or JSONL, optionally gzipped) into market_lines.
+
+Files are processed as a generator pipeline: read -> normalize/resolve -> chunk -> dedupe -> write,
+so memory stays flat regardless of file size. Markets and sides are normalized to the
+market_lines CHECK constraints; team, player and game references are resolved through an
+in-memory index loaded once per run. Each written chunk is also fed to the incremental consensus
+builder (consensus.py) unless --no-consensus is given.
+
+    python jobs/ingest_market_lines.py odds/2025-10-*.csv odds/props.jsonl.gz
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import Iterable, Iterator, cast
+
+from supabase import create_client
+
+from consensus import builder_from_env, update_and_write
+from model_pipeline import (
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    sb_exec,
+    sb_fetch_all,
+    write_chunks,
+)
+
+MARKET_ALIASES = {
+    "moneyline": "moneyline",
+    "ml": "moneyline",
+    "h2h": "moneyline",
+    "money_line": "moneyline",
+    "spread": "spread",
+    "spreads": "spread",
+    "puckline": "spread",
+    "puck_line": "spread",
+    "handicap": "spread",
+    "total": "total",
+    "totals": "total",
+    "over_under": "total",
+    "ou": "total",
+    "team_total": "team_total",
+    "team_totals": "team_total",
+    "player_prop": "player_prop",
+    "prop": "player_prop",
+    "player_props": "player_prop",
+}
+
+SIDE_ALIASES = {
+    "home": "home",
+    "h": "home",
+    "away": "away",
+    "a": "away",
+    "visitor": "away",
+    "over": "over",
+    "o": "over",
+    "under": "under",
+    "u": "under",
+}
+
+TEAM_SIDE_MARKETS = ("moneyline", "spread")
+
+# Dedupe key; must match the unique index on market_lines.
+MARKET_LINE_CONFLICT = "game_id,book,market,side,line_value_key,as_of,team_id,player_id,prop"
+
+
+def _first(rec: dict, keys: tuple[str, ...]):
+    for k in keys:
+        v = rec.get(k)
+        if v not in (None, ""):
+            return v
+    return None
+
+
+def _norm_text(s: str) -> str:
+    s = unicodedata.normalize("NFKD", str(s)).encode("ascii", "ignore").decode("ascii")
+    return " ".join("".join(ch for ch in s.lower() if ch.isalnum() or ch.isspace()).split())
+
+
+@lru_cache(maxsize=4096)
+def _norm_key(s) -> str:
+    return "_".join(str(s).strip().lower().replace("-", " ").replace("_", " ").split())
+
+
+@lru_cache(maxsize=4096)
+def line_value_key(line_value: float | None) -> int | None:
+    """ROUND(line_value * 10) with Postgres numeric rounding (half away from zero)."""
+    if line_value is None:
+        return None
+    return int((Decimal(str(line_value)) * 10).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def american_from_decimal(dec: float) -> int | None:
+    if dec <= 1.0:
+        return None
+    if dec >= 2.0:
+        return int(round((dec - 1.0) * 100))
+    return int(round(-100 / (dec - 1.0)))
+
+
+@lru_cache(maxsize=65536)
+def parse_as_of(v) -> str | None:
+    if v in (None, ""):
+        return None
+    try:
+        if isinstance(v, (int, float)) or str(v).isdigit():
+            ts = float(v)
+            dt = datetime.fromtimestamp(ts / 1000 if ts > 1e11 else ts, tz=timezone.utc)
+        else:
+            dt = datetime.fromisoformat(str(v).strip().replace("Z", "+00:00"))
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+    except Exception:
+        return None
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Yield raw records from a .csv/.jsonl file (optionally .gz) one at a time."""
+    opener = gzip.open if path.endswith(".gz") else open
+    base = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rb") as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        if base.endswith(".csv"):
+            yield from csv.DictReader(text)
+        else:
+            for line in text:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+class MarketIndex:
+    """
+    In-memory lookups for resolving odds records: teams by abbrev/name, players by name,
+    games by id and by (date, home, away). Games are loaded lazily per date / id.
+    """
+
+    def __init__(self, sb):
+        self.sb = sb
+        self.team_by_key: dict[str, int] = {}
+        for t in sb_fetch_all(
+            lambda: sb.table("teams").select("team_id,abbrev,name,city").order("team_id"), "fetch teams"
+        ):
+            tid = int(t["team_id"])
+            for key in (t.get("abbrev"), t.get("name"), f"{t.get('city') or ''} {t.get('name') or ''}"):
+                if key and key.strip():
+                    self.team_by_key[_norm_text(key)] = tid
+
+        self.player_by_name: dict[str, int | None] = {}
+        for p in sb_fetch_all(
+            lambda: sb.table("players").select("player_id,full_name").order("player_id"), "fetch players"
+        ):
+            if not p.get("full_name"):
+                continue
+            name = _norm_text(p["full_name"])
+            # Ambiguous names resolve to None rather than guessing.
+            self.player_by_name[name] = None if name in self.player_by_name else int(p["player_id"])
+
+        self.games_by_id: dict[int, tuple[int, int]] = {}
+        self.game_by_matchup: dict[tuple[str, int, int], int] = {}
+        self._loaded_dates: set[str] = set()
+        self._missing_game_ids: set[int] = set()
+        # Raw strings repeat heavily in odds dumps; cache resolutions by the raw value.
+        self._team_cache: dict[str, int | None] = {}
+        self._player_cache: dict[str, int | None] = {}
+
+    def team_id(self, v) -> int | None:
+        if v in (None, ""):
+            return None
+        if isinstance(v, int) or str(v).isdigit():
+            return int(v)
+        if v not in self._team_cache:
+            self._team_cache[v] = self.team_by_key.get(_norm_text(v))
+        return self._team_cache[v]
+
+    def player_id(self, v) -> int | None:
+        if v in (None, ""):
+            return None
+        if isinstance(v, int) or str(v).isdigit():
+            return int(v)
+        if v not in self._player_cache:
+            self._player_cache[v] = self.player_by_name.get(_norm_text(v))
+        return self._player_cache[v]
+
+    def _load_date(self, d: str):
+        if d in self._loaded_dates:
+            return
+        self._loaded_dates.add(d)
+        rows = sb_exec(
+            self.sb.table("games").select("game_id,game_date,home_team_id,away_team_id").eq("game_date", d),
+            "fetch games by date",
+        ).data or []
+        for g in rows:
+            self._add_game(g)
+
+    def _add_game(self, g: dict):
+        gid = int(g["game_id"])
+        home, away = int(g["home_team_id"]), int(g["away_team_id"])
+        self.games_by_id[gid] = (home, away)
+        self.game_by_matchup[(str(g["game_date"])[:10], home, away)] = gid
+
+    def game_teams(self, game_id: int) -> tuple[int, int] | None:
+        if game_id not in self.games_by_id and game_id not in self._missing_game_ids:
+            rows = sb_exec(
+                self.sb.table("games").select("game_id,game_date,home_team_id,away_team_id").eq("game_id", game_id),
+                "fetch game",
+            ).data or []
+            for g in rows:
+                self._add_game(g)
+            if game_id not in self.games_by_id:
+                self._missing_game_ids.add(game_id)
+        return self.games_by_id.get(game_id)
+
+    def game_id(self, game_date: str, home_id: int, away_id: int) -> int | None:
+        self._load_date(game_date)
+        return self.game_by_matchup.get((game_date, home_id, away_id))
+
+
+def normalize_records(records: Iterable[dict], index: MarketIndex, stats: Counter) -> Iterator[dict]:
+    """Map raw odds records onto market_lines rows; rejects are counted by reason in stats."""
+    for rec in records:
+        stats["read"] += 1
+
+        market = MARKET_ALIASES.get(_norm_key(_first(rec, ("market", "market_key", "market_type")) or ""))
+        if not market:
+            stats["rejected_market"] += 1
+            continue
+
+        game_id = _first(rec, ("game_id", "gameId", "event_game_id"))
+        if game_id is not None:
+            try:
+                game_id = int(game_id)
+            except (TypeError, ValueError):
+                stats["rejected_game"] += 1
+                continue
+            teams = index.game_teams(game_id)
+        else:
+            gdate = str(_first(rec, ("game_date", "date", "event_date")) or "")[:10]
+            home_id = index.team_id(_first(rec, ("home_team_id", "home_team", "home")))
+            away_id = index.team_id(_first(rec, ("away_team_id", "away_team", "away")))
+            game_id = index.game_id(gdate, home_id, away_id) if gdate and home_id and away_id else None
+            teams = (home_id, away_id) if game_id else None
+        if not game_id or not teams:
+            stats["rejected_game"] += 1
+            continue
+        home_id, away_id = teams
+
+        raw_side = _first(rec, ("side", "outcome", "selection", "name"))
+        side = SIDE_ALIASES.get(_norm_key(raw_side or ""))
+        team_id = index.team_id(_first(rec, ("team_id", "team", "team_abbrev")))
+        if side is None and market in TEAM_SIDE_MARKETS:
+            # Team-named outcomes ("TOR", "Maple Leafs") -> home/away.
+            side_team = index.team_id(raw_side)
+            side = "home" if side_team == home_id else "away" if side_team == away_id else None
+        if market in TEAM_SIDE_MARKETS:
+            ok_side = side in ("home", "away")
+        else:
+            ok_side = side in ("over", "under")
+        if not ok_side:
+            stats["rejected_side"] += 1
+            continue
+
+        line_raw = _first(rec, ("line_value", "line", "point", "points", "handicap"))
+        try:
+            line_value = float(line_raw) if line_raw is not None else None
+        except ValueError:
+            stats["rejected_line"] += 1
+            continue
+        if market != "moneyline" and line_value is None:
+            stats["rejected_line"] += 1
+            continue
+        if market == "moneyline":
+            line_value = None
+
+        odds = _first(rec, ("odds_american", "american", "price_american", "odds", "price"))
+        dec = _first(rec, ("odds_decimal", "decimal", "price_decimal"))
+        try:
+            odds_val = float(odds) if odds is not None else None
+            if odds_val is not None and abs(odds_val) < 100:
+                # Generic odds/price columns sometimes carry decimal prices (e.g. 1.91).
+                odds_american = american_from_decimal(odds_val)
+            elif odds_val is not None:
+                odds_american = int(round(odds_val))
+            else:
+                odds_american = american_from_decimal(float(dec)) if dec is not None else None
+        except ValueError:
+            odds_american = None
+        if odds_american is None or -100 < odds_american < 100:
+            stats["rejected_odds"] += 1
+            continue
+
+        as_of = parse_as_of(_first(rec, ("as_of", "timestamp", "last_update", "snapshot_time", "captured_at")))
+        if as_of is None:
+            stats["rejected_as_of"] += 1
+            continue
+
+        player_id = None
+        prop = None
+        if market == "player_prop":
+            player_id = index.player_id(_first(rec, ("player_id", "playerId", "player", "player_name", "description")))
+            prop = _norm_key(_first(rec, ("prop", "stat", "prop_type")) or "") or None
+            if player_id is None or prop is None:
+                stats["rejected_player"] += 1
+                continue
+        if market == "team_total" and team_id is None:
+            stats["rejected_team"] += 1
+            continue
+        if market != "team_total":
+            team_id = None
+
+        book = _first(rec, ("book", "bookmaker", "sportsbook", "source"))
+        stats["normalized"] += 1
+        yield {
+            "game_id": game_id,
+            "market": market,
+            "side": side,
+            "line_value": line_value,
+            "line_value_key": line_value_key(line_value),
+            "odds_american": odds_american,
+            "book": _norm_key(book) if book else None,
+            "as_of": as_of,
+            "is_consensus": False,
+            "team_id": team_id,
+            "player_id": player_id,
+            "prop": prop,
+        }
+
+
+def chunked(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    chunk: list[dict] = []
+    for r in rows:
+        chunk.append(r)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def dedupe_chunks(chunks: Iterable[list[dict]], stats: Counter) -> Iterator[list[dict]]:
+    """
+    Drop repeats of the (game, book, market, side, line, as_of, team, player, prop) key within each
+    chunk. Repeats across chunks are left to the insert's ignore-duplicates on the same unique key,
+    so memory stays bounded by the chunk size however long the file is; the consensus builder keeps
+    the latest price per book and side, so seeing a repeated line twice doesn't move it.
+    """
+    cols = MARKET_LINE_CONFLICT.split(",")
+    for chunk in chunks:
+        seen: set[tuple] = set()
+        out: list[dict] = []
+        for r in chunk:
+            key = tuple(r[c] for c in cols)
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            out.append(r)
+        yield out
+
+
+def ingest_files(sb, paths: list[str], chunk_size: int | None = None, on_chunk_done=None) -> dict:
+    if chunk_size is None:
+        chunk_size = int(os.environ.get("MARKET_LINES_CHUNK_SIZE", "1000"))
+    index = MarketIndex(sb)
+    stats: Counter = Counter()
+
+    def all_records() -> Iterator[dict]:
+        for path in paths:
+            print(f"[market_lines] reading {path}")
+            yield from read_records(path)
+
+    started = time.perf_counter()
+    rows = normalize_records(all_records(), index, stats)
+    write = write_chunks(
+        sb,
+        "market_lines",
+        dedupe_chunks(chunked(rows, chunk_size), stats),
+        on_conflict=MARKET_LINE_CONFLICT,
+        ignore_duplicates=True,
+        on_chunk_done=on_chunk_done,
+    )
+    summary = {
+        **dict(stats),
+        "written": write["rows"] - write["failed_rows"],
+        "failed_rows": write["failed_rows"],
+        "chunks": len(write["chunks"]),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    print(f"[market_lines] {json.dumps(summary)}")
+    return summary
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream odds dumps into market_lines.")
+    parser.add_argument("paths", nargs="+", help="CSV/JSONL files (optionally .gz)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows per insert (env MARKET_LINES_CHUNK_SIZE)")
+    parser.add_argument("--no-consensus", action="store_true", help="Skip updating market_consensus")
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    run = sb_exec(sb.table("ingestion_runs").insert({"job_name": "market_lines_ingest"}), "ingestion_runs")
+    run_id = run.data[0]["run_id"] if run.data else None
+    try:
+        consensus_rows = 0
+        if args.no_consensus:
+            on_chunk_done = None
+        else:
+            builder = builder_from_env()
+
+            def _update_consensus(chunk: list[dict], result: dict):
+                nonlocal consensus_rows
+                if result["status"] == "ok":
+                    consensus_rows += update_and_write(sb, builder, chunk)
+
+            on_chunk_done = _update_consensus
+
+        summary = ingest_files(sb, args.paths, chunk_size=args.chunk_size, on_chunk_done=on_chunk_done)
+        summary["consensus_rows"] = consensus_rows
+        print(f"[market_lines] wrote {consensus_rows} market_consensus rows")
+        if run_id:
+            sb.table("ingestion_runs").update(
+                {
+                    "status": "success" if not summary["failed_rows"] else "error",
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                    "message": json.dumps(summary),
+                }
+            ).eq("run_id", run_id).execute()
+    except Exception as e:
+        if run_id:
+            sb.table("ingestion_runs").update(
+                {
+                    "status": "error",
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                    "message": str(e),
+                }
+            ).eq("run_id", run_id).execute()
+        raise
+
+
+if __name__ == "__main__":
+    main()
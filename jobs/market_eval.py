@@ -0,0 +1,287 @@
+"""
+Model-vs-market evaluation: prices every latest book line for a projection run's games and
+writes model_market_eval rows (model probability, fair odds, edge vs the book price).
+
+    python jobs/market_eval.py --run-id <projection_run_id>
+    python jobs/market_eval.py            # latest successful run of MODEL_VERSION
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import cast
+
+import numpy as np
+from supabase import create_client
+
+from model_pipeline import (
+    MODEL_VERSION,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    sb_exec,
+    sb_fetch_all,
+    write_rows_chunked,
+)
+from probability import (
+    american_from_prob,
+    goal_diff_cdf,
+    implied_prob_from_american,
+    poisson_cdf,
+    to_optional_ints,
+)
+
+# player_prop `prop` values -> player_projections mean column.
+PROP_MEAN_COLUMNS = {
+    "shots": "shots_mean",
+    "sog": "shots_mean",
+    "shots_on_goal": "shots_mean",
+    "goals": "goals_mean",
+    "assists": "assists_mean",
+    "points": "points_mean",
+}
+
+MARKET_LINE_COLUMNS = (
+    "market_line_id,game_id,market,side,line_value,line_value_key,odds_american,book,as_of,team_id,player_id,prop"
+)
+
+
+def fetch_latest_projection_run(sb, model_version: str) -> dict | None:
+    resp = sb_exec(
+        sb.table("projection_runs")
+        .select("run_id,model_version,generated_at,status")
+        .eq("model_version", model_version)
+        .in_("status", ["success", "partial"])
+        .order("generated_at", desc=True)
+        .limit(1),
+        "fetch latest projection_run",
+    )
+    return (resp.data or [None])[0]
+
+
+def fetch_projection_run(sb, run_id: str) -> dict | None:
+    resp = sb_exec(
+        sb.table("projection_runs").select("run_id,model_version,generated_at,status").eq("run_id", run_id),
+        "fetch projection_run",
+    )
+    return (resp.data or [None])[0]
+
+
+def fetch_run_projections(sb, run_id: str) -> tuple[list[dict], list[dict]]:
+    game_rows = sb_fetch_all(
+        lambda: sb.table("game_projections")
+        .select("game_id,home_goals_mean,away_goals_mean,home_win_prob,away_win_prob,goals_params")
+        .eq("projection_run_id", run_id)
+        .order("game_id"),
+        "fetch game_projections",
+    )
+    player_rows = sb_fetch_all(
+        lambda: sb.table("player_projections")
+        .select("game_id,player_id,shots_mean,goals_mean,assists_mean,points_mean")
+        .eq("projection_run_id", run_id)
+        .order("game_id")
+        .order("player_id"),
+        "fetch player_projections",
+    )
+    return game_rows, player_rows
+
+
+def fetch_latest_market_lines(sb, game_ids: list[int]) -> list[dict]:
+    """
+    Latest book line per (game, market, side, line_value_key, book, team, player, prop).
+    Lines are read in as_of order and reduced in memory, one pass.
+    """
+    if not game_ids:
+        return []
+    rows = sb_fetch_all(
+        lambda: sb.table("market_lines")
+        .select(MARKET_LINE_COLUMNS)
+        .in_("game_id", game_ids)
+        .eq("is_consensus", False)
+        .order("as_of")
+        .order("market_line_id"),
+        "fetch market_lines",
+    )
+    latest: dict[tuple, dict] = {}
+    for r in rows:
+        key = (
+            r["game_id"],
+            r["market"],
+            r["side"],
+            r.get("line_value_key"),
+            r.get("book"),
+            r.get("team_id"),
+            r.get("player_id"),
+            r.get("prop"),
+        )
+        latest[key] = r
+    return list(latest.values())
+
+
+def evaluate_lines(
+    lines: list[dict],
+    game_proj_by_id: dict[int, dict],
+    home_team_by_game: dict[int, int],
+    player_proj_by_key: dict[tuple[int, int], dict],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Model probability, fair American odds and edge (model prob - book implied prob) for each line.
+    NaN where the run has no projection for the line.
+    """
+    n = len(lines)
+    market = np.array([r["market"] for r in lines], dtype=object)
+    side = np.array([r["side"] for r in lines], dtype=object)
+    line_value = np.array([np.nan if r.get("line_value") is None else float(r["line_value"]) for r in lines])
+    odds = np.array([np.nan if r.get("odds_american") is None else float(r["odds_american"]) for r in lines])
+
+    def game_field(r: dict, field: str) -> float:
+        gp = game_proj_by_id.get(int(r["game_id"]))
+        if not gp:
+            return np.nan
+        if field in ("lam_home", "lam_away"):
+            params = gp.get("goals_params") or {}
+            fallback = gp.get("home_goals_mean" if field == "lam_home" else "away_goals_mean")
+            val = params.get(field, fallback)
+        else:
+            val = gp.get(field)
+        return np.nan if val is None else float(val)
+
+    lam_home = np.array([game_field(r, "lam_home") for r in lines])
+    lam_away = np.array([game_field(r, "lam_away") for r in lines])
+    home_win = np.array([game_field(r, "home_win_prob") for r in lines])
+    away_win = np.array([game_field(r, "away_win_prob") for r in lines])
+
+    prob = np.full(n, np.nan)
+    is_over = side == "over"
+    is_under = side == "under"
+
+    m = market == "moneyline"
+    prob[m] = np.where(side[m] == "home", home_win[m], away_win[m])
+
+    m = (market == "spread") & ~np.isnan(line_value) & ~np.isnan(lam_home) & ~np.isnan(lam_away)
+    if m.any():
+        lv = line_value[m]
+        home_side = side[m] == "home"
+        # home covers: diff > -line  ->  1 - P(diff <= floor(-line)); away covers: diff < line -> P(diff <= ceil(line) - 1)
+        ds = np.where(home_side, np.floor(-lv), np.ceil(lv) - 1).astype(np.int64)
+        cdf = goal_diff_cdf(lam_home[m], lam_away[m], ds)
+        prob[m] = np.where(home_side, 1.0 - cdf, cdf)
+
+    def over_under(mask: np.ndarray, lams: np.ndarray):
+        mask = mask & ~np.isnan(line_value) & ~np.isnan(lams) & (is_over | is_under)
+        if not mask.any():
+            return
+        lv = line_value[mask]
+        over = is_over[mask]
+        # over: X > line -> 1 - P(X <= floor(line)); under: X < line -> P(X <= ceil(line) - 1)
+        ks = np.where(over, np.floor(lv), np.ceil(lv) - 1).astype(np.int64)
+        cdf = poisson_cdf(lams[mask], ks)
+        prob[mask] = np.where(over, 1.0 - cdf, cdf)
+
+    over_under(market == "total", lam_home + lam_away)
+
+    team_is_home = np.array(
+        [
+            r.get("team_id") is not None and home_team_by_game.get(int(r["game_id"])) == int(r["team_id"])
+            for r in lines
+        ]
+    )
+    over_under(market == "team_total", np.where(team_is_home, lam_home, lam_away))
+
+    def prop_mean(r: dict) -> float:
+        if r["market"] != "player_prop" or r.get("player_id") is None:
+            return np.nan
+        col = PROP_MEAN_COLUMNS.get((r.get("prop") or "").strip().lower())
+        pp = player_proj_by_key.get((int(r["game_id"]), int(r["player_id"])))
+        if not col or not pp or pp.get(col) is None:
+            return np.nan
+        return float(pp[col])
+
+    over_under(market == "player_prop", np.array([prop_mean(r) for r in lines]))
+
+    prob = np.clip(prob, 0.0, 1.0)
+    fair = american_from_prob(prob)
+    edge = prob - implied_prob_from_american(odds)
+    return prob, fair, edge
+
+
+def evaluate_run(sb, run_id: str, model_version: str) -> dict:
+    started = time.perf_counter()
+    game_rows, player_rows = fetch_run_projections(sb, run_id)
+    game_proj_by_id = {int(r["game_id"]): r for r in game_rows}
+    player_proj_by_key = {(int(r["game_id"]), int(r["player_id"])): r for r in player_rows}
+    game_ids = sorted(game_proj_by_id)
+    if not game_ids:
+        print(f"[market_eval] run {run_id} has no game projections")
+        return {"lines": 0, "written": 0}
+
+    home_team_by_game = {
+        int(r["game_id"]): int(r["home_team_id"])
+        for r in sb_exec(
+            sb.table("games").select("game_id,home_team_id").in_("game_id", game_ids), "fetch games"
+        ).data
+        or []
+    }
+    lines = fetch_latest_market_lines(sb, game_ids)
+    loaded = time.perf_counter()
+
+    prob, fair, edge = evaluate_lines(lines, game_proj_by_id, home_team_by_game, player_proj_by_key)
+    computed = time.perf_counter()
+
+    now = datetime.now(timezone.utc).isoformat()
+    fair_odds = to_optional_ints(fair)
+    prob_list = prob.tolist()
+    edge_list = edge.tolist()
+    rows = [
+        {
+            "model_version": model_version,
+            "projection_run_id": run_id,
+            "market_line_id": r["market_line_id"],
+            "generated_at": now,
+            "prob_model": prob_list[i],
+            "fair_odds_american": fair_odds[i],
+            "edge": None if np.isnan(edge_list[i]) else edge_list[i],
+        }
+        for i, r in enumerate(lines)
+        if not np.isnan(prob_list[i])
+    ]
+    write = write_rows_chunked(sb, "model_market_eval", rows, on_conflict="projection_run_id,market_line_id")
+
+    summary = {
+        "lines": len(lines),
+        "evaluated": len(rows),
+        "written": len(rows) - write["failed_rows"],
+        "load_seconds": round(loaded - started, 3),
+        "compute_seconds": round(computed - loaded, 4),
+        "write_seconds": write["seconds"],
+    }
+    print(
+        f"[market_eval] run {run_id}: {summary['evaluated']}/{summary['lines']} lines priced "
+        f"in {summary['compute_seconds']}s, wrote {summary['written']}"
+    )
+    return summary
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate a projection run against market lines.")
+    parser.add_argument("--run-id", help="projection_runs.run_id (default: latest successful run)")
+    parser.add_argument(
+        "--model-version",
+        default=os.environ.get("MODEL_VERSION", MODEL_VERSION),
+        help="Model whose latest run is evaluated when --run-id is not given",
+    )
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    if args.run_id:
+        run = fetch_projection_run(sb, args.run_id)
+    else:
+        run = fetch_latest_projection_run(sb, args.model_version)
+    if not run:
+        print(f"[market_eval] no projection run found ({args.run_id or args.model_version})")
+        return
+    evaluate_run(sb, run["run_id"], run["model_version"])
+
+
+if __name__ == "__main__":
+    main()
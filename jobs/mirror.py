@@ -0,0 +1,418 @@
+"""
+Local DuckDB mirror of the Supabase tables that analysis and the model pipeline read most.
+
+Each table syncs from a cursor column: rows with an updated_at-style timestamp (or identity id)
+past the stored watermark are fetched, and replace any mirrored rows with the same key. Timestamp
+cursors re-read MIRROR_OVERLAP_MINUTES behind the watermark, since rows are stamped before they are
+written. Tables without a usable cursor (projection_runs status is updated after insert; teams is
+tiny) are refreshed whole. Rows deleted upstream stay in the mirror until a --full sync.
+
+Values are kept as PostgREST returns them (timestamps and dates as ISO strings, jsonb decoded on
+read), so MirrorClient can stand in for the Supabase client: selects on mirrored tables run as local
+queries and everything else (writes, rpc, other tables) goes to the real client.
+
+    python jobs/mirror.py sync                      # incremental, every mirrored table
+    python jobs/mirror.py sync --tables games,game_results --full
+    python jobs/mirror.py status
+    python jobs/mirror.py sql "select count(*) from player_game_stats"
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+from model_pipeline import parse_utc, sb_fetch_all
+
+try:
+    import duckdb
+except Exception:
+    duckdb = None
+
+MIRROR_PATH = os.environ.get("MIRROR_PATH", ".cache/mirror.duckdb")
+MIRROR_OVERLAP_MINUTES = float(os.environ.get("MIRROR_OVERLAP_MINUTES", "10"))
+
+# table -> key columns and cursor column (None: refreshed whole on every sync).
+MIRROR_TABLES: dict[str, dict] = {
+    "teams": {"key": ["team_id"], "cursor": None},
+    "games": {"key": ["game_id"], "cursor": "last_ingested_at"},
+    "game_results": {"key": ["game_id"], "cursor": "updated_at"},
+    "player_game_stats": {"key": ["game_id", "player_id"], "cursor": "updated_at"},
+    "projection_runs": {"key": ["run_id"], "cursor": None},
+    "game_projections": {"key": ["game_id", "model_version"], "cursor": "generated_at"},
+    "player_projections": {"key": ["game_id", "model_version", "player_id"], "cursor": "generated_at"},
+    "market_lines": {"key": ["market_line_id"], "cursor": "market_line_id"},
+    "market_consensus": {"key": ["consensus_id"], "cursor": "consensus_id"},
+    "model_market_eval": {"key": ["eval_id"], "cursor": "generated_at"},
+}
+# The wide reads model_pipeline makes; synced before a --mirror run. projection_runs stays remote
+# (one indexed lookup, and the pipeline writes to it).
+PIPELINE_TABLES = ["teams", "games", "game_results", "player_game_stats"]
+
+_WIDEN = {("BIGINT", "DOUBLE"), ("INTEGER", "DOUBLE"), ("INTEGER", "BIGINT")}
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _is_timestamp_cursor(column: str) -> bool:
+    return column.endswith("_at")
+
+
+class Mirror:
+    def __init__(self, path: str = MIRROR_PATH, read_only: bool = False):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed (pip install duckdb)")
+        if not read_only:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = duckdb.connect(path, read_only=read_only)
+        if not read_only:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS _mirror_state ("
+                "table_name VARCHAR PRIMARY KEY, watermark VARCHAR, json_columns VARCHAR, rows BIGINT, synced_at VARCHAR)"
+            )
+        self._columns: dict[str, dict[str, str]] = {}
+        self._json: dict[str, set[str]] = {}
+        self._load_state()
+
+    def _load_state(self):
+        self._columns = {}
+        for table, column, dtype in self.conn.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_schema = 'main'"
+        ).fetchall():
+            self._columns.setdefault(table, {})[column] = dtype
+        self._json = {}
+        if "_mirror_state" in self._columns:
+            for table, cols in self.conn.execute("SELECT table_name, json_columns FROM _mirror_state").fetchall():
+                self._json[table] = set(filter(None, (cols or "").split(",")))
+
+    def has(self, table: str) -> bool:
+        return table in self._columns and table in MIRROR_TABLES
+
+    def columns(self, table: str) -> dict[str, str]:
+        return self._columns.get(table, {})
+
+    def json_columns(self, table: str) -> set[str]:
+        return self._json.get(table, set())
+
+    def state(self) -> list[tuple]:
+        return self.conn.execute(
+            "SELECT table_name, rows, watermark, synced_at FROM _mirror_state ORDER BY table_name"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+    # --- Sync ---
+
+    def sync(self, sb, tables: list[str] | None = None, full: bool = False) -> dict[str, int]:
+        """Pull rows changed since each table's watermark; returns rows fetched per table."""
+        fetched: dict[str, int] = {}
+        for table in tables or list(MIRROR_TABLES):
+            started = time.perf_counter()
+            fetched[table] = self.sync_table(sb, table, full=full)
+            print(f"[mirror] {table}: {fetched[table]} rows ({time.perf_counter() - started:.2f}s)")
+        self._load_state()
+        return fetched
+
+    def sync_table(self, sb, table: str, full: bool = False) -> int:
+        spec = MIRROR_TABLES[table]
+        cursor = spec["cursor"]
+        row = self.conn.execute("SELECT watermark FROM _mirror_state WHERE table_name = ?", [table]).fetchone()
+        watermark = None if full or cursor is None or table not in self._columns else (row[0] if row else None)
+
+        order = ([cursor] if cursor else []) + [k for k in spec["key"] if k != cursor]
+
+        def query():
+            q = sb.table(table).select("*")
+            if watermark is not None:
+                if _is_timestamp_cursor(cast(str, cursor)):
+                    since = cast(datetime, parse_utc(watermark)) - timedelta(minutes=MIRROR_OVERLAP_MINUTES)
+                    q = q.gt(cursor, since.isoformat())
+                else:
+                    q = q.gt(cursor, int(watermark))
+            for col in order:
+                q = q.order(col)
+            return q
+
+        rows = sb_fetch_all(query, f"mirror {table}")
+        replace_all = cursor is None or watermark is None
+        if not rows and not replace_all:
+            return 0
+        new_mark = watermark
+        if cursor and rows:
+            values = [r[cursor] for r in rows if r.get(cursor) is not None]
+            if values:
+                if _is_timestamp_cursor(cursor):
+                    latest = max(values, key=lambda v: cast(datetime, parse_utc(v)))
+                    if watermark is None or cast(datetime, parse_utc(latest)) > cast(datetime, parse_utc(watermark)):
+                        new_mark = latest
+                else:
+                    new_mark = str(max([int(v) for v in values] + ([int(watermark)] if watermark is not None else [])))
+
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            json_cols = self._write(table, rows, spec["key"], replace_all)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO _mirror_state VALUES (?, ?, ?, (SELECT count(*) FROM " + _q(table) + "), ?)"
+                if table in self._columns
+                else "INSERT OR REPLACE INTO _mirror_state VALUES (?, ?, ?, 0, ?)",
+                [table, new_mark, ",".join(sorted(json_cols)), datetime.now(timezone.utc).isoformat()],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            self._load_state()
+            raise
+        return len(rows)
+
+    def _write(self, table: str, rows: list[dict], key: list[str], replace_all: bool) -> set[str]:
+        import pyarrow as pa
+
+        json_cols = set(self.json_columns(table))
+        if rows:
+            nested = {k for r in rows for k, v in r.items() if isinstance(v, (dict, list))}
+            json_cols |= nested
+            if json_cols:
+                rows = [{k: json.dumps(v) if k in json_cols and v is not None else v for k, v in r.items()} for r in rows]
+            batch = pa.Table.from_pylist(rows)
+            # All-null columns have no type yet; they are added once a batch carries values.
+            batch = batch.select([f.name for f in batch.schema if not pa.types.is_null(f.type)])
+        elif table in self._columns:
+            self.conn.execute(f"DELETE FROM {_q(table)}")
+            return json_cols
+        else:
+            return json_cols
+
+        self.conn.register("_mirror_batch", batch)
+        try:
+            if table not in self._columns:
+                self.conn.execute(f"CREATE TABLE {_q(table)} AS SELECT * FROM _mirror_batch")
+            else:
+                existing = self._columns[table]
+                for name, dtype, *_ in self.conn.execute("DESCRIBE SELECT * FROM _mirror_batch").fetchall():
+                    if name not in existing:
+                        self.conn.execute(f"ALTER TABLE {_q(table)} ADD COLUMN {_q(name)} {dtype}")
+                    elif (existing[name], dtype) in _WIDEN:
+                        self.conn.execute(f"ALTER TABLE {_q(table)} ALTER COLUMN {_q(name)} TYPE {dtype}")
+                if replace_all:
+                    self.conn.execute(f"DELETE FROM {_q(table)}")
+                else:
+                    cols = ", ".join(_q(k) for k in key)
+                    self.conn.execute(f"DELETE FROM {_q(table)} WHERE ({cols}) IN (SELECT ({cols}) FROM _mirror_batch)")
+                self.conn.execute(f"INSERT INTO {_q(table)} BY NAME SELECT * FROM _mirror_batch")
+        finally:
+            self.conn.unregister("_mirror_batch")
+        for name, dtype, *_ in self.conn.execute(f"DESCRIBE {_q(table)}").fetchall():
+            self._columns.setdefault(table, {})[name] = dtype
+        return json_cols
+
+    # --- Reads ---
+
+    def select(
+        self,
+        table: str,
+        columns: list[str] | None,
+        where: list[tuple[str, str, object]],
+        order: list[tuple[str, bool]],
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[dict]:
+        """
+        Rows from a mirrored table. where is [(column, op, value)] with op in =, <>, >, >=, <, <=, in,
+        is; columns the mirror has never seen (always null so far) read as NULL.
+        """
+        known = self.columns(table)
+
+        def expr(col: str) -> str:
+            return _q(col) if col in known else "NULL"
+
+        names = columns or list(known)
+        sql = f"SELECT {', '.join(f'{expr(c)} AS {_q(c)}' for c in names)} FROM {_q(table)}"
+        params: list = []
+        clauses: list[str] = []
+        for col, op, value in where:
+            if op == "in":
+                values = list(cast(list, value))
+                if not values:
+                    clauses.append("FALSE")
+                    continue
+                clauses.append(f"{expr(col)} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+            elif op == "is":
+                clauses.append(f"{expr(col)} IS {'NULL' if value in (None, 'null') else 'NOT NULL'}")
+            else:
+                clauses.append(f"{expr(col)} {op} ?")
+                params.append(value)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order:
+            sql += " ORDER BY " + ", ".join(f"{expr(c)} {'DESC' if desc else 'ASC'} NULLS LAST" for c, desc in order)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        if offset:
+            sql += f" OFFSET {int(offset)}"
+
+        # One cursor per query: DuckDB connections are not safe to share across threads, cursors are.
+        cur = self.conn.cursor()
+        try:
+            rows = [dict(zip(names, r)) for r in cur.execute(sql, params).fetchall()]
+        finally:
+            cur.close()
+        decode = self.json_columns(table) & set(names)
+        for r in rows:
+            for c in decode:
+                if isinstance(r[c], str):
+                    r[c] = json.loads(r[c])
+        return rows
+
+
+# --- Supabase-compatible adapter ---
+
+class _Response:
+    def __init__(self, data: list[dict]):
+        self.data = data
+        self.error = None
+
+
+class MirrorQuery:
+    """The subset of the PostgREST select builder the jobs use, evaluated against the mirror."""
+
+    def __init__(self, mirror: Mirror, table: str, columns: list[str] | None):
+        self.mirror = mirror
+        self.table = table
+        self.columns = columns
+        self.where: list[tuple[str, str, object]] = []
+        self.ordering: list[tuple[str, bool]] = []
+        self.limit_n: int | None = None
+        self.offset = 0
+
+    def _filter(self, column: str, op: str, value) -> "MirrorQuery":
+        self.where.append((column, op, value))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column: str, value):
+        return self._filter(column, "<>", value)
+
+    def gt(self, column: str, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column: str, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column: str, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column: str, value):
+        return self._filter(column, "<=", value)
+
+    def in_(self, column: str, values):
+        return self._filter(column, "in", values)
+
+    def is_(self, column: str, value):
+        return self._filter(column, "is", value)
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, n: int, **kwargs):
+        self.limit_n = n
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    def execute(self) -> _Response:
+        return _Response(self.mirror.select(self.table, self.columns, self.where, self.ordering, self.limit_n, self.offset))
+
+
+class MirrorTable:
+    def __init__(self, client: "MirrorClient", name: str):
+        self.client = client
+        self.name = name
+
+    def select(self, columns: str = "*", **kwargs):
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        # Embedded resources, renames, casts and counts need PostgREST itself.
+        if kwargs or any(ch in columns for ch in "():!"):
+            return self.client.remote.table(self.name).select(columns, **kwargs)
+        return MirrorQuery(self.client.mirror, self.name, None if cols == ["*"] else cols)
+
+    def __getattr__(self, attr: str):
+        # upsert / insert / update / delete go to Supabase.
+        return getattr(self.client.remote.table(self.name), attr)
+
+
+class MirrorClient:
+    """
+    Drop-in for the Supabase client: selects on tables held in the mirror are answered locally,
+    everything else is passed to `remote`. Reads are as fresh as the last sync.
+    """
+
+    def __init__(self, mirror: Mirror, remote, tables: list[str] | None = None):
+        self.mirror = mirror
+        self.remote = remote
+        self.tables = set(tables or MIRROR_TABLES)
+
+    def table(self, name: str):
+        if name in self.tables and self.mirror.has(name):
+            return MirrorTable(self, name)
+        return self.remote.table(name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self.remote, attr)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync and query the local DuckDB mirror.")
+    parser.add_argument("--path", default=MIRROR_PATH, help="Mirror file (env MIRROR_PATH)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_sync = sub.add_parser("sync", help="Pull rows changed since the last sync")
+    p_sync.add_argument("--tables", default="", help=f"Comma-separated tables (default all: {', '.join(MIRROR_TABLES)})")
+    p_sync.add_argument("--full", action="store_true", help="Ignore watermarks and reload the tables")
+    sub.add_parser("status", help="Row counts and watermarks")
+    p_sql = sub.add_parser("sql", help="Run a query against the mirror")
+    p_sql.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        from supabase import create_client
+
+        from model_pipeline import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+
+        tables = [t.strip() for t in args.tables.split(",") if t.strip()] or None
+        unknown = set(tables or []) - set(MIRROR_TABLES)
+        if unknown:
+            parser.error(f"not mirrored: {', '.join(sorted(unknown))}")
+        sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+        mirror = Mirror(args.path)
+        started = time.perf_counter()
+        fetched = mirror.sync(sb, tables, full=args.full)
+        print(f"[mirror] synced {sum(fetched.values())} rows in {time.perf_counter() - started:.1f}s -> {args.path}")
+        mirror.close()
+        return
+
+    mirror = Mirror(args.path, read_only=True)
+    if args.command == "status":
+        for table, rows, watermark, synced_at in mirror.state():
+            print(f"[mirror] {table:<20} rows={rows:<9} watermark={watermark} synced_at={synced_at}")
+    else:
+        cur = mirror.conn.execute(args.query)
+        print("\t".join(d[0] for d in cur.description))
+        for row in cur.fetchall():
+            print("\t".join("" if v is None else str(v) for v in row))
+    mirror.close()
+
+
+if __name__ == "__main__":
+    main()
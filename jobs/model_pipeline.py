@@ -1,13 +1,25 @@
 import os
 import math
+import argparse
+import hashlib
+import json
+import time
 import bisect
+import gc
+import multiprocessing
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timezone, timedelta, date
-from typing import cast
+from typing import Callable, Iterable, cast
 
+import numpy as np
 from supabase import create_client
 from dotenv import load_dotenv
 
+from player_history import ActiveRosterIndex, PlayerHistoryIndex
+from profiling import StageProfiler
+from props import PROP_LINES_CONFLICT, build_prop_ladders
+
 try:
     from nhlpy import NHLClient
 except Exception:
@@ -18,6 +30,18 @@ load_dotenv(dotenv_path=".env")
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
+MODEL_VERSION = "baseline-poisson-0.1"
+HISTORY_DAYS = 730
+# Active rosters: skaters who appeared in a team's last N games before the projection date.
+ROSTER_RECENT_GAMES = int(os.environ.get("ROSTER_RECENT_GAMES", "5"))
+RATINGS_MODEL_VERSION = "ratings-poisson-0.1"
+# model_version that team_ratings.py writes ratings under.
+TEAM_RATINGS_VERSION = "team-poisson-glm-0.1"
+# model_version that player_ratings.py writes aggregates under.
+PLAYER_RATINGS_VERSION = "player-rates-0.1"
+# Ids per .in_() filter on wide reads, keeping request URLs short.
+IN_CHUNK = 200
+
 # --- Helpers ---
 
 def sb_exec(q, label: str):
@@ -30,6 +54,21 @@ def sb_exec(q, label: str):
     return resp
 
 
+def sb_fetch_all(make_query, label: str, page_size: int = 1000) -> list[dict]:
+    """
+    Page through a select with .range() so results aren't truncated at the PostgREST row limit.
+    make_query must return a fresh, ordered query builder on each call.
+    """
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        batch = sb_exec(make_query().range(offset, offset + page_size - 1), label).data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows
+        offset += page_size
+
+
 def to_date(val) -> date:
     if isinstance(val, datetime):
         return val.date()
@@ -38,6 +77,16 @@ def to_date(val) -> date:
     return datetime.fromisoformat(str(val)).date()
 
 
+def parse_utc(val) -> datetime | None:
+    if not val:
+        return None
+    if isinstance(val, datetime):
+        dt = val
+    else:
+        dt = datetime.fromisoformat(str(val).replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
 def american_odds_from_prob(p: float) -> int | None:
     if p is None or p <= 0.0 or p >= 1.0:
         return None
@@ -82,52 +131,93 @@ def poisson_spread_cover_prob(lam_home: float, lam_away: float, spread_home: flo
 # --- Data pulls ---
 
 def fetch_games(sb, start_date: date, end_date: date) -> list[dict]:
-    resp = sb_exec(
-        sb.table("games")
-        .select("game_id,game_date,home_team_id,away_team_id,status")
+    return sb_fetch_all(
+        lambda: sb.table("games")
+        .select("game_id,game_date,start_time_utc,home_team_id,away_team_id,status")
         .gte("game_date", start_date.isoformat())
-        .lte("game_date", end_date.isoformat()),
+        .lte("game_date", end_date.isoformat())
+        .order("game_date")
+        .order("game_id"),
         "fetch games",
     )
-    return resp.data or []
+
+def select_open_games(games: list[dict], now: datetime, horizon: timedelta) -> list[dict]:
+    """
+    Games that have not started yet and start within `horizon` of `now`.
+    Anything already started (by clock or status) is frozen and never re-projected.
+    """
+    open_games: list[dict] = []
+    for g in games:
+        if (g.get("status") or "scheduled") != "scheduled":
+            continue
+        start = parse_utc(g.get("start_time_utc"))
+        if start is None:
+            # No start time: fall back to the local game date, treating today as already underway.
+            if now.date() < to_date(g["game_date"]) <= (now + horizon).date():
+                open_games.append(g)
+            continue
+        if now < start <= now + horizon:
+            open_games.append(g)
+    return open_games
+
+
+# Per-process caches. A one-shot run starts empty and behaves as before; a long-running process
+# (daemon.py) keeps team abbrevs, fresh rosters and the NHL API client across cycles.
+_TEAM_ABBREVS: dict[int, str] = {}
+_ROSTER_ROWS: dict[tuple[int, str], dict] = {}
+_NHL_CLIENT = None
+# Open DuckDB mirror for --mirror runs; one connection per process, since DuckDB locks the file.
+_MIRROR = None
+
 
 def fetch_team_abbrevs(sb, team_ids: list[int]) -> dict[int, str]:
     if not team_ids:
         return {}
-    resp = sb_exec(
-        sb.table("teams")
-        .select("team_id,abbrev")
-        .in_("team_id", team_ids),
-        "fetch teams",
-    )
-    return {int(r["team_id"]): r["abbrev"] for r in (resp.data or []) if r.get("abbrev")}
+    missing = [tid for tid in team_ids if tid not in _TEAM_ABBREVS]
+    if missing:
+        resp = sb_exec(
+            sb.table("teams")
+            .select("team_id,abbrev")
+            .in_("team_id", missing),
+            "fetch teams",
+        )
+        _TEAM_ABBREVS.update({int(r["team_id"]): r["abbrev"] for r in (resp.data or []) if r.get("abbrev")})
+    return {tid: _TEAM_ABBREVS[tid] for tid in team_ids if tid in _TEAM_ABBREVS}
 
 
 def fetch_game_results(sb, game_ids: list[int]) -> dict[int, dict]:
-    if not game_ids:
-        return {}
-    resp = sb_exec(
-        sb.table("game_results")
-        .select("game_id,home_goals,away_goals,home_sog,away_sog,home_pp_goals,away_pp_goals,home_pp_opps,away_pp_opps")
-        .in_("game_id", game_ids),
-        "fetch game_results",
-    )
-    return {r["game_id"]: r for r in (resp.data or [])}
+    out: dict[int, dict] = {}
+    for i in range(0, len(game_ids), IN_CHUNK):
+        chunk = game_ids[i : i + IN_CHUNK]
+        rows = sb_fetch_all(
+            lambda: sb.table("game_results")
+            .select("game_id,home_goals,away_goals,home_sog,away_sog,home_pp_goals,away_pp_goals,home_pp_opps,away_pp_opps")
+            .in_("game_id", chunk)
+            .order("game_id"),
+            "fetch game_results",
+        )
+        out.update({r["game_id"]: r for r in rows})
+    return out
 
 
 def fetch_player_game_stats(sb, game_ids: list[int]) -> list[dict]:
-    if not game_ids:
-        return []
-    resp = sb_exec(
-        sb.table("player_game_stats")
-        .select("game_id,player_id,team_id,is_goalie,toi_seconds,goals,assists,points,shots,pp_toi_seconds,sh_toi_seconds")
-        .in_("game_id", game_ids),
-        "fetch player_game_stats",
-    )
-    return resp.data or []
+    rows: list[dict] = []
+    for i in range(0, len(game_ids), IN_CHUNK):
+        chunk = game_ids[i : i + IN_CHUNK]
+        rows.extend(
+            sb_fetch_all(
+                lambda: sb.table("player_game_stats")
+                .select("game_id,player_id,team_id,is_goalie,toi_seconds,goals,assists,points,shots,pp_toi_seconds,sh_toi_seconds")
+                .in_("game_id", chunk)
+                .order("game_id")
+                .order("player_id"),
+                "fetch player_game_stats",
+            )
+        )
+    return rows
 
 
-def ensure_model_version(sb, model_version: str, description: str | None = None):
+def ensure_model_version(sb, model_version: str, description: str | None = None, is_active: bool = True):
     existing = (
         sb.table("model_versions")
         .select("model_version")
@@ -140,11 +230,143 @@ def ensure_model_version(sb, model_version: str, description: str | None = None)
         "model_version": model_version,
         "description": description or "auto-created by model pipeline",
         "git_sha": os.environ.get("GIT_SHA"),
-        "is_active": True,
+        "is_active": is_active,
     }
     sb_exec(sb.table("model_versions").insert(row), "insert model_version")
 
 
+# --- Writes ---
+
+def _write_chunk(
+    sb,
+    table: str,
+    chunk: list[dict],
+    on_conflict: str,
+    max_retries: int,
+    backoff_seconds: float,
+    ignore_duplicates: bool = False,
+) -> dict:
+    started = time.perf_counter()
+    attempts = 0
+    error = None
+    while attempts <= max_retries:
+        attempts += 1
+        try:
+            sb_exec(
+                sb.table(table).upsert(chunk, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates),
+                f"upsert {table}",
+            )
+            error = None
+            break
+        except Exception as e:
+            error = str(e)
+            if attempts <= max_retries:
+                time.sleep(backoff_seconds * (2 ** (attempts - 1)))
+    return {
+        "rows": len(chunk),
+        "status": "error" if error else "ok",
+        "attempts": attempts,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error,
+    }
+
+
+def write_chunks(
+    sb,
+    table: str,
+    chunks: Iterable[list[dict]],
+    on_conflict: str,
+    max_workers: int | None = None,
+    max_retries: int | None = None,
+    backoff_seconds: float = 1.0,
+    ignore_duplicates: bool = False,
+    on_chunk_done: Callable[[list[dict], dict], None] | None = None,
+) -> dict:
+    """
+    Upsert a stream of chunks with bounded parallelism.
+    Each chunk is retried on its own with exponential backoff; a chunk that still fails is
+    recorded and skipped, so one bad request never loses the whole batch. At most
+    2 * max_workers chunks are in flight, so generators are consumed lazily.
+    Returns a summary with per-chunk outcomes and timings.
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get("WRITE_WORKERS", "4"))
+    if max_retries is None:
+        max_retries = int(os.environ.get("WRITE_RETRIES", "3"))
+    max_workers = max(1, max_workers)
+
+    started = time.perf_counter()
+    results: list[dict] = []
+    n_rows = 0
+
+    def collect(fut, i: int, chunk: list[dict]):
+        result = {"index": i, **fut.result()}
+        results.append(result)
+        if result["status"] != "ok":
+            print(f"[write] {table} chunk {i} failed after {result['attempts']} attempts: {result['error']}")
+        if on_chunk_done is not None:
+            on_chunk_done(chunk, result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight: dict = {}
+        for i, chunk in enumerate(chunks):
+            if not chunk:
+                continue
+            n_rows += len(chunk)
+            fut = pool.submit(
+                _write_chunk, sb, table, chunk, on_conflict, max_retries, backoff_seconds, ignore_duplicates
+            )
+            in_flight[fut] = (i, chunk)
+            if len(in_flight) >= 2 * max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    collect(fut, *in_flight.pop(fut))
+        for fut in as_completed(list(in_flight)):
+            collect(fut, *in_flight.pop(fut))
+
+    results.sort(key=lambda r: r["index"])
+    return {
+        "table": table,
+        "rows": n_rows,
+        "failed_rows": sum(r["rows"] for r in results if r["status"] != "ok"),
+        "seconds": round(time.perf_counter() - started, 3),
+        "chunks": results,
+    }
+
+
+def write_rows_chunked(
+    sb,
+    table: str,
+    rows: list[dict],
+    on_conflict: str,
+    chunk_size: int | None = None,
+    max_workers: int | None = None,
+    max_retries: int | None = None,
+    backoff_seconds: float = 1.0,
+) -> dict:
+    """Upsert rows in WRITE_CHUNK_SIZE chunks via write_chunks."""
+    if chunk_size is None:
+        chunk_size = int(os.environ.get("WRITE_CHUNK_SIZE", "500"))
+    chunk_size = max(1, chunk_size)
+    chunks = (rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size))
+    return write_chunks(
+        sb, table, chunks, on_conflict, max_workers=max_workers, max_retries=max_retries, backoff_seconds=backoff_seconds
+    )
+
+
+def finish_projection_run(sb, run_id, status: str, metrics: dict, message: str | None = None):
+    if not run_id:
+        return
+    row = {
+        "status": status,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "metrics": metrics,
+    }
+    if message:
+        row["message"] = message
+    sb_exec(sb.table("projection_runs").update(row).eq("run_id", run_id), "update projection_runs")
+
+
 # --- Feature building ---
 
 def build_team_game_rows(games: list[dict], results_by_game: dict[int, dict]) -> list[dict]:
@@ -382,27 +604,168 @@ def extract_roster_player_ids(roster) -> list[int]:
     return sorted(set(player_ids))
 
 
+def fetch_cached_rosters(sb, team_seasons: set[tuple[int, str]]) -> dict[tuple[int, str], dict]:
+    """
+    Latest cached roster row per (team_id, season) from the rosters table, regardless of age.
+    """
+    if not team_seasons:
+        return {}
+    team_ids = sorted({tid for tid, _ in team_seasons})
+    seasons = sorted({season for _, season in team_seasons})
+    resp = sb_exec(
+        sb.table("rosters")
+        .select("team_id,season,fetched_date,fetched_at,player_ids")
+        .in_("team_id", team_ids)
+        .in_("season", seasons)
+        .order("fetched_at", desc=True),
+        "fetch rosters",
+    )
+    cached: dict[tuple[int, str], dict] = {}
+    for r in resp.data or []:
+        key = (int(r["team_id"]), str(r["season"]))
+        if key in team_seasons and key not in cached:
+            cached[key] = r
+    return cached
+
+
+def _roster_is_fresh(row: dict, now: datetime, ttl: timedelta) -> bool:
+    fetched = parse_utc(row.get("fetched_at"))
+    return fetched is not None and now - fetched < ttl
+
+
+def _fetch_roster_from_api(client, abbr: str, season: str) -> list[int]:
+    if hasattr(client.teams, "team_roster"):
+        roster = client.teams.team_roster(team_abbr=abbr, season=season)
+    else:
+        roster = client.teams.roster(team_abbr=abbr, season=season)
+    return extract_roster_player_ids(roster)
+
+
 def fetch_team_rosters(
-    team_abbrev_by_id: dict[int, str], team_seasons: set[tuple[int, str]]
+    team_abbrev_by_id: dict[int, str],
+    team_seasons: set[tuple[int, str]],
+    sb=None,
+    ttl_hours: float | None = None,
+    max_workers: int | None = None,
 ) -> dict[tuple[int, str], list[int]]:
+    """
+    Resolve rosters for (team_id, season) pairs.
+      - fresh rows in the rosters table (younger than ROSTER_CACHE_TTL_HOURS) are used as-is; rows
+        already read by this process are reused while fresh
+      - cache misses are fetched from the NHL API concurrently and written back to the cache
+      - if the API fails for a team, the last-known cached roster is used instead
+    Pass sb=None to bypass the cache entirely.
+    """
+    global _NHL_CLIENT
     if not team_seasons:
         return {}
+    if ttl_hours is None:
+        ttl_hours = float(os.environ.get("ROSTER_CACHE_TTL_HOURS", "12"))
+    if max_workers is None:
+        max_workers = int(os.environ.get("ROSTER_FETCH_WORKERS", "8"))
+
+    now = datetime.now(timezone.utc)
+    ttl = timedelta(hours=ttl_hours)
+    cached: dict[tuple[int, str], dict] = {}
+    if sb is not None:
+        cached = {key: _ROSTER_ROWS[key] for key in team_seasons if key in _ROSTER_ROWS and _roster_is_fresh(_ROSTER_ROWS[key], now, ttl)}
+        stale = team_seasons - cached.keys()
+        if stale:
+            cached.update(fetch_cached_rosters(sb, stale))
+
+    rosters: dict[tuple[int, str], list[int]] = {}
+    misses: list[tuple[int, str]] = []
+    for key in sorted(team_seasons):
+        row = cached.get(key)
+        if row and _roster_is_fresh(row, now, ttl):
+            rosters[key] = [int(pid) for pid in (row.get("player_ids") or [])]
+        elif team_abbrev_by_id.get(key[0]):
+            misses.append(key)
+    print(f"[rosters] {len(rosters)} cached, {len(misses)} to fetch")
+    if not misses:
+        return rosters
+
+    fetched: dict[tuple[int, str], list[int]] = {}
+    failed: dict[tuple[int, str], str] = {}
     if NHLClient is None:
+        for key in misses:
+            failed[key] = "nhl-api-py is not installed"
+    else:
+        if _NHL_CLIENT is None:
+            _NHL_CLIENT = NHLClient()
+        client = _NHL_CLIENT
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as pool:
+            futures = {
+                pool.submit(_fetch_roster_from_api, client, team_abbrev_by_id[tid], season): (tid, season)
+                for tid, season in misses
+            }
+            for fut in as_completed(futures):
+                key = futures[fut]
+                try:
+                    fetched[key] = fut.result()
+                except Exception as e:
+                    failed[key] = str(e)
+
+    rosters.update(fetched)
+
+    missing: list[tuple[int, str]] = []
+    for key, err in sorted(failed.items()):
+        row = cached.get(key)
+        if row:
+            print(f"[rosters] fetch failed for team_id={key[0]} season={key[1]} ({err}); using roster from {row.get('fetched_date')}")
+            rosters[key] = [int(pid) for pid in (row.get("player_ids") or [])]
+        else:
+            print(f"[rosters] fetch failed for team_id={key[0]} season={key[1]} ({err}); no cached roster")
+            missing.append(key)
+    if missing and NHLClient is None:
         raise RuntimeError(
             "nhl-api-py is not installed. Install it to fetch rosters (pip install nhl-api-py)."
         )
 
-    client = NHLClient()
-    rosters: dict[tuple[int, str], list[int]] = {}
-    for team_id, season in sorted(team_seasons):
-        abbr = team_abbrev_by_id.get(team_id)
-        if not abbr:
-            continue
-        if hasattr(client.teams, "team_roster"):
-            roster = client.teams.team_roster(team_abbr=abbr, season=season)
-        else:
-            roster = client.teams.roster(team_abbr=abbr, season=season)
-        rosters[(team_id, season)] = extract_roster_player_ids(roster)
+    if sb is not None and fetched:
+        now_iso = now.isoformat()
+        cache_rows = [
+            {
+                "team_id": tid,
+                "season": season,
+                "fetched_date": now.date().isoformat(),
+                "fetched_at": now_iso,
+                "player_ids": player_ids,
+            }
+            for (tid, season), player_ids in sorted(fetched.items())
+        ]
+        sb_exec(
+            sb.table("rosters").upsert(cache_rows, on_conflict="team_id,season,fetched_date"),
+            "upsert rosters",
+        )
+        cached.update({(r["team_id"], r["season"]): r for r in cache_rows})
+    if sb is not None:
+        _ROSTER_ROWS.update(cached)
+    return rosters
+
+
+def active_rosters_for_games(
+    index: ActiveRosterIndex,
+    proj_games: list[dict],
+    last_n: int = ROSTER_RECENT_GAMES,
+    api_rosters: dict[tuple[int, str], list[int]] | None = None,
+) -> dict[tuple[int, int], list[int]]:
+    """
+    (game_id, team_id) -> skaters who dressed in the team's last `last_n` games before the game date.
+    With api_rosters, keep only players also on the team's season roster (drops traded or
+    reassigned players); a team-season missing from api_rosters keeps the recent list.
+    """
+    rosters: dict[tuple[int, int], list[int]] = {}
+    for g in proj_games:
+        gid = int(g["game_id"])
+        gdate = to_date(g["game_date"])
+        for team_id in (int(g["home_team_id"]), int(g["away_team_id"])):
+            recent = index.roster(team_id, gdate, last_n)
+            api = (api_rosters or {}).get((team_id, season_string_for_date(gdate)))
+            if api:
+                allowed = set(api)
+                recent = [pid for pid in recent if pid in allowed]
+            rosters[(gid, team_id)] = recent
     return rosters
 
 
@@ -412,52 +775,59 @@ def build_player_features_for_games(
     proj_games: list[dict],
     rosters_by_team_season: dict[tuple[int, str], list[int]],
     window: int = 10,
+    history: PlayerHistoryIndex | None = None,
+    rosters_by_game: dict[tuple[int, int], list[int]] | None = None,
 ) -> dict[tuple[int, int], dict]:
-    by_player = defaultdict(list)
-    for r in stats_rows:
-        if r.get("is_goalie"):
-            continue
-        gid = r.get("game_id")
-        if gid is None:
-            continue
-        gdate = game_date_by_id.get(int(gid))
-        if not gdate:
-            continue
-        rr = dict(r)
-        rr["game_date"] = gdate
-        by_player[int(r["player_id"])].append(rr)
-
-    player_dates: dict[int, list[date]] = {}
-    for pid in by_player:
-        by_player[pid].sort(key=lambda x: x["game_date"])
-        player_dates[pid] = [cast(date, r["game_date"]) for r in by_player[pid]]
-
-    features: dict[tuple[int, int], dict] = {}
+    """
+    Rolling skater features for every rostered player in proj_games. Rosters come from
+    rosters_by_game ((game_id, team_id) -> player ids, see active_rosters_for_games) when given,
+    else from the season rosters in rosters_by_team_season.
+    """
+    if history is None:
+        history = PlayerHistoryIndex.from_stats_rows(stats_rows, game_date_by_id)
+
+    # Flatten (game, roster player) pairs so every window is computed in one vectorized pass.
+    q_game_ids: list[int] = []
+    q_team_ids: list[int] = []
+    q_player_ids: list[int] = []
+    q_dates: list[int] = []
     for g in proj_games:
         gid = int(g["game_id"])
         gdate = to_date(g["game_date"])
         season = season_string_for_date(gdate)
         for team_id in (int(g["home_team_id"]), int(g["away_team_id"])):
-            roster_ids = rosters_by_team_season.get((team_id, season)) or []
-            for pid in roster_ids:
-                rows = by_player.get(pid) or []
-                dates = player_dates.get(pid) or []
-                idx = bisect.bisect_left(dates, gdate)
-                recent = rows[max(0, idx - window) : idx]
-                if recent:
-                    shots = sum(x.get("shots") or 0 for x in recent) / len(recent)
-                    goals = sum(x.get("goals") or 0 for x in recent) / len(recent)
-                    toi = sum(x.get("toi_seconds") or 0 for x in recent) / len(recent)
-                    shooting_pct = (goals / shots) if shots else None
-                else:
-                    shots = goals = toi = shooting_pct = None
-                features[(gid, pid)] = {
-                    "shots_avg": shots,
-                    "goals_avg": goals,
-                    "toi_avg": toi,
-                    "shooting_pct": shooting_pct,
-                    "team_id": team_id,
-                }
+            if rosters_by_game is not None:
+                roster_ids = rosters_by_game.get((gid, team_id)) or []
+            else:
+                roster_ids = rosters_by_team_season.get((team_id, season)) or []
+            q_game_ids.extend([gid] * len(roster_ids))
+            q_team_ids.extend([team_id] * len(roster_ids))
+            q_player_ids.extend(roster_ids)
+            q_dates.extend([gdate.toordinal()] * len(roster_ids))
+
+    counts, means = history.window_means(np.array(q_player_ids, dtype=np.int64), np.array(q_dates, dtype=np.int64), window)
+    shots_avg = means["shots"].tolist()
+    goals_avg = means["goals"].tolist()
+    assists_avg = means["assists"].tolist()
+    points_avg = means["points"].tolist()
+    toi_avg = means["toi_seconds"].tolist()
+
+    features: dict[tuple[int, int], dict] = {}
+    for i, n in enumerate(counts.tolist()):
+        if n:
+            shots, goals, assists, points, toi = shots_avg[i], goals_avg[i], assists_avg[i], points_avg[i], toi_avg[i]
+            shooting_pct = (goals / shots) if shots else None
+        else:
+            shots = goals = assists = points = toi = shooting_pct = None
+        features[(q_game_ids[i], q_player_ids[i])] = {
+            "shots_avg": shots,
+            "goals_avg": goals,
+            "assists_avg": assists,
+            "points_avg": points,
+            "toi_avg": toi,
+            "shooting_pct": shooting_pct,
+            "team_id": q_team_ids[i],
+        }
     return features
 
 
@@ -492,27 +862,28 @@ def build_game_projections(
         if not hf or not af:
             continue
         lam_home, lam_away = compute_expected_goals(hf, af, league_avg)
-        total_mean = lam_home + lam_away
-        home_win_prob = poisson_win_prob(lam_home, lam_away)
-        away_win_prob = 1.0 - home_win_prob
-        rows.append(
-            {
-                "game_id": gid,
-                "generated_at": now,
-                "home_goals_mean": lam_home,
-                "away_goals_mean": lam_away,
-                "total_goals_mean": total_mean,
-                "home_win_prob": home_win_prob,
-                "away_win_prob": away_win_prob,
-                "home_ml_american": american_odds_from_prob(home_win_prob),
-                "away_ml_american": american_odds_from_prob(away_win_prob),
-                "goals_dist": "poisson",
-                "goals_params": {"lam_home": lam_home, "lam_away": lam_away},
-            }
-        )
+        rows.append(game_projection_row(gid, lam_home, lam_away, now))
     return rows
 
 
+def game_projection_row(game_id: int, lam_home: float, lam_away: float, generated_at: str) -> dict:
+    home_win_prob = poisson_win_prob(lam_home, lam_away)
+    away_win_prob = 1.0 - home_win_prob
+    return {
+        "game_id": game_id,
+        "generated_at": generated_at,
+        "home_goals_mean": lam_home,
+        "away_goals_mean": lam_away,
+        "total_goals_mean": lam_home + lam_away,
+        "home_win_prob": home_win_prob,
+        "away_win_prob": away_win_prob,
+        "home_ml_american": american_odds_from_prob(home_win_prob),
+        "away_ml_american": american_odds_from_prob(away_win_prob),
+        "goals_dist": "poisson",
+        "goals_params": {"lam_home": lam_home, "lam_away": lam_away},
+    }
+
+
 def build_player_projections(player_features: dict) -> list[dict]:
     rows: list[dict] = []
     now = datetime.now(timezone.utc).isoformat()
@@ -530,68 +901,169 @@ def build_player_projections(player_features: dict) -> list[dict]:
                 "generated_at": now,
                 "shots_mean": shots_mean,
                 "goals_mean": goals_mean,
+                "assists_mean": f.get("assists_avg"),
+                "points_mean": f.get("points_avg"),
             }
         )
     return rows
 
 
-def main():
-    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+# --- Modeling (team ratings) ---
 
-    # Train/infer window: last 2 seasons of games for baselines, next 3 days for projections.
-    today = datetime.now(timezone.utc).date()
-    hist_start = today - timedelta(days=730)
-    hist_end = today - timedelta(days=1)
+def _ratings_snapshot(as_of_date: str, rows: list[dict]) -> dict:
+    try:
+        intercepts = json.loads(rows[0].get("notes") or "{}").get("intercepts") or {}
+    except ValueError:
+        intercepts = {}
+    return {
+        "as_of_date": as_of_date,
+        "goals_intercept": float(intercepts.get("goals", 0.0)),
+        "home_ice": float(rows[0].get("home_ice_rating") or 0.0),
+        "by_team": {int(r["team_id"]): r for r in rows},
+    }
 
-    hist_games = fetch_games(sb, hist_start, hist_end)
-    hist_game_ids = [g["game_id"] for g in hist_games]
-    hist_results = fetch_game_results(sb, hist_game_ids)
 
-    team_rows = build_team_game_rows(hist_games, hist_results)
-    if not team_rows:
-        print("[model] no historical team rows available")
-        return
+def fetch_team_ratings_history(sb, start: date, end: date, ratings_version: str = TEAM_RATINGS_VERSION) -> list[dict]:
+    """
+    team_ratings snapshots in effect over [start, end], oldest first: the latest as_of_date on or
+    before start, then every later one through end. Each is {"as_of_date", "goals_intercept",
+    "home_ice", "by_team"}. Empty when nothing has been fitted by end.
+    """
+    latest = sb_exec(
+        sb.table("team_ratings")
+        .select("as_of_date")
+        .eq("model_version", ratings_version)
+        .lte("as_of_date", start.isoformat())
+        .order("as_of_date", desc=True)
+        .limit(1),
+        "fetch latest team_ratings date",
+    ).data
+    first = str(latest[0]["as_of_date"])[:10] if latest else start.isoformat()
+    rows = sb_fetch_all(
+        lambda: sb.table("team_ratings")
+        .select("as_of_date,team_id,attack_rating,defense_rating,home_ice_rating,notes")
+        .eq("model_version", ratings_version)
+        .gte("as_of_date", first)
+        .lte("as_of_date", end.isoformat())
+        .order("as_of_date")
+        .order("team_id"),
+        "fetch team_ratings",
+    )
+    by_date: dict[str, list[dict]] = defaultdict(list)
+    for r in rows:
+        by_date[str(r["as_of_date"])[:10]].append(r)
+    return [_ratings_snapshot(d, by_date[d]) for d in sorted(by_date)]
 
-    league_avg = sum((r.get("goals_for") or 0) for r in team_rows) / max(1, len(team_rows))
 
-    # Projection range start: default to start of 2025-2026 season, override via PROJ_START_DATE (YYYY-MM-DD).
-    proj_start_env = os.environ.get("PROJ_START_DATE")
-    proj_start = date.fromisoformat(proj_start_env) if proj_start_env else date(2025, 10, 1)
-    proj_end = today + timedelta(days=2)
-    proj_games = fetch_games(sb, proj_start, proj_end)
+def ratings_as_of(snapshots: list[dict], d: date) -> dict | None:
+    """The latest snapshot with as_of_date on or before d (ratings as of d only use games before d)."""
+    i = bisect.bisect_right([s["as_of_date"] for s in snapshots], d.isoformat())
+    return snapshots[i - 1] if i else None
 
-    team_features = compute_team_features_for_games(team_rows, proj_games, window=10)
-    game_proj_rows = build_game_projections(proj_games, team_features, league_avg)
 
-    game_date_by_id = {int(g["game_id"]): to_date(g["game_date"]) for g in hist_games + proj_games}
-    proj_team_ids = sorted({int(g["home_team_id"]) for g in proj_games} | {int(g["away_team_id"]) for g in proj_games})
-    team_abbrev_by_id = fetch_team_abbrevs(sb, proj_team_ids)
-    team_seasons = {
-        (int(tid), season_string_for_date(to_date(g["game_date"])))
-        for g in proj_games
-        for tid in (g["home_team_id"], g["away_team_id"])
-    }
-    rosters_by_team_season = fetch_team_rosters(team_abbrev_by_id, team_seasons)
+def build_rating_game_projections(games: list[dict], ratings: list[dict]) -> list[dict]:
+    """
+    Goal expectations from fitted attack/defense ratings, each game scored with the snapshot in
+    effect on its date; unrated teams count as league average.
+    """
+    rows: list[dict] = []
+    now = datetime.now(timezone.utc).isoformat()
 
-    player_stats = fetch_player_game_stats(sb, hist_game_ids)
-    player_features = build_player_features_for_games(
-        player_stats,
-        game_date_by_id,
-        proj_games,
-        rosters_by_team_season,
-        window=10,
-    )
-    player_proj_rows = build_player_projections(player_features)
+    for g in games:
+        snapshot = ratings_as_of(ratings, to_date(g["game_date"]))
+        if snapshot is None:
+            raise RuntimeError(f"no {TEAM_RATINGS_VERSION} team_ratings on or before {g['game_date']} (game {g['game_id']})")
+        by_team = snapshot["by_team"]
+
+        def rating(team_id: int, field: str) -> float:
+            return float((by_team.get(int(team_id)) or {}).get(field) or 0.0)
+
+        home_id, away_id = g["home_team_id"], g["away_team_id"]
+        lam_home = math.exp(
+            snapshot["goals_intercept"] + snapshot["home_ice"] + rating(home_id, "attack_rating") - rating(away_id, "defense_rating")
+        )
+        lam_away = math.exp(snapshot["goals_intercept"] + rating(away_id, "attack_rating") - rating(home_id, "defense_rating"))
+        rows.append(game_projection_row(g["game_id"], lam_home, lam_away, now))
+    return rows
 
-    # Persist projections
-    model_version = "baseline-poisson-0.1"
-    ensure_model_version(sb, model_version)
+
+# --- Model registry ---
+
+# model_version -> {"score", "description", "needs"}. A scorer takes the shared inputs built once per
+# pipeline run (proj_games, team_features, league_avg, player_features, plus anything listed in
+# "needs") and returns (game_rows, player_rows) without mutating the inputs.
+MODEL_REGISTRY: dict[str, dict] = {}
+
+
+def register_model(model_version: str, description: str, needs: tuple[str, ...] = ()):
+    def decorator(score: Callable[[dict], tuple[list[dict], list[dict]]]):
+        MODEL_REGISTRY[model_version] = {"score": score, "description": description, "needs": needs}
+        return score
+
+    return decorator
+
+
+@register_model(MODEL_VERSION, "baseline poisson + rolling rates")
+def score_baseline(inputs: dict) -> tuple[list[dict], list[dict]]:
+    game_rows = build_game_projections(inputs["proj_games"], inputs["team_features"], inputs["league_avg"])
+    return game_rows, build_player_projections(inputs["player_features"])
+
+
+@register_model(RATINGS_MODEL_VERSION, "poisson from fitted team_ratings + rolling player rates", needs=("team_ratings",))
+def score_team_ratings(inputs: dict) -> tuple[list[dict], list[dict]]:
+    if not inputs["team_ratings"]:
+        raise RuntimeError(f"no {TEAM_RATINGS_VERSION} team_ratings available")
+    game_rows = build_rating_game_projections(inputs["proj_games"], inputs["team_ratings"])
+    return game_rows, build_player_projections(inputs["player_features"])
+
+
+def resolve_models(sb, requested: list[str] | None) -> list[str]:
+    """Explicitly requested models, else every active model_versions row with a registered scorer."""
+    if requested:
+        unknown = [m for m in requested if m not in MODEL_REGISTRY]
+        if unknown:
+            raise ValueError(f"unregistered model versions: {', '.join(unknown)}")
+        return requested
+    active = [
+        r["model_version"]
+        for r in sb_exec(
+            sb.table("model_versions").select("model_version").eq("is_active", True), "fetch active model_versions"
+        ).data
+        or []
+    ]
+    skipped = [m for m in active if m not in MODEL_REGISTRY]
+    if skipped:
+        print(f"[model] active but not registered, skipping: {', '.join(skipped)}")
+    return [m for m in active if m in MODEL_REGISTRY] or [MODEL_VERSION]
+
+
+def _profile_metrics(prof: StageProfiler) -> dict:
+    metrics = prof.metrics()
+    return {"profile": metrics} if metrics else {}
+
+
+def write_projection_run(
+    sb,
+    model_version: str,
+    game_proj_rows: list[dict],
+    player_proj_rows: list[dict],
+    notes: str,
+    prof: StageProfiler | None = None,
+    inputs_hash: str | None = None,
+    watermarks: dict | None = None,
+    prop_rows: list[dict] | None = None,
+) -> dict:
+    """
+    Insert a projection_runs row for one model, write its projections and prop ladders, and finish the run.
+    prop_rows: ladders already built from player_proj_rows (sharded rebuilds build them in the workers).
+    """
+    ensure_model_version(sb, model_version, MODEL_REGISTRY.get(model_version, {}).get("description"))
     run_row = {
         "model_version": model_version,
         "git_sha": os.environ.get("GIT_SHA"),
-        "inputs_hash": None,
-        "notes": "baseline poisson + rolling rates",
-        "status": "success",
+        "inputs_hash": inputs_hash,
+        "notes": notes,
+        "status": "running",
     }
     run = sb_exec(sb.table("projection_runs").insert(run_row), "insert projection_runs")
     run_id = run.data[0]["run_id"] if run.data else None
@@ -603,20 +1075,496 @@ def main():
         r["model_version"] = model_version
         r["projection_run_id"] = run_id
         r.setdefault("is_goalie", False)
+    if prop_rows is None:
+        prop_rows = build_prop_ladders(player_proj_rows)
+    for r in prop_rows:
+        r["model_version"] = model_version
+        r["projection_run_id"] = run_id
 
-    if game_proj_rows:
-        sb_exec(
-            sb.table("game_projections").upsert(game_proj_rows, on_conflict="game_id,model_version"),
-            "upsert game_projections",
+    prof = prof or StageProfiler()
+    writes: list[dict] = []
+    try:
+        with prof.stage(f"write:{model_version}"):
+            writes.append(write_rows_chunked(sb, "game_projections", game_proj_rows, on_conflict="game_id,model_version"))
+            writes.append(
+                write_rows_chunked(sb, "player_projections", player_proj_rows, on_conflict="game_id,model_version,player_id")
+            )
+            writes.append(write_rows_chunked(sb, "player_prop_lines", prop_rows, on_conflict=PROP_LINES_CONFLICT))
+    except Exception as e:
+        finish_projection_run(
+            sb, run_id, "error", {"writes": writes, "watermarks": watermarks, **_profile_metrics(prof)}, message=str(e)
         )
-    if player_proj_rows:
-        sb_exec(
-            sb.table("player_projections").upsert(player_proj_rows, on_conflict="game_id,model_version,player_id"),
-            "upsert player_projections",
+        raise
+
+    failed_rows = sum(w["failed_rows"] for w in writes)
+    total_rows = sum(w["rows"] for w in writes)
+    if not failed_rows:
+        status = "success"
+    elif failed_rows < total_rows:
+        status = "partial"
+    else:
+        status = "error"
+    finish_projection_run(sb, run_id, status, {"writes": writes, "watermarks": watermarks, **_profile_metrics(prof)})
+
+    for w in writes:
+        print(
+            f"[model] {model_version}: wrote {w['rows'] - w['failed_rows']}/{w['rows']} {w['table']} rows "
+            f"in {len(w['chunks'])} chunks ({w['seconds']:.2f}s)"
         )
+    return {"model_version": model_version, "run_id": run_id, "status": status, "failed_rows": failed_rows}
+
+
+# --- Sharded rebuilds ---
+
+# Shards per worker, so a slow date range doesn't leave the other workers idle at the end.
+REBUILD_SHARDS_PER_WORKER = 4
+# Read-only inputs for rebuild shards. Set in the parent just before the pool forks, so workers
+# inherit the history copy-on-write instead of each unpickling it.
+_SHARD_INPUTS: dict = {}
+
+
+def can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def shard_games_by_date(games: list[dict], n_shards: int) -> list[list[dict]]:
+    """Split games into up to n_shards contiguous date ranges of similar size; a date is never split."""
+    by_date: dict[date, list[dict]] = defaultdict(list)
+    for g in games:
+        by_date[to_date(g["game_date"])].append(g)
+    target = max(1, math.ceil(len(games) / max(1, n_shards)))
+    shards: list[list[dict]] = [[]]
+    for d in sorted(by_date):
+        if shards[-1] and len(shards[-1]) + len(by_date[d]) > target:
+            shards.append([])
+        shards[-1].extend(by_date[d])
+    return [s for s in shards if s]
+
+
+def _score_shard(shard: list[dict]) -> dict[str, dict]:
+    """Features and projections for one shard of games, per model: {"game", "player", "props"} or {"error"}."""
+    inp = _SHARD_INPUTS
+    team_features = compute_team_features_for_games(inp["team_rows"], shard, window=10)
+    player_features = build_player_features_for_games(
+        inp["player_stats"],
+        inp["game_date_by_id"],
+        shard,
+        inp["rosters"],
+        window=10,
+        history=inp["player_history"],
+        rosters_by_game=inp["rosters_by_game"],
+    )
+    inputs = {
+        "proj_games": shard,
+        "team_features": team_features,
+        "league_avg": inp["league_avg"],
+        "player_features": player_features,
+        "team_ratings": inp["team_ratings"],
+    }
+    out: dict[str, dict] = {}
+    for model_version in inp["model_versions"]:
+        try:
+            game_rows, player_rows = MODEL_REGISTRY[model_version]["score"](inputs)
+        except Exception as e:
+            out[model_version] = {"error": str(e)}
+            continue
+        for r in player_rows:
+            r.setdefault("is_goalie", False)
+        out[model_version] = {"game": game_rows, "player": player_rows, "props": build_prop_ladders(player_rows)}
+    return out
+
+
+def score_sharded(shared: dict, proj_games: list[dict], model_versions: list[str], workers: int) -> dict[str, dict]:
+    """
+    Score proj_games for every model across forked workers, one date shard at a time, and merge the
+    shards' rows per model. shared holds the read-only history (team_rows, player_stats,
+    game_date_by_id, player_history, rosters, rosters_by_game, league_avg, team_ratings).
+    """
+    global _SHARD_INPUTS
+    shards = shard_games_by_date(proj_games, workers * REBUILD_SHARDS_PER_WORKER)
+    print(f"[model] scoring {len(proj_games)} games in {len(shards)} date shards across {workers} workers")
+    merged: dict[str, dict] = {m: {"game": [], "player": [], "props": []} for m in model_versions}
+    _SHARD_INPUTS = {**shared, "model_versions": model_versions}
+    # Frozen objects are skipped by the collector, so workers don't dirty (and copy) inherited pages.
+    gc.freeze()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            for part in pool.map(_score_shard, shards):
+                for model_version, result in part.items():
+                    if "error" in result:
+                        merged[model_version].setdefault("error", result["error"])
+                        continue
+                    for key in ("game", "player", "props"):
+                        merged[model_version][key].extend(result[key])
+    finally:
+        gc.unfreeze()
+        _SHARD_INPUTS = {}
+    return merged
+
+
+# --- Input watermarks ---
+
+def _max_value(sb, table: str, column: str, label: str, filters: dict | None = None) -> str | None:
+    query = sb.table(table).select(column)
+    for k, v in (filters or {}).items():
+        query = query.eq(k, v)
+    rows = sb_exec(query.order(column, desc=True).limit(1), label).data or []
+    return rows[0][column] if rows and rows[0].get(column) is not None else None
+
+
+def compute_watermarks(sb, proj_games: list[dict], model_versions: list[str]) -> dict:
+    """
+    Everything a projection run depends on, reduced to a handful of single-row lookups: latest
+    result/stat updates, latest successful ingestion, latest roster fetch, model/code versions,
+    and the open games (ids, start times and status) being projected.
+    """
+    return {
+        "game_results": _max_value(sb, "game_results", "updated_at", "watermark game_results"),
+        "player_game_stats": _max_value(sb, "player_game_stats", "updated_at", "watermark player_game_stats"),
+        "ingestion": _max_value(
+            sb, "ingestion_runs", "finished_at", "watermark ingestion_runs", filters={"status": "success"}
+        ),
+        "rosters": _max_value(sb, "rosters", "fetched_at", "watermark rosters"),
+        "models": sorted(model_versions),
+        "git_sha": os.environ.get("GIT_SHA"),
+        "games": sorted(
+            [int(g["game_id"]), str(g.get("start_time_utc") or g.get("game_date")), g.get("status")] for g in proj_games
+        ),
+    }
+
+
+def hash_watermarks(watermarks: dict) -> str:
+    return hashlib.sha256(json.dumps(watermarks, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
 
-    print(f"[model] wrote {len(game_proj_rows)} game projections")
-    print(f"[model] wrote {len(player_proj_rows)} player projections")
+def inputs_unchanged(sb, model_versions: list[str], inputs_hash: str) -> bool:
+    """True when every model's latest successful or skipped run was built from the same inputs."""
+    rows = sb_exec(
+        sb.table("projection_runs")
+        .select("model_version,inputs_hash,status,generated_at")
+        .in_("model_version", model_versions)
+        .in_("status", ["success", "skipped"])
+        .order("generated_at", desc=True)
+        .limit(10 * len(model_versions)),
+        "fetch last projection_runs",
+    ).data or []
+    latest: dict[str, str | None] = {}
+    for r in rows:
+        latest.setdefault(r["model_version"], r.get("inputs_hash"))
+    return all(latest.get(m) == inputs_hash for m in model_versions)
+
+
+def record_skipped_run(sb, model_version: str, inputs_hash: str, watermarks: dict):
+    now = datetime.now(timezone.utc).isoformat()
+    sb_exec(
+        sb.table("projection_runs").insert(
+            {
+                "model_version": model_version,
+                "git_sha": os.environ.get("GIT_SHA"),
+                "inputs_hash": inputs_hash,
+                "notes": "inputs unchanged",
+                "status": "skipped",
+                "finished_at": now,
+                "metrics": {"watermarks": watermarks},
+            }
+        ),
+        "insert skipped projection_runs",
+    )
+
+
+def parse_rebuild_range(value: str) -> tuple[date, date]:
+    start_s, sep, end_s = value.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected START:END (YYYY-MM-DD:YYYY-MM-DD)")
+    start, end = date.fromisoformat(start_s), date.fromisoformat(end_s)
+    if end < start:
+        raise argparse.ArgumentTypeError("rebuild range end must be >= start")
+    return start, end
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build and persist NHL Edge projections.")
+    parser.add_argument(
+        "--horizon-hours",
+        type=float,
+        default=float(os.environ.get("PROJ_HORIZON_HOURS", "72")),
+        help="Project games starting within this many hours from now (default 72, env PROJ_HORIZON_HOURS)",
+    )
+    parser.add_argument(
+        "--rebuild-range",
+        type=parse_rebuild_range,
+        metavar="START:END",
+        help="Deliberately recompute projections for every game in this date range, including started games",
+    )
+    parser.add_argument(
+        "--models",
+        type=lambda v: [m.strip() for m in v.split(",") if m.strip()],
+        default=None,
+        help="Comma-separated model versions to score (default: every active model_versions row)",
+    )
+    parser.add_argument(
+        "--model-workers",
+        type=int,
+        default=int(os.environ.get("MODEL_WORKERS", "1")),
+        help="Score and write models in parallel threads (env MODEL_WORKERS)",
+    )
+    parser.add_argument(
+        "--rebuild-workers",
+        type=int,
+        default=int(os.environ.get("REBUILD_WORKERS", "1")),
+        help="With --rebuild-range, compute features and score date shards in this many forked processes (env REBUILD_WORKERS)",
+    )
+    parser.add_argument(
+        "--roster-source",
+        choices=("recent", "api", "both"),
+        default=os.environ.get("ROSTER_SOURCE", "recent"),
+        help="Players to project: skaters from each team's last ROSTER_RECENT_GAMES games (recent), the NHL API season "
+        "roster (api), or recent players also on the API roster (both). Env ROSTER_SOURCE",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall/CPU time, peak RSS and top allocations per stage into projection_runs.metrics",
+    )
+    parser.add_argument("--profile-out", metavar="PATH", help="Also dump cProfile stats to PATH (implies --profile)")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Run even when the input watermarks match the last successful run",
+    )
+    parser.add_argument(
+        "--mirror",
+        metavar="PATH",
+        default=os.environ.get("PIPELINE_MIRROR_PATH"),
+        help="Sync game/result/stat tables into this DuckDB mirror and read them from it (env PIPELINE_MIRROR_PATH)",
+    )
+    args = parser.parse_args(argv)
+    if args.profile_out:
+        args.profile = True
+    return args
+
+
+def load_history(sb, start: date, end: date, history=None) -> tuple[list[dict], dict[int, dict], list[dict]]:
+    """
+    Games, results by game and player game stats for the history window. `history` is anything with
+    a snapshot(start, end) method returning the same triple (e.g. history_store.HistoryStore, which
+    keeps rows in memory or a local cache); otherwise everything is read from Supabase.
+    """
+    if history is not None:
+        return history.snapshot(start, end)
+    games = fetch_games(sb, start, end)
+    game_ids = [g["game_id"] for g in games]
+    return games, fetch_game_results(sb, game_ids), fetch_player_game_stats(sb, game_ids)
+
+
+def run_pipeline(args: argparse.Namespace, prof: StageProfiler, sb=None, history=None) -> list[dict]:
+    """Project open games (or --rebuild-range) for every selected model; returns one result per model run."""
+    global _MIRROR
+    sb = sb or create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+
+    # Train/infer window: 2 seasons of games before the projected games (the open games within the
+    # horizon, or --rebuild-range), through yesterday.
+    today = datetime.now(timezone.utc).date()
+    if args.rebuild_range:
+        hist_start = args.rebuild_range[0] - timedelta(days=HISTORY_DAYS)
+        hist_end = min(args.rebuild_range[1], today - timedelta(days=1))
+    else:
+        hist_start = today - timedelta(days=HISTORY_DAYS)
+        hist_end = today - timedelta(days=1)
+
+    # Projection range: only games that haven't started yet, within the horizon. Started games keep
+    # their pre-game projections; --rebuild-range recomputes a historical range deliberately.
+    with prof.stage("select_games"):
+        if args.rebuild_range:
+            proj_start, proj_end = args.rebuild_range
+            proj_games = fetch_games(sb, proj_start, proj_end)
+            print(f"[model] rebuilding {len(proj_games)} games from {proj_start} to {proj_end}")
+        else:
+            now = datetime.now(timezone.utc)
+            horizon = timedelta(hours=args.horizon_hours)
+            # game_date is the local date; widen by a day on each side and filter on start_time_utc.
+            window_games = fetch_games(sb, today - timedelta(days=1), (now + horizon).date() + timedelta(days=1))
+            proj_games = select_open_games(window_games, now, horizon)
+            print(f"[model] {len(proj_games)} open games within {args.horizon_hours:g}h ({len(window_games) - len(proj_games)} frozen or out of window)")
+    if not proj_games:
+        print("[model] no games to project")
+        return []
+
+    # Cheap pre-check: skip the history load entirely when no input has moved since the last run.
+    with prof.stage("watermarks"):
+        model_versions = resolve_models(sb, args.models)
+        watermarks = compute_watermarks(sb, proj_games, model_versions)
+        inputs_hash = hash_watermarks(watermarks)
+        unchanged = not args.force and not args.rebuild_range and inputs_unchanged(sb, model_versions, inputs_hash)
+    if unchanged:
+        for model_version in model_versions:
+            record_skipped_run(sb, model_version, inputs_hash, watermarks)
+        print(f"[model] inputs unchanged since last run ({inputs_hash}); skipped {', '.join(model_versions)}")
+        return [{"model_version": m, "run_id": None, "status": "skipped", "failed_rows": 0} for m in model_versions]
+
+    # Game selection and the pre-check read Supabase directly; the mirror is only synced for runs
+    # that go on to project.
+    if getattr(args, "mirror", None):
+        # Imported here: mirror imports model_pipeline.
+        from mirror import PIPELINE_TABLES, Mirror, MirrorClient
+
+        with prof.stage("mirror_sync"):
+            if _MIRROR is None or _MIRROR.path != args.mirror:
+                _MIRROR = Mirror(args.mirror)
+            _MIRROR.sync(sb, PIPELINE_TABLES)
+        sb = MirrorClient(_MIRROR, sb, PIPELINE_TABLES)
+
+    with prof.stage("load_history"):
+        # A shared store only holds the rolling window ending yesterday; rebuilds read their own.
+        hist_games, hist_results, player_stats = load_history(sb, hist_start, hist_end, None if args.rebuild_range else history)
+
+    team_rows = build_team_game_rows(hist_games, hist_results)
+    if not team_rows:
+        print("[model] no historical team rows available")
+        return []
+    # A game whose team has no earlier results would be scored at league average with no players;
+    # refuse rather than write (or overwrite) projections like that.
+    first_game: dict[int, date] = {}
+    for r in team_rows:
+        tid = int(r["team_id"])
+        first_game[tid] = min(first_game.get(tid, r["game_date"]), r["game_date"])
+    unfeatured = [
+        int(g["game_id"])
+        for g in proj_games
+        if any(
+            first_game.get(int(tid)) is None or first_game[int(tid)] >= to_date(g["game_date"])
+            for tid in (g["home_team_id"], g["away_team_id"])
+        )
+    ]
+    if unfeatured:
+        raise RuntimeError(
+            f"[model] {len(unfeatured)} game(s) have no earlier team results in {hist_start}..{hist_end}: "
+            + ", ".join(str(gid) for gid in unfeatured[:10])
+        )
+
+    league_avg = sum((r.get("goals_for") or 0) for r in team_rows) / max(1, len(team_rows))
+
+    game_date_by_id = {int(g["game_id"]): to_date(g["game_date"]) for g in hist_games + proj_games}
+    proj_team_ids = sorted({int(g["home_team_id"]) for g in proj_games} | {int(g["away_team_id"]) for g in proj_games})
+    roster_source = getattr(args, "roster_source", "recent")
+    with prof.stage("rosters"):
+        rosters_by_team_season: dict[tuple[int, str], list[int]] = {}
+        if roster_source in ("api", "both"):
+            team_abbrev_by_id = fetch_team_abbrevs(sb, proj_team_ids)
+            team_seasons = {
+                (int(tid), season_string_for_date(to_date(g["game_date"])))
+                for g in proj_games
+                for tid in (g["home_team_id"], g["away_team_id"])
+            }
+            rosters_by_team_season = fetch_team_rosters(team_abbrev_by_id, team_seasons, sb=sb)
+        rosters_by_game = None
+        if roster_source in ("recent", "both"):
+            rosters_by_game = active_rosters_for_games(
+                ActiveRosterIndex.from_stats_rows(player_stats, game_date_by_id),
+                proj_games,
+                ROSTER_RECENT_GAMES,
+                api_rosters=rosters_by_team_season if roster_source == "both" else None,
+            )
+
+    needs = {n for m in model_versions for n in MODEL_REGISTRY[m]["needs"]}
+    # Each game is scored with the ratings as of its own date, so rebuilt games never see later results
+    # and a season rebuild doesn't reuse the snapshot from the start of the range.
+    proj_dates = [to_date(g["game_date"]) for g in proj_games]
+    team_ratings = fetch_team_ratings_history(sb, min(proj_dates), max(proj_dates)) if "team_ratings" in needs else []
+    rebuild_note = f"; rebuild {args.rebuild_range[0]}..{args.rebuild_range[1]}" if args.rebuild_range else ""
+
+    # Season-scale rebuilds: features and scoring run per date shard in forked workers.
+    workers = getattr(args, "rebuild_workers", 1)
+    sharded: dict[str, dict] | None = None
+    if args.rebuild_range and workers > 1 and len(proj_games) > 1 and can_fork():
+        with prof.stage("sharded_scoring"):
+            shared = {
+                "team_rows": team_rows,
+                "player_stats": player_stats,
+                "game_date_by_id": game_date_by_id,
+                "player_history": PlayerHistoryIndex.from_stats_rows(player_stats, game_date_by_id),
+                "rosters": rosters_by_team_season,
+                "rosters_by_game": rosters_by_game,
+                "league_avg": league_avg,
+                "team_ratings": team_ratings,
+            }
+            sharded = score_sharded(shared, proj_games, model_versions, workers)
+    else:
+        with prof.stage("team_features", trace=True):
+            team_features = compute_team_features_for_games(team_rows, proj_games, window=10)
+
+        with prof.stage("player_features", trace=True):
+            player_features = build_player_features_for_games(
+                player_stats,
+                game_date_by_id,
+                proj_games,
+                rosters_by_team_season,
+                window=10,
+                rosters_by_game=rosters_by_game,
+            )
+
+        # Shared inputs are built once; every selected model scores against them.
+        inputs = {
+            "proj_games": proj_games,
+            "team_features": team_features,
+            "league_avg": league_avg,
+            "player_features": player_features,
+            "team_ratings": team_ratings,
+        }
+        print(f"[model] scoring {len(model_versions)} model(s): {', '.join(model_versions)}")
+
+    def run_model(model_version: str) -> dict:
+        entry = MODEL_REGISTRY[model_version]
+        prop_rows = None
+        if sharded is not None:
+            scored = sharded[model_version]
+            if "error" in scored:
+                print(f"[model] {model_version}: scoring failed: {scored['error']}")
+                return {"model_version": model_version, "run_id": None, "status": "error", "failed_rows": 0}
+            game_proj_rows, player_proj_rows, prop_rows = scored["game"], scored["player"], scored["props"]
+        else:
+            try:
+                with prof.stage(f"score:{model_version}"):
+                    game_proj_rows, player_proj_rows = entry["score"](inputs)
+            except Exception as e:
+                print(f"[model] {model_version}: scoring failed: {e}")
+                return {"model_version": model_version, "run_id": None, "status": "error", "failed_rows": 0}
+        return write_projection_run(
+            sb,
+            model_version,
+            game_proj_rows,
+            player_proj_rows,
+            entry["description"] + rebuild_note,
+            prof=prof,
+            inputs_hash=inputs_hash,
+            watermarks=watermarks,
+            prop_rows=prop_rows,
+        )
+
+    if args.model_workers > 1 and len(model_versions) > 1:
+        with ThreadPoolExecutor(max_workers=args.model_workers) as pool:
+            results = list(pool.map(run_model, model_versions))
+    else:
+        results = [run_model(m) for m in model_versions]
+
+    failed = [r for r in results if r["status"] != "success"]
+    if failed:
+        raise RuntimeError(
+            "[model] runs did not fully succeed: "
+            + ", ".join(f"{r['model_version']}={r['status']} (run_id={r['run_id']}, failed_rows={r['failed_rows']})" for r in failed)
+        )
+    return results
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    prof = StageProfiler(enabled=args.profile, cprofile=bool(args.profile_out))
+    try:
+        run_pipeline(args, prof)
+    finally:
+        prof.report()
+        if args.profile_out:
+            prof.dump_cprofile(args.profile_out)
 
 
 if __name__ == "__main__":
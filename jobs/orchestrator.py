@@ -0,0 +1,182 @@
+"""
+In-process ingest -> project cycle.
+
+Stages are declared as a small DAG and run in one process, so rows written by ingestion are handed
+to the model directly instead of being read back from Supabase:
+
+    ingest          run_jobs.run_ingestion (schedule, results, player stats)
+    history         HistoryStore: local cache + DB reads for uncached days + the ingested rows
+    project         model_pipeline.run_pipeline on that history
+    market_eval     price the new projection runs against market lines
+    player_ratings  fold newly ingested player-games into player_ratings
+
+A stage runs once its hard deps ("deps") succeeded; if one failed or was skipped, the stage is
+skipped as well. "after" only orders stages: history still runs (from cache/DB) when ingest is
+skipped.
+
+    python jobs/orchestrator.py
+    python jobs/orchestrator.py --skip ingest --no-cache
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, cast
+
+from supabase import create_client
+
+import model_pipeline
+from history_store import HistoryStore
+from market_eval import evaluate_run
+from model_pipeline import HISTORY_DAYS, SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL, sb_exec
+from player_ratings import update_player_ratings
+from profiling import StageProfiler
+from run_jobs import run_ingestion
+
+HISTORY_CACHE_PATH = os.environ.get("HISTORY_CACHE_PATH", ".cache/history.pkl")
+
+
+def stage_ingest(ctx: dict) -> str:
+    sb = ctx["sb"]
+    run = sb_exec(sb.table("ingestion_runs").insert({"job_name": "orchestrated_ingest"}), "ingestion_runs")
+    run_id = run.data[0]["run_id"] if run.data else None
+    try:
+        ctx["ingested"] = run_ingestion(sb)
+    except Exception as e:
+        if run_id:
+            sb.table("ingestion_runs").update(
+                {"status": "error", "finished_at": datetime.now(timezone.utc).isoformat(), "message": str(e)}
+            ).eq("run_id", run_id).execute()
+        raise
+    if run_id:
+        sb.table("ingestion_runs").update(
+            {"status": "success", "finished_at": datetime.now(timezone.utc).isoformat()}
+        ).eq("run_id", run_id).execute()
+    ing = ctx["ingested"]
+    print(
+        f"[orchestrator] ingested {len(ing['games'])} games ({len(ing['ingested_game_ids'])} fully), "
+        f"{len(ing['game_results'])} results, {len(ing['player_game_stats'])} player stat rows"
+    )
+    return "ok"
+
+
+def stage_history(ctx: dict) -> str:
+    today = datetime.now(timezone.utc).date()
+    start, end = today - timedelta(days=HISTORY_DAYS), today - timedelta(days=1)
+    cache_path = ctx["cache_path"]
+    store = ctx.get("history") or (HistoryStore.load(cache_path) if cache_path else HistoryStore())
+    ingested = ctx.get("ingested")
+    # Games this cycle fully ingested come from memory; the rest of yesterday's slate (claimed by
+    # another worker, recently done, or blocked in the retry queue) is read from the DB.
+    fresh_ids = ingested["ingested_game_ids"] if ingested else ()
+    read = store.refresh(ctx["sb"], start, end, today, fresh_game_ids=fresh_ids)
+    if ingested:
+        store.merge(ingested["games"], ingested["game_results"], ingested["player_game_stats"])
+    if cache_path:
+        store.save(cache_path)
+    ctx["history"] = store
+    print(f"[orchestrator] history: {len(store.games)} games held, {read} read from the DB")
+    return "ok"
+
+
+def stage_project(ctx: dict) -> str:
+    results = model_pipeline.run_pipeline(ctx["model_args"], ctx["prof"], sb=ctx["sb"], history=ctx["history"])
+    ctx["projection_runs"] = [r for r in results if r.get("run_id") and r["status"] in ("success", "partial")]
+    return "ok" if ctx["projection_runs"] else "skipped"
+
+
+def stage_market_eval(ctx: dict) -> str:
+    for r in ctx["projection_runs"]:
+        evaluate_run(ctx["sb"], r["run_id"], r["model_version"])
+    return "ok"
+
+
+def stage_player_ratings(ctx: dict) -> str:
+    return "ok" if update_player_ratings(ctx["sb"])["players"] else "skipped"
+
+
+STAGES: list[dict] = [
+    {"name": "ingest", "run": stage_ingest, "deps": [], "after": []},
+    {"name": "history", "run": stage_history, "deps": [], "after": ["ingest"]},
+    {"name": "project", "run": stage_project, "deps": ["history"], "after": []},
+    {"name": "market_eval", "run": stage_market_eval, "deps": ["project"], "after": []},
+    {"name": "player_ratings", "run": stage_player_ratings, "deps": [], "after": ["ingest"]},
+]
+
+
+def run_dag(
+    stages: list[dict], ctx: dict, skip: set[str] | None = None, should_stop: Callable[[], bool] | None = None
+) -> dict[str, dict]:
+    """
+    Run stages in dependency order. A stage returns "ok" or "skipped"; an exception marks it
+    "error". Stages whose hard deps did not finish "ok" are skipped, as is every stage not yet
+    started once should_stop() returns True.
+    """
+    skip = skip or set()
+    by_name = {s["name"]: s for s in stages}
+    outcomes: dict[str, dict] = {}
+
+    def visit(name: str, path: tuple[str, ...] = ()):
+        if name in outcomes:
+            return
+        if name in path:
+            raise ValueError(f"stage cycle: {' -> '.join(path + (name,))}")
+        stage = by_name[name]
+        for dep in stage["deps"] + stage["after"]:
+            visit(dep, path + (name,))
+        blocked = [d for d in stage["deps"] if outcomes[d]["status"] != "ok"]
+        stopping = should_stop is not None and should_stop()
+        if name in skip or blocked or stopping:
+            if stopping:
+                reason = "shutting down"
+            else:
+                reason = "requested" if name in skip else f"{', '.join(blocked)} not ok"
+            outcomes[name] = {"status": "skipped", "reason": reason, "seconds": 0.0}
+            print(f"[orchestrator] {name}: skipped ({reason})")
+            return
+        started = time.perf_counter()
+        run: Callable[[dict], str] = stage["run"]
+        try:
+            status = run(ctx)
+            outcomes[name] = {"status": status, "seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            outcomes[name] = {"status": "error", "error": str(e), "seconds": round(time.perf_counter() - started, 3)}
+            print(f"[orchestrator] {name}: failed: {e}")
+        print(f"[orchestrator] {name}: {outcomes[name]['status']} ({outcomes[name]['seconds']:.2f}s)")
+
+    for s in stages:
+        visit(s["name"])
+    return outcomes
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest and project in one process.")
+    parser.add_argument("--skip", default="", help=f"Comma-separated stages to skip ({', '.join(s['name'] for s in STAGES)})")
+    parser.add_argument("--history-cache", default=HISTORY_CACHE_PATH, help="Local history cache (env HISTORY_CACHE_PATH)")
+    parser.add_argument("--no-cache", action="store_true", help="Hold history in memory only")
+    parser.add_argument("--force", action="store_true", help="Project even when input watermarks are unchanged")
+    parser.add_argument("--profile", action="store_true", help="Profile the projection stages")
+    args = parser.parse_args()
+
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    unknown = skip - {s["name"] for s in STAGES}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    model_argv = (["--force"] if args.force else []) + (["--profile"] if args.profile else [])
+    ctx = {
+        "sb": create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY)),
+        "cache_path": None if args.no_cache else args.history_cache,
+        "model_args": model_pipeline.parse_args(model_argv),
+        "prof": StageProfiler(enabled=args.profile),
+    }
+    outcomes = run_dag(STAGES, ctx, skip)
+    ctx["prof"].report()
+    failed = [name for name, o in outcomes.items() if o["status"] == "error"]
+    if failed:
+        raise RuntimeError(f"[orchestrator] stages failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
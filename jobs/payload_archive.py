@@ -0,0 +1,416 @@
+"""
+Raw NHL API payload archive and offline reprocessing.
+
+Every schedule, landing, right-rail and boxscore payload that run_jobs fetches is appended to a
+content-addressed archive under PAYLOAD_ARCHIVE_DIR:
+
+    segments/<date>-<host>-<pid>-<n>.jsonl.zst   one zstd frame per record, so the concatenated
+                                                 frames decode as JSONL; identical payloads are
+                                                 stored once (sha256 of the canonical JSON)
+    index.sqlite                                 payloads(sha -> segment, offset, length) and
+                                                 fetches(kind, key, game_id, sha, fetched_at)
+
+`reprocess` re-runs the parsers over the latest archived payloads, with no network calls, and
+bulk-upserts the results. Kinds: schedule (teams, games and schedule scores, from the latest fetch
+of each archived date), boxscore (players, player_game_stats), landing (game_results) and
+play_by_play (play_by_play_events and the Parquet store). Game-level kinds are parsed in parallel
+across processes:
+
+    python jobs/payload_archive.py reprocess --season 20252026
+    python jobs/payload_archive.py reprocess --season 20252026 --kinds schedule,play_by_play
+    python jobs/payload_archive.py reprocess --game-ids 2025020001,2025020002 --dry-run
+    python jobs/payload_archive.py stats
+
+Set PAYLOAD_ARCHIVE=0 to stop archiving. Needs the zstandard package.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import cast
+
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+PAYLOAD_ARCHIVE_DIR = os.environ.get("PAYLOAD_ARCHIVE_DIR", ".cache/payloads")
+PAYLOAD_ARCHIVE_ENABLED = os.environ.get("PAYLOAD_ARCHIVE", "1") != "0"
+SEGMENT_MAX_BYTES = int(os.environ.get("PAYLOAD_SEGMENT_MAX_MB", "64")) * 1024 * 1024
+ZSTD_LEVEL = 9
+
+
+def canonical_json(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class PayloadArchive:
+    def __init__(self, root: str):
+        if zstd is None:
+            raise RuntimeError("zstandard is not installed. Install it to archive payloads (pip install zstandard).")
+        self.root = root
+        os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS payloads (
+              sha TEXT PRIMARY KEY, segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fetches (
+              kind TEXT NOT NULL, key TEXT NOT NULL, game_id INTEGER, sha TEXT NOT NULL, fetched_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fetches_game ON fetches (game_id, kind, fetched_at);
+            CREATE INDEX IF NOT EXISTS idx_fetches_key ON fetches (kind, key, fetched_at);
+            """
+        )
+        self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+        self._segment: str | None = None
+        self._segment_n = 0
+
+    def _segment_path(self) -> str:
+        if self._segment is None or os.path.getsize(os.path.join(self.root, self._segment)) >= SEGMENT_MAX_BYTES:
+            day = datetime.now(timezone.utc).strftime("%Y%m%d")
+            while True:
+                self._segment_n += 1
+                name = f"segments/{day}-{socket.gethostname()}-{os.getpid()}-{self._segment_n}.jsonl.zst"
+                if not os.path.exists(os.path.join(self.root, name)):
+                    break
+            self._segment = name
+        return self._segment
+
+    def append(self, kind: str, key, payload, game_id: int | None = None) -> str:
+        """Archive one fetched payload; returns its sha. Unchanged payloads only add a fetch row."""
+        body = canonical_json(payload)
+        sha = hashlib.sha256(body).hexdigest()
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            known = self._db.execute("SELECT 1 FROM payloads WHERE sha = ?", (sha,)).fetchone()
+            if not known:
+                record = b'{"sha":"%s","kind":"%s","key":%s,"fetched_at":"%s","payload":%s}\n' % (
+                    sha.encode(),
+                    kind.encode(),
+                    json.dumps(str(key)).encode(),
+                    fetched_at.encode(),
+                    body,
+                )
+                frame = self._compressor.compress(record)
+                segment = self._segment_path()
+                with open(os.path.join(self.root, segment), "ab") as f:
+                    offset = f.tell()
+                    f.write(frame)
+                self._db.execute(
+                    "INSERT OR IGNORE INTO payloads (sha, segment, offset, length) VALUES (?, ?, ?, ?)",
+                    (sha, segment, offset, len(frame)),
+                )
+            self._db.execute(
+                "INSERT INTO fetches (kind, key, game_id, sha, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, str(key), game_id, sha, fetched_at),
+            )
+            self._db.commit()
+        return sha
+
+    def latest_game_payloads(
+        self, game_ids: list[int] | None = None, season: int | None = None, kinds: tuple[str, ...] | None = None
+    ) -> dict[int, dict[str, tuple]]:
+        """game_id -> {kind: (segment, offset, length)} for the most recent fetch of each game-level kind."""
+        where, params = ["game_id IS NOT NULL"], []
+        if kinds:
+            where.append(f"kind IN ({','.join('?' * len(kinds))})")
+            params.extend(kinds)
+        if game_ids:
+            where.append(f"game_id IN ({','.join('?' * len(game_ids))})")
+            params.extend(int(g) for g in game_ids)
+        if season:
+            # game_id encodes the season's start year: 2025020001 is a 2025-26 regular season game.
+            start_year = int(str(season)[:4])
+            where.append("game_id / 1000000 = ?")
+            params.append(start_year)
+        rows = self._db.execute(
+            f"""
+            SELECT f.game_id, f.kind, p.segment, p.offset, p.length
+            FROM fetches f
+            JOIN (
+              SELECT game_id, kind, MAX(fetched_at) AS fetched_at FROM fetches WHERE {' AND '.join(where)} GROUP BY game_id, kind
+            ) latest USING (game_id, kind, fetched_at)
+            JOIN payloads p ON p.sha = f.sha
+            """,
+            params,
+        ).fetchall()
+        out: dict[int, dict[str, tuple]] = {}
+        for gid, kind, segment, offset, length in rows:
+            out.setdefault(int(gid), {})[kind] = (segment, offset, length)
+        return out
+
+    def latest_keyed_payloads(self, kind: str, key_from: str | None = None, key_to: str | None = None) -> list[tuple[str, tuple]]:
+        """(key, (segment, offset, length)) for the most recent fetch of each key of kind, oldest fetch first."""
+        where, params = ["kind = ?"], [kind]
+        if key_from is not None:
+            where.append("key >= ?")
+            params.append(key_from)
+        if key_to is not None:
+            where.append("key <= ?")
+            params.append(key_to)
+        rows = self._db.execute(
+            f"""
+            SELECT f.key, p.segment, p.offset, p.length, f.fetched_at
+            FROM fetches f
+            JOIN (
+              SELECT key, MAX(fetched_at) AS fetched_at FROM fetches WHERE {' AND '.join(where)} GROUP BY key
+            ) latest USING (key, fetched_at)
+            JOIN payloads p ON p.sha = f.sha
+            WHERE f.kind = ?
+            ORDER BY f.fetched_at
+            """,
+            params + [kind],
+        ).fetchall()
+        return [(key, (segment, offset, length)) for key, segment, offset, length, _ in rows]
+
+    def stats(self) -> dict:
+        payloads, = self._db.execute("SELECT COUNT(*) FROM payloads").fetchone()
+        fetches, = self._db.execute("SELECT COUNT(*) FROM fetches").fetchone()
+        games, = self._db.execute("SELECT COUNT(DISTINCT game_id) FROM fetches").fetchone()
+        seg_dir = os.path.join(self.root, "segments")
+        size = sum(os.path.getsize(os.path.join(seg_dir, f)) for f in os.listdir(seg_dir))
+        return {"payloads": payloads, "fetches": fetches, "games": games, "segment_mb": round(size / 1e6, 2)}
+
+
+def read_record(root: str, location: tuple, decompressor=None) -> dict:
+    segment, offset, length = location
+    with open(os.path.join(root, segment), "rb") as f:
+        f.seek(offset)
+        frame = f.read(length)
+    return json.loads((decompressor or zstd.ZstdDecompressor()).decompress(frame))
+
+
+_archive: PayloadArchive | None = None
+_archive_failed = False
+
+
+def archived(kind: str, key, payload, game_id: int | None = None):
+    """Archive a fetched payload (best-effort; never fails the fetch) and return it unchanged."""
+    global _archive, _archive_failed
+    if not PAYLOAD_ARCHIVE_ENABLED or _archive_failed:
+        return payload
+    try:
+        if _archive is None:
+            _archive = PayloadArchive(PAYLOAD_ARCHIVE_DIR)
+        _archive.append(kind, key, payload, game_id=game_id)
+    except Exception as e:
+        print(f"[archive] disabled for this process: {e}")
+        _archive_failed = True
+    return payload
+
+
+# --- Offline reprocessing ---
+
+GAME_KINDS = ("boxscore", "landing", "play_by_play")
+REPROCESS_KINDS = ("schedule",) + GAME_KINDS
+
+
+def season_date_range(season: int) -> tuple[str, str]:
+    """ISO date bounds of a season id (20252026 -> 2025-07-01..2026-06-30), matching run_jobs."""
+    start_year = int(str(season)[:4])
+    return f"{start_year}-07-01", f"{start_year + 1}-06-30"
+
+
+def _reprocess_chunk(args: tuple[str, list[tuple[int, dict[str, tuple]]], tuple[str, ...]]) -> dict:
+    """Worker: parse the archived payloads for a chunk of games. No network, no DB."""
+    from run_jobs import landing_is_final, parse_boxscore, parse_game_results
+
+    root, games, kinds = args
+    dctx = zstd.ZstdDecompressor()
+    out: dict = {"game_results": [], "players": [], "player_game_stats": [], "play_by_play": [], "errors": []}
+    for gid, locations in games:
+        try:
+            if "boxscore" in kinds and "boxscore" in locations:
+                players_rows, stats_rows = parse_boxscore(gid, read_record(root, locations["boxscore"], dctx)["payload"])
+                out["players"].extend(players_rows)
+                out["player_game_stats"].extend(stats_rows)
+            if "landing" in kinds and "landing" in locations:
+                landing = read_record(root, locations["landing"], dctx)["payload"]
+                if landing_is_final(landing):
+                    rr = read_record(root, locations["right_rail"], dctx)["payload"] if "right_rail" in locations else {}
+                    out["game_results"].append(parse_game_results(gid, landing, rr))
+            if "play_by_play" in kinds and "play_by_play" in locations:
+                # Only imported when asked for: play_by_play needs numpy (and pyarrow for Parquet).
+                from play_by_play import decode_play_by_play, pbp_is_final
+
+                payload = read_record(root, locations["play_by_play"], dctx)["payload"]
+                if pbp_is_final(payload):
+                    out["play_by_play"].append(decode_play_by_play(gid, payload))
+        except Exception as e:
+            out["errors"].append((gid, str(e)))
+    return out
+
+
+def _reprocess_schedules(root: str, season: int | None, game_ids: list[int] | None) -> tuple[dict[str, list[dict]], list]:
+    """teams, games and schedule game_results from the latest archived schedule per date; later fetches win."""
+    from run_jobs import parse_schedule
+
+    key_from, key_to = season_date_range(season) if season else (None, None)
+    wanted = set(game_ids or [])
+    dctx = zstd.ZstdDecompressor()
+    teams: dict[int, dict] = {}
+    games: dict[int, dict] = {}
+    results: dict[int, dict] = {}
+    errors: list[tuple[str, str]] = []
+    schedules = PayloadArchive(root).latest_keyed_payloads("schedule", key_from, key_to)
+    for key, location in schedules:
+        try:
+            teams_rows, games_rows, results_rows = parse_schedule(read_record(root, location, dctx)["payload"])
+        except Exception as e:
+            errors.append((key, str(e)))
+            continue
+        for r in games_rows:
+            if (not season or int(r["season"]) == season) and (not wanted or r["game_id"] in wanted):
+                games[r["game_id"]] = r
+        for r in results_rows:
+            if r["game_id"] in games:
+                results[r["game_id"]] = r
+        teams.update({r["team_id"]: r for r in teams_rows})
+    print(f"[reprocess] {len(schedules)} archived schedule dates -> {len(games)} games")
+    return {"teams": list(teams.values()), "games": list(games.values()), "schedule_results": list(results.values())}, errors
+
+
+def reprocess(
+    sb,
+    root: str,
+    game_ids: list[int] | None = None,
+    season: int | None = None,
+    kinds: tuple[str, ...] = ("boxscore", "landing"),
+    workers: int | None = None,
+    chunk_games: int = 64,
+    dry_run: bool = False,
+) -> dict:
+    started = time.perf_counter()
+    rows: dict[str, list[dict]] = {"game_results": [], "players": [], "player_game_stats": []}
+    errors: list[tuple] = []
+    if "schedule" in kinds:
+        schedule_rows, schedule_errors = _reprocess_schedules(root, season, game_ids)
+        rows.update(schedule_rows)
+        errors.extend(schedule_errors)
+
+    game_kinds = tuple(k for k in kinds if k in GAME_KINDS)
+    pbp_parts: list[dict] = []
+    games: list = []
+    if game_kinds:
+        locations = PayloadArchive(root).latest_game_payloads(game_ids=game_ids, season=season)
+        games = sorted(locations.items())
+        chunks = [(root, games[i : i + chunk_games], game_kinds) for i in range(0, len(games), chunk_games)]
+        workers = workers or os.cpu_count() or 1
+        print(f"[reprocess] {len(games)} archived games in {len(chunks)} chunks across {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_reprocess_chunk, chunks):
+                for table in ("game_results", "players", "player_game_stats"):
+                    rows[table].extend(part[table])
+                pbp_parts.extend(part["play_by_play"])
+                errors.extend(part["errors"])
+    if pbp_parts:
+        from play_by_play import columns_to_rows
+
+        rows["play_by_play_events"] = [r for cols in pbp_parts for r in columns_to_rows(cols)]
+    for key, err in errors[:20]:
+        print(f"[reprocess] parse failed for {key}: {err}")
+    parsed_s = time.perf_counter() - started
+
+    # A player appears once per game; keep one row per player (their latest team).
+    players = {}
+    for r in rows["players"]:
+        players[r["player_id"]] = r
+    rows["players"] = list(players.values())
+    summary = {
+        "archived_games": len(games),
+        "errors": len(errors),
+        "parse_seconds": round(parsed_s, 2),
+        **{table: len(v) for table, v in rows.items()},
+    }
+    if dry_run:
+        print(f"[reprocess] dry run: {summary}")
+        return summary
+
+    from model_pipeline import write_rows_chunked
+
+    if rows.get("teams"):
+        from run_jobs import resolve_abbrev_conflicts
+
+        resolve_abbrev_conflicts(sb, rows["teams"])
+    failed = 0
+    # FK order: teams and games before anything keyed by game_id. Schedule scores go in before the
+    # landing results, which carry the full stat line.
+    for table, key, on_conflict in (
+        ("teams", "teams", "team_id"),
+        ("games", "games", "game_id"),
+        ("game_results", "schedule_results", "game_id"),
+        ("players", "players", "player_id"),
+        ("game_results", "game_results", "game_id"),
+        ("player_game_stats", "player_game_stats", "game_id,player_id"),
+        ("play_by_play_events", "play_by_play_events", "game_id,event_id"),
+    ):
+        if not rows.get(key):
+            continue
+        w = write_rows_chunked(sb, table, rows[key], on_conflict=on_conflict)
+        failed += w["failed_rows"]
+        print(f"[reprocess] wrote {w['rows'] - w['failed_rows']}/{w['rows']} {table} rows in {len(w['chunks'])} chunks ({w['seconds']:.2f}s)")
+    if pbp_parts:
+        from play_by_play import PbpStore, pq
+
+        if pq is not None:
+            store = PbpStore()
+            for cols in pbp_parts:
+                store.add(cols)
+            print(f"[reprocess] wrote {store.flush()} play-by-play events to Parquet")
+    summary.update({"failed_rows": failed, "seconds": round(time.perf_counter() - started, 2)})
+    print(f"[reprocess] done: {summary}")
+    return summary
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Raw payload archive tools.")
+    parser.add_argument("--archive-dir", default=PAYLOAD_ARCHIVE_DIR, help="Archive root (env PAYLOAD_ARCHIVE_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("reprocess", help="Re-run parsers over archived payloads and bulk-write the results")
+    rp.add_argument("--season", type=int, help="Season id, e.g. 20252026")
+    rp.add_argument("--game-ids", help="Comma-separated game ids")
+    rp.add_argument(
+        "--kinds",
+        default="boxscore,landing",
+        help="Comma-separated: schedule (teams, games), boxscore (player stats), landing (game_results), play_by_play",
+    )
+    rp.add_argument("--workers", type=int, default=None, help="Parser processes (default: all cores)")
+    rp.add_argument("--dry-run", action="store_true", help="Parse only; don't write")
+    sub.add_parser("stats", help="Archive size and counts")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(f"[archive] {PayloadArchive(args.archive_dir).stats()}")
+        return
+
+    kinds = tuple(k.strip() for k in args.kinds.split(",") if k.strip())
+    unknown = set(kinds) - set(REPROCESS_KINDS)
+    if unknown:
+        parser.error(f"unknown kinds: {', '.join(sorted(unknown))}")
+    game_ids = [int(g) for g in args.game_ids.split(",")] if args.game_ids else None
+    if not game_ids and not args.season:
+        parser.error("give --season or --game-ids")
+
+    sb = None
+    if not args.dry_run:
+        from supabase import create_client
+
+        from run_jobs import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+
+        sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    reprocess(sb, args.archive_dir, game_ids=game_ids, season=args.season, kinds=kinds, workers=args.workers, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
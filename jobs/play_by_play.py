@@ -0,0 +1,333 @@
+"""
+Play-by-play events from the gamecenter play-by-play endpoint, decoded into typed, compact columns:
+
+    game_id int32, event_id int32, sort_order int16, period int8, period_type int8 (PERIOD_TYPES),
+    period_seconds int16, event_type int8 (EVENT_TYPES), zone int8 (ZONES), x/y float32 (NaN when
+    absent), situation_code int16 (away goalie, away skaters, home skaters, home goalie: 1551 = 5v5),
+    home_skaters/away_skaters int8, team_id int16, is_home int8, player_id/goalie_id int32 (0 when
+    absent), shot_type int8 (SHOT_TYPES)
+
+Events are upserted into play_by_play_events and, when pyarrow is installed, appended to a
+season-partitioned Parquet store under PBP_DIR (season=<id>/part-*.parquet, merged into
+events.parquet by compaction). load_season/load_shots scan one season with column projection.
+
+    python jobs/play_by_play.py compact --season 20252026
+    python jobs/play_by_play.py rebuild --season 20252026   # Parquet from the payload archive
+    python jobs/play_by_play.py bench --season 20252026
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+PBP_DIR = os.environ.get("PBP_DIR", ".cache/pbp")
+# Merge part files into events.parquet once a season has this many.
+PBP_COMPACT_PARTS = int(os.environ.get("PBP_COMPACT_PARTS", "8"))
+
+EVENT_TYPES = {
+    "other": 0,
+    "faceoff": 1,
+    "hit": 2,
+    "giveaway": 3,
+    "takeaway": 4,
+    "shot-on-goal": 5,
+    "missed-shot": 6,
+    "blocked-shot": 7,
+    "goal": 8,
+    "penalty": 9,
+    "delayed-penalty": 10,
+    "stoppage": 11,
+    "period-start": 12,
+    "period-end": 13,
+    "game-end": 14,
+    "shootout-complete": 15,
+    "failed-shot-attempt": 16,
+}
+SHOT_EVENT_TYPES = (EVENT_TYPES["shot-on-goal"], EVENT_TYPES["missed-shot"], EVENT_TYPES["blocked-shot"], EVENT_TYPES["goal"])
+PERIOD_TYPES = {"REG": 1, "OT": 2, "SO": 3}
+ZONES = {"O": 1, "D": 2, "N": 3}
+SHOT_TYPES = {
+    "wrist": 1,
+    "slap": 2,
+    "snap": 3,
+    "backhand": 4,
+    "tip-in": 5,
+    "deflected": 6,
+    "wrap-around": 7,
+    "poke": 8,
+    "bat": 9,
+    "between-legs": 10,
+    "cradle": 11,
+}
+
+COLUMNS = {
+    "game_id": np.int32,
+    "event_id": np.int32,
+    "sort_order": np.int16,
+    "period": np.int8,
+    "period_type": np.int8,
+    "period_seconds": np.int16,
+    "event_type": np.int8,
+    "zone": np.int8,
+    "x": np.float32,
+    "y": np.float32,
+    "situation_code": np.int16,
+    "home_skaters": np.int8,
+    "away_skaters": np.int8,
+    "team_id": np.int16,
+    "is_home": np.int8,
+    "player_id": np.int32,
+    "goalie_id": np.int32,
+    "shot_type": np.int8,
+}
+
+# The acting player, by event type (first key present wins).
+PLAYER_KEYS = (
+    "scoringPlayerId",
+    "shootingPlayerId",
+    "hittingPlayerId",
+    "winningPlayerId",
+    "committedByPlayerId",
+    "playerId",
+    "blockingPlayerId",
+)
+
+
+def season_for_game(game_id: int) -> int:
+    # game_id encodes the season's start year: 2025020001 is a 2025-26 game.
+    start_year = int(game_id) // 1_000_000
+    return start_year * 10_000 + start_year + 1
+
+
+def _clock_seconds(value) -> int:
+    try:
+        m, s = str(value).split(":", 1)
+        return int(m) * 60 + int(s)
+    except Exception:
+        return -1
+
+
+def _num(value, default):
+    try:
+        return default if value is None else type(default)(value)
+    except Exception:
+        return default
+
+
+def pbp_is_final(payload: dict) -> bool:
+    return (payload.get("gameState") or "").lower() in ("final", "off")
+
+
+def decode_play_by_play(game_id: int, payload: dict) -> dict[str, np.ndarray]:
+    """Columns (see COLUMNS) for every play in a play-by-play payload."""
+    home_id = _num((payload.get("homeTeam") or {}).get("id"), 0)
+    plays = [p for p in (payload.get("plays") or []) if isinstance(p, dict)]
+    cols: dict[str, list] = {name: [] for name in COLUMNS}
+    for p in plays:
+        d = p.get("details") or {}
+        period = p.get("periodDescriptor") or {}
+        situation = str(p.get("situationCode") or "")
+        team_id = _num(d.get("eventOwnerTeamId"), 0)
+        player_id = next((d[k] for k in PLAYER_KEYS if d.get(k) is not None), 0)
+        cols["game_id"].append(game_id)
+        cols["event_id"].append(_num(p.get("eventId"), 0))
+        cols["sort_order"].append(_num(p.get("sortOrder"), 0))
+        cols["period"].append(_num(period.get("number"), 0))
+        cols["period_type"].append(PERIOD_TYPES.get(period.get("periodType"), 0))
+        cols["period_seconds"].append(_clock_seconds(p.get("timeInPeriod")))
+        cols["event_type"].append(EVENT_TYPES.get(p.get("typeDescKey"), 0))
+        cols["zone"].append(ZONES.get(d.get("zoneCode"), 0))
+        cols["x"].append(_num(d.get("xCoord"), np.nan))
+        cols["y"].append(_num(d.get("yCoord"), np.nan))
+        cols["situation_code"].append(int(situation) if situation.isdigit() and len(situation) == 4 else -1)
+        cols["home_skaters"].append(int(situation[2]) if len(situation) == 4 and situation.isdigit() else -1)
+        cols["away_skaters"].append(int(situation[1]) if len(situation) == 4 and situation.isdigit() else -1)
+        cols["team_id"].append(team_id)
+        cols["is_home"].append(1 if team_id and team_id == home_id else 0)
+        cols["player_id"].append(_num(player_id, 0))
+        cols["goalie_id"].append(_num(d.get("goalieInNetId"), 0))
+        cols["shot_type"].append(SHOT_TYPES.get(d.get("shotType"), 0))
+    return {name: np.asarray(cols[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def concat_columns(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    if not parts:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+    return {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+
+
+def columns_to_rows(cols: dict[str, np.ndarray]) -> list[dict]:
+    """play_by_play_events rows (NaN coordinates and 0 ids become NULL)."""
+    n = len(cols["game_id"])
+    lists = {name: cols[name].tolist() for name in COLUMNS}
+    rows = []
+    for i in range(n):
+        row = {name: lists[name][i] for name in COLUMNS}
+        row["season"] = season_for_game(row["game_id"])
+        row["is_home"] = bool(row["is_home"])
+        for k in ("x", "y"):
+            if row[k] != row[k]:
+                row[k] = None
+        for k in ("team_id", "player_id", "goalie_id"):
+            if not row[k]:
+                row[k] = None
+        rows.append(row)
+    return rows
+
+
+class PbpStore:
+    """Season-partitioned Parquet files: season=<id>/events.parquet plus part-*.parquet appends."""
+
+    def __init__(self, root: str = PBP_DIR):
+        if pq is None:
+            raise RuntimeError("pyarrow is not installed. Install it for the Parquet store (pip install pyarrow).")
+        self.root = root
+        self._pending: dict[int, list[dict[str, np.ndarray]]] = {}
+
+    def _season_dir(self, season: int) -> str:
+        return os.path.join(self.root, f"season={int(season)}")
+
+    def _files(self, season: int) -> list[str]:
+        d = self._season_dir(season)
+        if not os.path.isdir(d):
+            return []
+        parts = sorted(f for f in os.listdir(d) if f.startswith("part-") and f.endswith(".parquet"))
+        base = ["events.parquet"] if os.path.exists(os.path.join(d, "events.parquet")) else []
+        return [os.path.join(d, f) for f in base + parts]
+
+    def add(self, cols: dict[str, np.ndarray]):
+        if len(cols["game_id"]):
+            self._pending.setdefault(season_for_game(int(cols["game_id"][0])), []).append(cols)
+
+    def flush(self) -> int:
+        """Write buffered games as one part file per season; compacts seasons with many parts."""
+        written = 0
+        for season, parts in sorted(self._pending.items()):
+            cols = concat_columns(parts)
+            d = self._season_dir(season)
+            os.makedirs(d, exist_ok=True)
+            name = f"part-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}.parquet"
+            pq.write_table(pa.table(cols), os.path.join(d, name), compression="zstd")
+            written += len(cols["game_id"])
+            if len(self._files(season)) > PBP_COMPACT_PARTS:
+                self.compact(season)
+        self._pending.clear()
+        return written
+
+    def _read(self, season: int, columns: list[str] | None = None, filters=None) -> dict[str, np.ndarray]:
+        """Latest file wins per game: a game re-ingested later replaces its earlier events."""
+        want = list(columns or COLUMNS)
+        read_cols = want if "game_id" in want else ["game_id"] + want
+        tables = [pq.read_table(f, columns=read_cols, filters=filters) for f in self._files(season)]
+        if not tables:
+            return {name: np.empty(0, dtype=COLUMNS[name]) for name in want}
+        arrays = [{c: t.column(c).to_numpy() for c in read_cols} for t in tables]
+        if len(arrays) > 1:
+            owner: dict[int, int] = {}
+            for i, a in enumerate(arrays):
+                for gid in np.unique(a["game_id"]).tolist():
+                    owner[gid] = i
+            for i, a in enumerate(arrays):
+                stale = [gid for gid in np.unique(a["game_id"]).tolist() if owner[gid] != i]
+                if stale:
+                    keep = ~np.isin(a["game_id"], stale)
+                    arrays[i] = {c: v[keep] for c, v in a.items()}
+        return {c: np.concatenate([a[c] for a in arrays]) for c in want}
+
+    def compact(self, season: int):
+        files = self._files(season)
+        if len(files) <= 1:
+            return
+        cols = self._read(season)
+        order = np.lexsort((cols["sort_order"], cols["game_id"]))
+        cols = {c: v[order] for c, v in cols.items()}
+        d = self._season_dir(season)
+        tmp = os.path.join(d, "events.parquet.tmp")
+        pq.write_table(pa.table(cols), tmp, compression="zstd", row_group_size=256_000)
+        os.replace(tmp, os.path.join(d, "events.parquet"))
+        for f in files:
+            if not f.endswith("events.parquet"):
+                os.remove(f)
+        print(f"[pbp] compacted season {season}: {len(files)} files -> events.parquet ({len(cols['game_id'])} events)")
+
+    def load_season(self, season: int, columns: list[str] | None = None, event_types=None) -> dict[str, np.ndarray]:
+        filters = [("event_type", "in", list(event_types))] if event_types is not None else None
+        return self._read(season, columns, filters)
+
+    def load_shots(self, season: int, columns: list[str] | None = None) -> dict[str, np.ndarray]:
+        """Shot attempts (on goal, missed, blocked, goals) for one season."""
+        return self.load_season(season, columns or ["game_id", "event_type", "x", "y", "situation_code", "team_id", "player_id", "shot_type"], SHOT_EVENT_TYPES)
+
+
+_store: PbpStore | None = None
+
+
+def ingest_play_by_play(sb, game_id: int, payload: dict) -> int:
+    """Decode a final game's play-by-play, upsert play_by_play_events and buffer it for Parquet."""
+    global _store
+    from model_pipeline import write_rows_chunked
+
+    cols = decode_play_by_play(game_id, payload)
+    rows = columns_to_rows(cols)
+    w = write_rows_chunked(sb, "play_by_play_events", rows, on_conflict="game_id,event_id", chunk_size=1000)
+    if w["failed_rows"]:
+        raise RuntimeError(f"[pbp] {w['failed_rows']}/{w['rows']} play_by_play_events rows failed for game_id={game_id}")
+    if pq is not None:
+        if _store is None:
+            _store = PbpStore()
+        _store.add(cols)
+    return len(rows)
+
+
+def flush_store() -> int:
+    """Write buffered events to Parquet; called once at the end of an ingestion run."""
+    return _store.flush() if _store is not None else 0
+
+
+def rebuild_from_archive(season: int, root: str = PBP_DIR) -> int:
+    """Rebuild a season's Parquet from archived play-by-play payloads (no network)."""
+    from payload_archive import PAYLOAD_ARCHIVE_DIR, PayloadArchive, read_record
+
+    locations = PayloadArchive(PAYLOAD_ARCHIVE_DIR).latest_game_payloads(season=season, kinds=("play_by_play",))
+    store = PbpStore(root)
+    for gid, locs in sorted(locations.items()):
+        payload = read_record(PAYLOAD_ARCHIVE_DIR, locs["play_by_play"])["payload"]
+        if pbp_is_final(payload):
+            store.add(decode_play_by_play(gid, payload))
+    n = store.flush()
+    store.compact(season)
+    return n
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play-by-play Parquet store tools.")
+    parser.add_argument("command", choices=("compact", "rebuild", "bench"))
+    parser.add_argument("--season", type=int, required=True, help="Season id, e.g. 20252026")
+    parser.add_argument("--pbp-dir", default=PBP_DIR, help="Parquet root (env PBP_DIR)")
+    args = parser.parse_args()
+
+    store = PbpStore(args.pbp_dir)
+    if args.command == "compact":
+        store.compact(args.season)
+    elif args.command == "rebuild":
+        print(f"[pbp] rebuilt season {args.season}: {rebuild_from_archive(args.season, args.pbp_dir)} events")
+    else:
+        store.load_shots(args.season)  # warm the page cache
+        started = time.perf_counter()
+        shots = store.load_shots(args.season)
+        elapsed = time.perf_counter() - started
+        print(f"[pbp] season {args.season}: {len(shots['game_id'])} shot attempts in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
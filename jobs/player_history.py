@@ -0,0 +1,139 @@
+import bisect
+from datetime import date
+
+import numpy as np
+
+# Stat columns kept per player-game. Missing values are stored as 0, matching the
+# `x.get(col) or 0` convention used by the rolling feature builders.
+PLAYER_STAT_COLUMNS = ("shots", "goals", "assists", "points", "toi_seconds")
+
+
+class PlayerHistoryIndex:
+    """
+    Compact, array-backed history of skater game stats.
+
+    Rows are sorted by (player, game date) into contiguous buffers:
+      - keys: int64 (player slot << 32 | date ordinal), used for as-of lookups
+      - prefix: float64 prefix sums per stat column, with a leading zero row
+    A windowed mean over the last N games before a date is then two searchsorted
+    calls and a subtraction, for any number of (player, date) queries at once.
+    """
+
+    def __init__(self, player_ids: np.ndarray, keys: np.ndarray, prefix: np.ndarray, columns: tuple[str, ...]):
+        self.player_ids = player_ids
+        self.keys = keys
+        self.prefix = prefix
+        self.columns = columns
+        self._starts = np.searchsorted(keys, np.arange(len(player_ids), dtype=np.int64) << 32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_stats_rows(
+        cls,
+        stats_rows: list[dict],
+        game_date_by_id: dict[int, date],
+        columns: tuple[str, ...] = PLAYER_STAT_COLUMNS,
+    ) -> "PlayerHistoryIndex":
+        n = len(stats_rows)
+        pids = np.empty(n, dtype=np.int64)
+        ordinals = np.empty(n, dtype=np.int64)
+        values = np.zeros((len(columns), n), dtype=np.float64)
+
+        k = 0
+        for r in stats_rows:
+            if r.get("is_goalie"):
+                continue
+            gid = r.get("game_id")
+            if gid is None:
+                continue
+            gdate = game_date_by_id.get(int(gid))
+            if not gdate:
+                continue
+            pids[k] = int(r["player_id"])
+            ordinals[k] = gdate.toordinal()
+            for c, col in enumerate(columns):
+                values[c, k] = r.get(col) or 0
+            k += 1
+
+        pids = pids[:k]
+        ordinals = ordinals[:k]
+        values = values[:, :k]
+
+        player_ids, slots = np.unique(pids, return_inverse=True)
+        keys = (slots.astype(np.int64) << 32) | ordinals
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        prefix = np.zeros((len(columns), k + 1), dtype=np.float64)
+        np.cumsum(values[:, order], axis=1, out=prefix[:, 1:])
+        return cls(player_ids, keys, prefix, columns)
+
+    def window_means(
+        self, player_ids: np.ndarray, as_of: np.ndarray, window: int = 10
+    ) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """
+        Mean of each stat column over each player's last `window` games strictly before `as_of`
+        (date ordinals). Returns (games_counted, {column: means}); means are NaN where no games.
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        as_of = np.asarray(as_of, dtype=np.int64)
+
+        if len(self.player_ids) == 0:
+            empty = np.full(len(player_ids), np.nan)
+            return np.zeros(len(player_ids), dtype=np.int64), {col: empty.copy() for col in self.columns}
+
+        slots = np.minimum(np.searchsorted(self.player_ids, player_ids), len(self.player_ids) - 1)
+        known = self.player_ids[slots] == player_ids
+
+        end = np.searchsorted(self.keys, (slots.astype(np.int64) << 32) | as_of, side="left")
+        start = np.maximum(self._starts[slots], end - window)
+        end = np.where(known, end, start)
+        counts = end - start
+
+        means: dict[str, np.ndarray] = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for c, col in enumerate(self.columns):
+                means[col] = (self.prefix[c, end] - self.prefix[c, start]) / counts
+        return counts, means
+
+
+class ActiveRosterIndex:
+    """
+    Skaters who dressed for each team, by game, from player game stats.
+
+    Built in one pass over the stats rows: appearances are grouped per (team, game) and each team's
+    games are sorted by date, so the players from a team's last N games before any date are a
+    bisect plus a union of N small sets.
+    """
+
+    def __init__(self, team_games: dict[int, tuple[list[int], list[frozenset[int]]]]):
+        # team_id -> (game date ordinals ascending, players who appeared in each of those games)
+        self.team_games = team_games
+
+    @classmethod
+    def from_stats_rows(cls, stats_rows: list[dict], game_date_by_id: dict[int, date]) -> "ActiveRosterIndex":
+        appeared: dict[tuple[int, int], set[int]] = {}
+        for r in stats_rows:
+            if r.get("is_goalie") or r.get("team_id") is None or r.get("player_id") is None:
+                continue
+            gid = int(r["game_id"])
+            if gid not in game_date_by_id:
+                continue
+            appeared.setdefault((int(r["team_id"]), gid), set()).add(int(r["player_id"]))
+
+        by_team: dict[int, list[tuple[int, int, frozenset[int]]]] = {}
+        for (team_id, gid), players in appeared.items():
+            by_team.setdefault(team_id, []).append((game_date_by_id[gid].toordinal(), gid, frozenset(players)))
+        team_games: dict[int, tuple[list[int], list[frozenset[int]]]] = {}
+        for team_id, games in by_team.items():
+            games.sort()
+            team_games[team_id] = ([g[0] for g in games], [g[2] for g in games])
+        return cls(team_games)
+
+    def roster(self, team_id: int, as_of: date, last_n: int) -> list[int]:
+        """Players who appeared for team_id in any of its last `last_n` games strictly before as_of."""
+        ordinals, players = self.team_games.get(int(team_id), ([], []))
+        end = bisect.bisect_left(ordinals, as_of.toordinal())
+        return sorted(frozenset().union(*players[max(0, end - last_n) : end]))
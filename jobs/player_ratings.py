@@ -0,0 +1,381 @@
+"""
+Player rating aggregates: season-to-date and rolling-window rates per player, written to
+player_ratings and maintained incrementally.
+
+Running sums live in player_rating_state (see migrations/20261019_player_rating_state.sql): each
+player's season totals plus their last PLAYER_RATING_WINDOW_GAMES game lines. A run reads only the
+player_game_stats rows updated since the stored watermark, folds each player's new games (in game_id
+order) into their state, and upserts player_ratings (as_of_date = today) and state for just those
+players, so a daily refresh costs O(new player-games). A row for a game the state already counted
+is skipped when unchanged; a stat correction, or a late game older than the player's last counted
+one, rebuilds that player from their season's rows instead.
+
+toi_rate is seconds per game; shots/goals/assists/points rates and goalie_ga_rate are per 60
+minutes of TOI; pp_share is the player's share of the team's power-play time (the most PP TOI any
+teammate logged that game). The columns hold season-to-date values (regular season and playoffs);
+notes carries the rolling-window values and game counts.
+
+    python jobs/player_ratings.py          # fold in games updated since the watermark
+    python jobs/player_ratings.py --full   # rebuild the current season from scratch
+"""
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import cast
+
+from model_pipeline import (
+    PLAYER_RATINGS_VERSION,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    ensure_model_version,
+    parse_utc,
+    sb_exec,
+    sb_fetch_all,
+    season_string_for_date,
+    write_rows_chunked,
+)
+
+PLAYER_RATING_WINDOW_GAMES = int(os.environ.get("PLAYER_RATING_WINDOW_GAMES", "10"))
+# Rows are stamped updated_at when parsed and written a moment later, so a concurrent ingestion can
+# land rows just below the max read at the start of a run; re-read this far behind the watermark.
+PLAYER_RATING_WATERMARK_OVERLAP_MINUTES = float(os.environ.get("PLAYER_RATING_WATERMARK_OVERLAP_MINUTES", "10"))
+IN_CHUNK = 200
+
+STATS_COLUMNS = (
+    "game_id,player_id,team_id,position,is_goalie,toi_seconds,goals,assists,points,shots,pp_toi_seconds,"
+    "shots_against,saves,goals_against,updated_at"
+)
+# game line key -> player_game_stats column
+SKATER_FIELDS = {
+    "toi": "toi_seconds",
+    "shots": "shots",
+    "goals": "goals",
+    "assists": "assists",
+    "points": "points",
+    "pp_toi": "pp_toi_seconds",
+}
+GOALIE_FIELDS = {"toi": "toi_seconds", "shots_against": "shots_against", "saves": "saves", "goals_against": "goals_against"}
+RATING_COLUMNS = (
+    "toi_rate",
+    "shots_rate",
+    "shooting_pct",
+    "goals_rate",
+    "assists_rate",
+    "points_rate",
+    "pp_share",
+    "goalie_save_pct",
+    "goalie_ga_rate",
+)
+
+
+def counts_toward_rating(game_id: int) -> bool:
+    # Game type is digits 5-6 of the id: 01 preseason, 02 regular season, 03 playoffs.
+    return (int(game_id) // 10_000) % 100 in (2, 3)
+
+
+def team_pp_seconds(rows: list[dict]) -> dict[tuple[int, int], int]:
+    """(game_id, team_id) -> the team's power-play time, taken as the most PP TOI any skater logged."""
+    out: dict[tuple[int, int], int] = {}
+    for r in rows:
+        if r.get("is_goalie") or r.get("team_id") is None:
+            continue
+        key = (int(r["game_id"]), int(r["team_id"]))
+        out[key] = max(out.get(key, 0), int(r.get("pp_toi_seconds") or 0))
+    return out
+
+
+def game_line(row: dict, team_pp: dict[tuple[int, int], int]) -> dict:
+    line = {"game_id": int(row["game_id"])}
+    for key, col in (GOALIE_FIELDS if row.get("is_goalie") else SKATER_FIELDS).items():
+        line[key] = int(row.get(col) or 0)
+    if not row.get("is_goalie"):
+        line["team_pp"] = team_pp.get((line["game_id"], int(row.get("team_id") or 0)), 0)
+    return line
+
+
+def new_state(player_id: int, season: int) -> dict:
+    return {
+        "player_id": int(player_id),
+        "season": season,
+        "last_game_id": 0,
+        "team_id": None,
+        "position": None,
+        "is_goalie": False,
+        "games": 0,
+        "totals": {},
+        "recent": [],
+    }
+
+
+def fold(state: dict, row: dict, line: dict, window: int):
+    """Add one game to a player's running sums; games must arrive in game_id order."""
+    for key, value in line.items():
+        if key != "game_id":
+            state["totals"][key] = state["totals"].get(key, 0) + value
+    state["games"] += 1
+    state["recent"] = (state["recent"] + [line])[-window:]
+    state["last_game_id"] = line["game_id"]
+    state["team_id"] = row.get("team_id") if row.get("team_id") is not None else state["team_id"]
+    state["position"] = row.get("position") or state["position"]
+    state["is_goalie"] = bool(row.get("is_goalie"))
+
+
+def window_sums(lines: list[dict]) -> dict:
+    sums: dict[str, int] = defaultdict(int)
+    for line in lines:
+        for key, value in line.items():
+            if key != "game_id":
+                sums[key] += value
+    return sums
+
+
+def rates(sums: dict, games: int, is_goalie: bool) -> dict:
+    toi = sums.get("toi", 0)
+
+    def per60(key: str) -> float | None:
+        return sums.get(key, 0) * 3600.0 / toi if toi else None
+
+    def ratio(num: str, den: str) -> float | None:
+        return sums.get(num, 0) / sums[den] if sums.get(den) else None
+
+    out: dict[str, float | None] = {c: None for c in RATING_COLUMNS}
+    out["toi_rate"] = toi / games if games else None
+    if is_goalie:
+        out.update(goalie_save_pct=ratio("saves", "shots_against"), goalie_ga_rate=per60("goals_against"))
+    else:
+        out.update(
+            shots_rate=per60("shots"),
+            goals_rate=per60("goals"),
+            assists_rate=per60("assists"),
+            points_rate=per60("points"),
+            shooting_pct=ratio("goals", "shots"),
+            pp_share=ratio("pp_toi", "team_pp"),
+        )
+    return out
+
+
+def rating_row(state: dict, model_version: str, as_of: date, generated_at: str) -> dict:
+    key = f"{state['season']}|{state['last_game_id']}|{state['games']}|{json.dumps(state['totals'], sort_keys=True)}"
+    return {
+        "player_id": state["player_id"],
+        "team_id": state["team_id"],
+        "model_version": model_version,
+        "as_of_date": as_of.isoformat(),
+        "generated_at": generated_at,
+        "position": state["position"],
+        "is_goalie": state["is_goalie"],
+        **rates(state["totals"], state["games"], state["is_goalie"]),
+        "inputs_hash": hashlib.sha256(key.encode()).hexdigest()[:16],
+        "notes": json.dumps(
+            {
+                "season": state["season"],
+                "games": state["games"],
+                "last_game_id": state["last_game_id"],
+                "window_games": len(state["recent"]),
+                "window": rates(window_sums(state["recent"]), len(state["recent"]), state["is_goalie"]),
+            }
+        ),
+    }
+
+
+def state_row(state: dict, model_version: str, updated_at: str) -> dict:
+    return {**state, "model_version": model_version, "updated_at": updated_at}
+
+
+# --- Reads ---
+
+def fetch_watermark(sb, model_version: str) -> str | None:
+    rows = sb_exec(
+        sb.table("player_rating_watermarks").select("stats_updated_at").eq("model_version", model_version),
+        "fetch player_rating_watermarks",
+    ).data or []
+    return rows[0]["stats_updated_at"] if rows else None
+
+
+def fetch_latest_stats_update(sb) -> str | None:
+    rows = sb_exec(
+        sb.table("player_game_stats").select("updated_at").order("updated_at", desc=True).limit(1),
+        "fetch latest player_game_stats update",
+    ).data or []
+    return rows[0]["updated_at"] if rows else None
+
+
+def fetch_changed_stats(sb, first_game_id: int, since: str | None) -> list[dict]:
+    def query():
+        q = sb.table("player_game_stats").select(STATS_COLUMNS).gte("game_id", first_game_id)
+        if since:
+            q = q.gt("updated_at", since)
+        return q.order("game_id").order("player_id")
+
+    return sb_fetch_all(query, "fetch changed player_game_stats")
+
+
+def fetch_states(sb, model_version: str, player_ids: list[int]) -> dict[int, dict]:
+    states: dict[int, dict] = {}
+    for i in range(0, len(player_ids), IN_CHUNK):
+        rows = sb_exec(
+            sb.table("player_rating_state")
+            .select("player_id,season,last_game_id,team_id,position,is_goalie,games,totals,recent")
+            .eq("model_version", model_version)
+            .in_("player_id", player_ids[i : i + IN_CHUNK]),
+            "fetch player_rating_state",
+        ).data or []
+        states.update({int(r["player_id"]): r for r in rows})
+    return states
+
+
+def fetch_player_season_stats(sb, player_ids: list[int], first_game_id: int) -> list[dict]:
+    rows: list[dict] = []
+    for i in range(0, len(player_ids), IN_CHUNK):
+        chunk = player_ids[i : i + IN_CHUNK]
+        rows.extend(
+            sb_fetch_all(
+                lambda: sb.table("player_game_stats")
+                .select(STATS_COLUMNS)
+                .in_("player_id", chunk)
+                .gte("game_id", first_game_id)
+                .order("game_id")
+                .order("player_id"),
+                "fetch player season stats",
+            )
+        )
+    return rows
+
+
+def fetch_team_pp(sb, game_ids: list[int]) -> dict[tuple[int, int], int]:
+    rows: list[dict] = []
+    for i in range(0, len(game_ids), IN_CHUNK):
+        chunk = game_ids[i : i + IN_CHUNK]
+        rows.extend(
+            sb_fetch_all(
+                lambda: sb.table("player_game_stats")
+                .select("game_id,player_id,team_id,is_goalie,pp_toi_seconds")
+                .in_("game_id", chunk)
+                .order("game_id")
+                .order("player_id"),
+                "fetch team power-play time",
+            )
+        )
+    return team_pp_seconds(rows)
+
+
+# --- Update ---
+
+def rebuild_states(rows: list[dict], team_pp: dict[tuple[int, int], int], season: int, window: int) -> dict[int, dict]:
+    by_player: dict[int, list[dict]] = defaultdict(list)
+    for r in rows:
+        if r.get("player_id") is not None and counts_toward_rating(r["game_id"]):
+            by_player[int(r["player_id"])].append(r)
+    states: dict[int, dict] = {}
+    for pid, player_rows in by_player.items():
+        state = new_state(pid, season)
+        for r in sorted(player_rows, key=lambda x: int(x["game_id"])):
+            fold(state, r, game_line(r, team_pp), window)
+        states[pid] = state
+    return states
+
+
+def update_player_ratings(
+    sb,
+    model_version: str = PLAYER_RATINGS_VERSION,
+    as_of: date | None = None,
+    full: bool = False,
+    window: int = PLAYER_RATING_WINDOW_GAMES,
+) -> dict:
+    """
+    Fold player_game_stats rows updated since the watermark into player_rating_state and upsert
+    player_ratings for the players they touch. full=True ignores the watermark and stored state and
+    rebuilds the season. Returns {"rows", "players", "rebuilt"}.
+    """
+    now = datetime.now(timezone.utc)
+    as_of = as_of or now.date()
+    season = int(season_string_for_date(as_of))
+    first_game_id = (season // 10_000) * 1_000_000
+    ensure_model_version(sb, model_version, "season-to-date and rolling player rates", is_active=False)
+
+    watermark = None if full else fetch_watermark(sb, model_version)
+    # Read before the delta, so rows landing mid-run are picked up by the next run.
+    high = fetch_latest_stats_update(sb)
+    since = None
+    if watermark:
+        since = (cast(datetime, parse_utc(watermark)) - timedelta(minutes=PLAYER_RATING_WATERMARK_OVERLAP_MINUTES)).isoformat()
+    rows = [
+        r for r in fetch_changed_stats(sb, first_game_id, since) if r.get("player_id") is not None and counts_toward_rating(r["game_id"])
+    ]
+
+    by_player: dict[int, list[dict]] = defaultdict(list)
+    for r in rows:
+        by_player[int(r["player_id"])].append(r)
+    stored = {} if full else fetch_states(sb, model_version, sorted(by_player))
+    team_pp = team_pp_seconds(rows)
+
+    changed: dict[int, dict] = {}
+    rebuild: list[int] = []
+    for pid, player_rows in by_player.items():
+        state = stored.get(pid)
+        if state is None or int(state["season"]) != season:
+            state = new_state(pid, season)
+        counted = {int(line["game_id"]): line for line in state["recent"]}
+        folded = 0
+        for r in sorted(player_rows, key=lambda x: int(x["game_id"])):
+            line = game_line(r, team_pp)
+            if line["game_id"] > int(state["last_game_id"]):
+                fold(state, r, line, window)
+                folded += 1
+            elif counted.get(line["game_id"]) != line:
+                rebuild.append(pid)
+                break
+        else:
+            if folded:
+                changed[pid] = state
+
+    if rebuild:
+        season_rows = fetch_player_season_stats(sb, rebuild, first_game_id)
+        pp = fetch_team_pp(sb, sorted({int(r["game_id"]) for r in season_rows}))
+        changed.update(rebuild_states(season_rows, pp, season, window))
+
+    generated_at = now.isoformat()
+    states = [changed[pid] for pid in sorted(changed)]
+    ratings = [rating_row(s, model_version, as_of, generated_at) for s in states]
+    for table, out, on_conflict in (
+        ("player_ratings", ratings, "player_id,model_version,as_of_date"),
+        ("player_rating_state", [state_row(s, model_version, generated_at) for s in states], "player_id,model_version"),
+    ):
+        write = write_rows_chunked(sb, table, out, on_conflict=on_conflict)
+        if write["failed_rows"]:
+            # Leave the watermark alone: the next run re-reads these rows and refolds them.
+            raise RuntimeError(f"[player_ratings] {write['failed_rows']} {table} rows failed to write")
+    if high:
+        sb_exec(
+            sb.table("player_rating_watermarks").upsert(
+                {"model_version": model_version, "stats_updated_at": high, "updated_at": generated_at}, on_conflict="model_version"
+            ),
+            "upsert player_rating_watermarks",
+        )
+    print(
+        f"[player_ratings] {len(rows)} player-game rows since {watermark or 'season start'}: "
+        f"{len(changed)} players updated ({len(rebuild)} rebuilt)"
+    )
+    return {"rows": len(rows), "players": len(changed), "rebuilt": len(rebuild)}
+
+
+def main():
+    import argparse
+
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description="Update player_ratings from games ingested since the last run.")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and rebuild the current season")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="as_of_date for the rows (default today)")
+    parser.add_argument("--window", type=int, default=PLAYER_RATING_WINDOW_GAMES, help="Rolling window in games")
+    parser.add_argument("--model-version", default=PLAYER_RATINGS_VERSION)
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    update_player_ratings(sb, args.model_version, as_of=args.as_of, full=args.full, window=args.window)
+
+
+if __name__ == "__main__":
+    main()
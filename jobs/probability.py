@@ -0,0 +1,82 @@
+"""
+Vectorized probability and odds helpers shared by the market and prop stages.
+All functions take NumPy arrays and evaluate every element in one pass.
+"""
+import numpy as np
+
+
+def poisson_pmf_matrix(lams: np.ndarray, max_k: int) -> np.ndarray:
+    """P(X = k) for k in 0..max_k, one row per lambda. Built by recurrence, so no factorials."""
+    lams = np.asarray(lams, dtype=np.float64)
+    pmf = np.empty((len(lams), max_k + 1), dtype=np.float64)
+    pmf[:, 0] = np.exp(-lams)
+    for k in range(1, max_k + 1):
+        pmf[:, k] = pmf[:, k - 1] * lams / k
+    return pmf
+
+
+def poisson_cdf(lams: np.ndarray, ks: np.ndarray, max_k: int = 40) -> np.ndarray:
+    """P(X <= k) elementwise. k < 0 gives 0; k >= max_k gives 1."""
+    ks = np.asarray(ks, dtype=np.int64)
+    cdf = np.cumsum(poisson_pmf_matrix(lams, max_k), axis=1)
+    out = cdf[np.arange(len(ks)), np.clip(ks, 0, max_k)]
+    out = np.where(ks < 0, 0.0, out)
+    return np.where(ks >= max_k, 1.0, np.minimum(out, 1.0))
+
+
+def negbin_cdf(means: np.ndarray, size: np.ndarray | float, ks: np.ndarray, max_k: int = 40) -> np.ndarray:
+    """
+    P(X <= k) elementwise for a negative binomial with the given mean and size (dispersion r,
+    variance = mean + mean^2 / r). Infinite size falls back to Poisson. Same edge handling as poisson_cdf.
+    """
+    means = np.asarray(means, dtype=np.float64)
+    size = np.broadcast_to(np.asarray(size, dtype=np.float64), means.shape)
+    ks = np.asarray(ks, dtype=np.int64)
+    poisson = ~np.isfinite(size)
+    r = np.where(poisson, 1.0, size)
+    q = means / (r + means)
+    pmf = np.empty((len(means), max_k + 1), dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pmf[:, 0] = np.where(poisson, np.exp(-means), (r / (r + means)) ** r)
+        for k in range(1, max_k + 1):
+            pmf[:, k] = pmf[:, k - 1] * np.where(poisson, means / k, (k - 1 + r) / k * q)
+    cdf = np.cumsum(pmf, axis=1)
+    out = cdf[np.arange(len(ks)), np.clip(ks, 0, max_k)]
+    out = np.where(ks < 0, 0.0, out)
+    return np.where(ks >= max_k, 1.0, np.minimum(out, 1.0))
+
+
+def goal_diff_cdf(lam_home: np.ndarray, lam_away: np.ndarray, ds: np.ndarray, max_goals: int = 20) -> np.ndarray:
+    """P(home - away <= d) elementwise under independent Poisson goals."""
+    ph = poisson_pmf_matrix(lam_home, max_goals)
+    pa = poisson_pmf_matrix(lam_away, max_goals)
+    joint = ph[:, :, None] * pa[:, None, :]
+    diff = np.subtract.outer(np.arange(max_goals + 1), np.arange(max_goals + 1))
+    ds = np.asarray(ds, dtype=np.int64)
+    return (joint * (diff[None, :, :] <= ds[:, None, None])).sum(axis=(1, 2))
+
+
+def implied_prob_from_american(odds: np.ndarray) -> np.ndarray:
+    """Break-even probability of American odds (vig included). NaN where odds are missing or 0."""
+    odds = np.asarray(odds, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(odds > 0, 100.0 / (odds + 100.0), -odds / (-odds + 100.0))
+    return np.where(np.isnan(odds) | (odds == 0), np.nan, out)
+
+
+def american_from_prob(p: np.ndarray) -> np.ndarray:
+    """Fair American odds for probabilities; NaN outside (0, 1). Same rounding as american_odds_from_prob."""
+    p = np.asarray(p, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fav = np.round(-100.0 * p / (1.0 - p))
+        dog = np.round(100.0 * (1.0 - p) / p)
+        out = np.where(p >= 0.5, fav, dog)
+    return np.where((p > 0.0) & (p < 1.0), out, np.nan)
+
+
+def to_optional_ints(values: np.ndarray) -> list[int | None]:
+    return [None if np.isnan(v) else int(v) for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def to_optional_floats(values: np.ndarray) -> list[float | None]:
+    return [None if np.isnan(v) else float(v) for v in np.asarray(values, dtype=np.float64).tolist()]
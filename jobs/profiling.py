@@ -0,0 +1,83 @@
+"""
+Stage profiler for the pipeline's --profile mode: wall and CPU time per stage, peak RSS, and
+tracemalloc top allocations for stages marked as traced (tracing slows those stages, so compare
+their timings only against other profiled runs). Disabled profilers cost nothing, so stages stay
+wrapped in normal runs.
+"""
+import cProfile
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageProfiler:
+    def __init__(self, enabled: bool = False, cprofile: bool = False, top_allocations: int = 5):
+        self.enabled = enabled
+        self.top_allocations = top_allocations
+        self.stages: list[dict] = []
+        self._started = time.perf_counter()
+        self._cprofile = cProfile.Profile() if enabled and cprofile else None
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    @contextmanager
+    def stage(self, name: str, trace: bool = False) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        tracing = trace and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "name": name,
+                "wall_s": round(time.perf_counter() - wall, 4),
+                "cpu_s": round(time.process_time() - cpu, 4),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            }
+            if tracing:
+                snapshot = tracemalloc.take_snapshot()
+                _, traced_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                record["traced_peak_mb"] = round(traced_peak / 1e6, 2)
+                record["top_allocations"] = [
+                    {"where": f"{s.traceback[0].filename.rsplit('/', 1)[-1]}:{s.traceback[0].lineno}", "kb": round(s.size / 1024, 1)}
+                    for s in snapshot.statistics("lineno")[: self.top_allocations]
+                ]
+            self.stages.append(record)
+
+    def metrics(self) -> dict:
+        """Compact JSON-ready summary of the stages recorded so far."""
+        if not self.enabled:
+            return {}
+        return {
+            "total_wall_s": round(time.perf_counter() - self._started, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": list(self.stages),
+        }
+
+    def report(self):
+        if not self.enabled:
+            return
+        for s in self.stages:
+            traced = f", traced peak {s['traced_peak_mb']}MB" if "traced_peak_mb" in s else ""
+            print(f"[profile] {s['name']:<28} {s['wall_s']:>8.3f}s wall {s['cpu_s']:>8.3f}s cpu{traced}")
+        print(f"[profile] peak RSS {peak_rss_mb():.1f}MB, total {time.perf_counter() - self._started:.2f}s")
+
+    def dump_cprofile(self, path: str):
+        if self._cprofile is None:
+            return
+        self._cprofile.disable()
+        self._cprofile.dump_stats(path)
+        print(f"[profile] cProfile stats written to {path}")
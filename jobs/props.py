@@ -0,0 +1,134 @@
+"""
+Player prop ladders: over/under probabilities for a fixed ladder of lines per prop, for every
+player projection in a run, computed for all players at once with batched CDFs.
+
+Shots are overdispersed relative to Poisson, so they use a negative binomial (PROP_SHOTS_DISPERSION);
+goals and points use Poisson. Written to player_prop_lines by model_pipeline.py; this CLI rebuilds
+the ladders for an existing run or benchmarks the generator:
+
+    python jobs/props.py --run-id <projection_run_id>
+    python jobs/props.py --bench
+"""
+import os
+import time
+from typing import cast
+
+import numpy as np
+
+from probability import negbin_cdf
+
+PROP_LINES_CONFLICT = "projection_run_id,game_id,player_id,prop,line_value_key"
+
+# prop -> (player_projections mean column, ladder lines, negative binomial size or inf for Poisson)
+PROP_LADDERS = {
+    "shots": ("shots_mean", (0.5, 1.5, 2.5, 3.5, 4.5, 5.5), float(os.environ.get("PROP_SHOTS_DISPERSION", "8"))),
+    "goals": ("goals_mean", (0.5, 1.5), np.inf),
+    "points": ("points_mean", (0.5, 1.5), np.inf),
+}
+
+
+def build_prop_ladders(player_rows: list[dict], ladders: dict = PROP_LADDERS) -> list[dict]:
+    """
+    Rows of {game_id, player_id, prop, line_value, line_value_key, over_prob, under_prob, dist} for
+    every player row with a mean for the prop. Half-point lines only, so under = 1 - over.
+    """
+    out: list[dict] = []
+    for prop, (col, lines, size) in ladders.items():
+        rows = [r for r in player_rows if r.get(col) is not None]
+        if not rows:
+            continue
+        means = np.array([float(r[col]) for r in rows], dtype=np.float64)
+        line_arr = np.asarray(lines, dtype=np.float64)
+        # One flat CDF evaluation over (player, line) pairs: over = 1 - P(X <= floor(line)).
+        flat_means = np.repeat(means, len(line_arr))
+        flat_ks = np.tile(np.floor(line_arr).astype(np.int64), len(means))
+        over = (1.0 - negbin_cdf(flat_means, size, flat_ks)).reshape(len(means), len(line_arr))
+        over = np.clip(over, 0.0, 1.0).tolist()
+        keys = [int(round(v * 10)) for v in lines]
+        dist = "negbin" if np.isfinite(size) else "poisson"
+        for i, r in enumerate(rows):
+            gid, pid = int(r["game_id"]), int(r["player_id"])
+            for j, line in enumerate(lines):
+                out.append(
+                    {
+                        "game_id": gid,
+                        "player_id": pid,
+                        "prop": prop,
+                        "line_value": line,
+                        "line_value_key": keys[j],
+                        "over_prob": over[i][j],
+                        "under_prob": 1.0 - over[i][j],
+                        "dist": dist,
+                    }
+                )
+    return out
+
+
+def rebuild_run(sb, run_id: str) -> dict:
+    # model_pipeline imports this module, so its helpers are imported at call time.
+    from model_pipeline import sb_exec, sb_fetch_all, write_rows_chunked
+
+    run = sb_exec(
+        sb.table("projection_runs").select("run_id,model_version").eq("run_id", run_id), "fetch projection_run"
+    ).data
+    if not run:
+        raise RuntimeError(f"[props] projection run {run_id} not found")
+    player_rows = sb_fetch_all(
+        lambda: sb.table("player_projections")
+        .select("game_id,player_id,shots_mean,goals_mean,points_mean")
+        .eq("projection_run_id", run_id)
+        .order("game_id")
+        .order("player_id"),
+        "fetch player_projections",
+    )
+    rows = build_prop_ladders(player_rows)
+    for r in rows:
+        r["projection_run_id"] = run_id
+        r["model_version"] = run[0]["model_version"]
+    return write_rows_chunked(sb, "player_prop_lines", rows, on_conflict=PROP_LINES_CONFLICT)
+
+
+def bench(n_players: int = 1_000):
+    rng = np.random.default_rng(0)
+    rows = [
+        {
+            "game_id": 1,
+            "player_id": i,
+            "shots_mean": float(rng.uniform(0.5, 4.5)),
+            "goals_mean": float(rng.uniform(0.05, 0.5)),
+            "points_mean": float(rng.uniform(0.1, 1.2)),
+        }
+        for i in range(n_players)
+    ]
+    build_prop_ladders(rows[:10])  # warm-up
+    started = time.perf_counter()
+    out = build_prop_ladders(rows)
+    elapsed = time.perf_counter() - started
+    print(f"[props] {n_players} players -> {len(out)} ladder rows in {elapsed * 1000:.1f}ms")
+
+
+def main():
+    import argparse
+
+    from supabase import create_client
+
+    from model_pipeline import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+
+    parser = argparse.ArgumentParser(description="Build player prop ladders for a projection run.")
+    parser.add_argument("--run-id", help="projection_runs.run_id to rebuild ladders for")
+    parser.add_argument("--bench", action="store_true", help="Time ladder generation for 1,000 players and exit")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench()
+        return
+    if not args.run_id:
+        parser.error("--run-id is required unless --bench is given")
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    w = rebuild_run(sb, args.run_id)
+    print(f"[props] wrote {w['rows'] - w['failed_rows']}/{w['rows']} player_prop_lines rows ({w['seconds']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
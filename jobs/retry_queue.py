@@ -0,0 +1,133 @@
+"""
+Persistent retry queue for per-game ingestion stages (ingest_retry_queue, see
+migrations/20261019_ingest_retry_queue.sql).
+
+A failing stage is queued with its error and attempt count; runs drain due entries first
+(run_jobs.drain_retry_queue), backing off RETRY_BASE_MINUTES * 2^(attempts-1) between attempts (capped
+at RETRY_MAX_BACKOFF_HOURS). After RETRY_MAX_ATTEMPTS failures the entry is dead-lettered and left
+alone until requeued:
+
+    python jobs/retry_queue.py                 # list pending and dead entries
+    python jobs/retry_queue.py --requeue-dead  # give dead entries a fresh set of attempts
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+from run_jobs import sb_exec
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_MINUTES = float(os.environ.get("RETRY_BASE_MINUTES", "10"))
+RETRY_MAX_BACKOFF_HOURS = float(os.environ.get("RETRY_MAX_BACKOFF_HOURS", "24"))
+
+
+def backoff(attempts: int) -> timedelta:
+    minutes = RETRY_BASE_MINUTES * 2 ** max(0, attempts - 1)
+    return min(timedelta(minutes=minutes), timedelta(hours=RETRY_MAX_BACKOFF_HOURS))
+
+
+def _next_attempt_at(row: dict) -> datetime:
+    return datetime.fromisoformat(str(row["next_attempt_at"]).replace("Z", "+00:00"))
+
+
+class RetryQueue:
+    def __init__(self, sb, max_attempts: int = RETRY_MAX_ATTEMPTS):
+        self.sb = sb
+        self.max_attempts = max_attempts
+        # (game_id, stage) -> queue row, for everything queued (pending or dead) as of load().
+        self.rows: dict[tuple[int, str], dict] = {}
+
+    def load(self) -> "RetryQueue":
+        rows = sb_exec(self.sb.table("ingest_retry_queue").select("*"), "fetch ingest_retry_queue").data or []
+        self.rows = {(int(r["game_id"]), r["stage"]): r for r in rows}
+        return self
+
+    def due(self, now: datetime | None = None) -> dict[int, list[str]]:
+        """Pending entries whose backoff has passed, as game_id -> stages."""
+        now = now or datetime.now(timezone.utc)
+        out: dict[int, list[str]] = {}
+        for (gid, stage), r in sorted(self.rows.items()):
+            if r["status"] == "pending" and _next_attempt_at(r) <= now:
+                out.setdefault(gid, []).append(stage)
+        return out
+
+    def blocked_stages(self, game_id: int, now: datetime | None = None) -> set[str]:
+        """Stages of game_id that are dead-lettered or still backing off; runs leave them alone."""
+        now = now or datetime.now(timezone.utc)
+        blocked: set[str] = set()
+        for (gid, stage), r in self.rows.items():
+            if gid != int(game_id):
+                continue
+            if r["status"] == "dead" or _next_attempt_at(r) > now:
+                blocked.add(stage)
+        return blocked
+
+    def failed(self, game_id: int, stage: str, error: str):
+        now = datetime.now(timezone.utc)
+        key = (int(game_id), stage)
+        prev = self.rows.get(key)
+        attempts = (prev["attempts"] if prev else 0) + 1
+        dead = attempts >= self.max_attempts
+        row = {
+            "game_id": key[0],
+            "stage": stage,
+            "status": "dead" if dead else "pending",
+            "attempts": attempts,
+            "last_error": error[:2000],
+            "first_failed_at": prev["first_failed_at"] if prev else now.isoformat(),
+            "last_failed_at": now.isoformat(),
+            "next_attempt_at": (now + backoff(attempts)).isoformat(),
+        }
+        sb_exec(self.sb.table("ingest_retry_queue").upsert(row, on_conflict="game_id,stage"), "upsert ingest_retry_queue")
+        self.rows[key] = row
+        if dead:
+            print(f"[retry] game_id={key[0]} {stage} dead-lettered after {attempts} attempts: {error}")
+
+    def succeeded(self, game_id: int, stage: str):
+        key = (int(game_id), stage)
+        if key not in self.rows:
+            return
+        sb_exec(
+            self.sb.table("ingest_retry_queue").delete().eq("game_id", key[0]).eq("stage", stage),
+            "delete ingest_retry_queue",
+        )
+        print(f"[retry] game_id={key[0]} {stage} recovered after {self.rows.pop(key)['attempts']} failed attempt(s)")
+
+    def requeue_dead(self) -> int:
+        now = datetime.now(timezone.utc).isoformat()
+        dead = [r for r in self.rows.values() if r["status"] == "dead"]
+        if dead:
+            sb_exec(
+                self.sb.table("ingest_retry_queue").update({"status": "pending", "attempts": 0, "next_attempt_at": now}).eq("status", "dead"),
+                "requeue dead ingest_retry_queue",
+            )
+        return len(dead)
+
+
+def main():
+    import argparse
+
+    from supabase import create_client
+
+    from run_jobs import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL
+
+    parser = argparse.ArgumentParser(description="Inspect the ingestion retry queue.")
+    parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered entries back to pending")
+    args = parser.parse_args()
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    queue = RetryQueue(sb).load()
+    if args.requeue_dead:
+        print(f"[retry] requeued {queue.requeue_dead()} dead entries")
+        return
+    for (gid, stage), r in sorted(queue.rows.items(), key=lambda kv: (kv[1]["status"], kv[0])):
+        print(
+            f"[retry] {r['status']:<7} game_id={gid} {stage:<12} attempts={r['attempts']} "
+            f"next={r['next_attempt_at']} error={r.get('last_error')}"
+        )
+    if not queue.rows:
+        print("[retry] queue is empty")
+
+
+if __name__ == "__main__":
+    main()
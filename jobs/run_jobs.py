@@ -6,6 +6,8 @@ import requests
 from supabase import create_client
 from dotenv import load_dotenv
 
+from payload_archive import archived
+
 load_dotenv(dotenv_path=".env")
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -14,6 +16,21 @@ SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 API_WEB = "https://api-web.nhle.com/v1"
 API_GAMECENTER = "https://api-web.nhle.com/v1/gamecenter"
 STATS_API_TEAMS_URL = "https://statsapi.web.nhl.com/api/v1/teams"
+# The team directory is stable; a long-running process refreshes it at most this often.
+TEAM_DIRECTORY_TTL_HOURS = float(os.environ.get("TEAM_DIRECTORY_TTL_HOURS", "24"))
+
+# A game ingested by any worker is not re-ingested by another within this window.
+GAME_INGEST_REDO_AFTER_SECONDS = int(os.environ.get("GAME_INGEST_REDO_AFTER_SECONDS", "600"))
+
+# One pooled session per process so repeated NHL API calls reuse keep-alive connections.
+HTTP = requests.Session()
+_team_directory_refreshed_at: datetime | None = None
+
+
+def http_get_json(url: str) -> dict:
+    r = HTTP.get(url, timeout=30)
+    r.raise_for_status()
+    return r.json()
 
 def sb_exec(q, label: str):
     """
@@ -73,25 +90,19 @@ def poisson_spread_cover_prob(lam_home: float, lam_away: float, spread_home: flo
 
 def fetch_schedule(d: date) -> dict:
     url = f"{API_WEB}/schedule/{d.isoformat()}"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return archived("schedule", d.isoformat(), http_get_json(url))
 
 
 def fetch_gamecenter_right_rail(game_id: int) -> dict:
     url = f"{API_GAMECENTER}/{int(game_id)}/right-rail"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return archived("right_rail", int(game_id), http_get_json(url), game_id=int(game_id))
 
 def fetch_gamecenter_boxscore(game_id: int) -> dict:
     """
     NHL api-web gamecenter boxscore endpoint. Contains skater + goalie stats per game.
     """
     url = f"{API_GAMECENTER}/{int(game_id)}/boxscore"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return archived("boxscore", int(game_id), http_get_json(url), game_id=int(game_id))
 
 
 def upsert_teams(sb, teams: list[dict]):
@@ -131,11 +142,10 @@ def upsert_teams(sb, teams: list[dict]):
         sb_exec(sb.table("teams").upsert(rows, on_conflict="team_id"), "upsert teams")
 
 
-def upsert_games_and_results(sb, schedule_json: dict):
+def parse_schedule(schedule_json: dict) -> tuple[list[dict], list[dict], list[dict]]:
     """
-    Upsert teams + games + game_results from the schedule payload ONLY.
+    (teams, games, game_results) rows from a schedule payload, without touching the network or the DB.
     Uses api-web.nhle.com schedule objects, which include team name + placeName.
-    Avoids any dependency on statsapi.web.nhl.com.
     """
     games = []
 
@@ -300,25 +310,41 @@ def upsert_games_and_results(sb, schedule_json: dict):
                 }
             )
 
+    return list(teams_by_id.values()), games_rows, results_rows
+
+
+def resolve_abbrev_conflicts(sb, teams_rows: list[dict]):
+    """Avoid unique abbrev conflicts: rows whose abbrev another team_id owns get a placeholder."""
+    abbrevs = [r.get("abbrev") for r in teams_rows if r.get("abbrev")]
+    if not abbrevs:
+        return
+    existing = (
+        sb.table("teams")
+        .select("team_id,abbrev")
+        .in_("abbrev", abbrevs)
+        .execute()
+    )
+    abbrev_to_team = {r["abbrev"]: r["team_id"] for r in (existing.data or [])}
+    for r in teams_rows:
+        existing_team_id = abbrev_to_team.get(r["abbrev"])
+        if existing_team_id and int(existing_team_id) != int(r["team_id"]):
+            r["abbrev"] = f"T{r['team_id']}"
+            r["logo_url"] = f"https://assets.nhle.com/logos/nhl/svg/T{r['team_id']}_light.svg"
+
+
+def upsert_games_and_results(sb, schedule_json: dict) -> tuple[list[dict], list[dict]]:
+    """
+    Upsert teams + games + game_results from the schedule payload ONLY.
+    Avoids any dependency on statsapi.web.nhl.com.
+    Returns the (games, game_results) rows that were upserted.
+    """
+    teams_rows, games_rows, results_rows = parse_schedule(schedule_json)
+
     # Upsert teams first (satisfies FKs)
-    if teams_by_id:
-        # Avoid unique abbrev conflicts by checking existing abbrev owners.
-        abbrevs = [r.get("abbrev") for r in teams_by_id.values() if r.get("abbrev")]
-        if abbrevs:
-            existing = (
-                sb.table("teams")
-                .select("team_id,abbrev")
-                .in_("abbrev", abbrevs)
-                .execute()
-            )
-            abbrev_to_team = {r["abbrev"]: r["team_id"] for r in (existing.data or [])}
-            for r in teams_by_id.values():
-                existing_team_id = abbrev_to_team.get(r["abbrev"])
-                if existing_team_id and int(existing_team_id) != int(r["team_id"]):
-                    r["abbrev"] = f"T{r['team_id']}"
-                    r["logo_url"] = f"https://assets.nhle.com/logos/nhl/svg/T{r['team_id']}_light.svg"
-        print(f"[teams] upserting {len(teams_by_id)}")
-        sb_exec(sb.table("teams").upsert(list(teams_by_id.values()), on_conflict="team_id"), "upsert teams")
+    if teams_rows:
+        resolve_abbrev_conflicts(sb, teams_rows)
+        print(f"[teams] upserting {len(teams_rows)}")
+        sb_exec(sb.table("teams").upsert(teams_rows, on_conflict="team_id"), "upsert teams")
 
     if games_rows:
         print(f"[games] upserting {len(games_rows)}")
@@ -328,6 +354,8 @@ def upsert_games_and_results(sb, schedule_json: dict):
         print(f"[results] upserting {len(results_rows)}")
         sb_exec(sb.table("game_results").upsert(results_rows, on_conflict="game_id"), "upsert game_results")
 
+    return games_rows, results_rows
+
 def upsert_team_directory(sb):
     """
     Populate teams table from NHL Stats API team directory (stable).
@@ -336,9 +364,7 @@ def upsert_team_directory(sb):
     now_iso = datetime.now(timezone.utc).isoformat()
     url = "https://statsapi.web.nhl.com/api/v1/teams"
 
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+    data = http_get_json(url)
 
     teams = data.get("teams", [])
     if not isinstance(teams, list) or not teams:
@@ -375,9 +401,15 @@ def fetch_gamecenter_landing(game_id: int) -> dict:
     NHL api-web gamecenter landing endpoint. Contains scoring + team stats (SOG, PIM, PP, etc.).
     """
     url = f"{API_GAMECENTER}/{int(game_id)}/landing"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return archived("landing", int(game_id), http_get_json(url), game_id=int(game_id))
+
+
+def fetch_gamecenter_play_by_play(game_id: int) -> dict:
+    """
+    NHL api-web gamecenter play-by-play endpoint. Every event with coordinates and strength state.
+    """
+    url = f"{API_GAMECENTER}/{int(game_id)}/play-by-play"
+    return archived("play_by_play", int(game_id), http_get_json(url), game_id=int(game_id))
 
 
 def _safe_int(v):
@@ -387,30 +419,25 @@ def _safe_int(v):
         return None
 
 
-def upsert_game_results_from_gamecenter(sb, game_id: int):
-    """
-    Populate game_results with richer final stats using:
-      - /gamecenter/{id}/landing (goals + final_type/gameState)
-      - /gamecenter/{id}/right-rail (teamGameStats: SOG, PIM, PP, etc.)
-    """
-    landing = fetch_gamecenter_landing(game_id)
-
-    # Only write once game is final/off
+def landing_is_final(landing: dict) -> bool:
     raw_state = (landing.get("gameState") or landing.get("gameStatus") or "").lower()
-    if raw_state not in ("final", "gameover", "off"):
-        return
+    return raw_state in ("final", "gameover", "off")
+
 
+def parse_game_results(game_id: int, landing: dict, rr: dict) -> dict:
+    """
+    game_results row from a final game's gamecenter payloads, without touching the network or the DB:
+      - landing (goals + final_type/gameState)
+      - right-rail (teamGameStats: SOG, PIM, PP, etc.)
+    """
     home = landing.get("homeTeam", {}) or {}
     away = landing.get("awayTeam", {}) or {}
 
     home_goals = _safe_int(home.get("score"))
     away_goals = _safe_int(away.get("score"))
 
-    # Pull right-rail team stats
-    rr = fetch_gamecenter_right_rail(game_id)
+    # Right-rail team stats
     team_stats = rr.get("teamGameStats") or []
-    # Optional 1-time debug (leave in until confirmed)
-    print("[right-rail categories]", [r.get("category") for r in team_stats if isinstance(r, dict)][:15])
 
     # Build category -> row map (case-insensitive)
     stats = {
@@ -470,8 +497,26 @@ def upsert_game_results_from_gamecenter(sb, game_id: int):
         "final_type": final_type,
         "updated_at": now_iso,
     }
+    return row
+
+
+def upsert_game_results_from_gamecenter(sb, game_id: int) -> dict | None:
+    """
+    Populate game_results with richer final stats from the gamecenter landing + right-rail payloads.
+    Returns the upserted row, or None while the game isn't final.
+    """
+    landing = fetch_gamecenter_landing(game_id)
+
+    # Only write once game is final/off
+    if not landing_is_final(landing):
+        return None
 
+    rr = fetch_gamecenter_right_rail(game_id)
+    # Optional 1-time debug (leave in until confirmed)
+    print("[right-rail categories]", [r.get("category") for r in (rr.get("teamGameStats") or []) if isinstance(r, dict)][:15])
+    row = parse_game_results(game_id, landing, rr)
     sb_exec(sb.table("game_results").upsert(row, on_conflict="game_id"), "upsert game_results (gamecenter)")
+    return row
 
 def _to_seconds(value):
     if value is None:
@@ -543,13 +588,11 @@ def _extract_name(v):
     return v if isinstance(v, str) else None
 
 
-def upsert_player_stats_from_boxscore(sb, game_id: int):
+def parse_boxscore(game_id: int, payload: dict) -> tuple[list[dict], list[dict]]:
     """
-    Populate players + player_game_stats from gamecenter boxscore payload.
-    Supports both api-web "playerByGameStats" and statsapi "teams" shapes.
+    (players rows, player_game_stats rows) from a gamecenter boxscore payload, without touching the
+    network or the DB. Supports both api-web "playerByGameStats" and statsapi "teams" shapes.
     """
-    payload = fetch_gamecenter_boxscore(game_id)
-
     # If game is not final, still upsert but allow future overwrites.
     now_iso = datetime.now(timezone.utc).isoformat()
 
@@ -752,10 +795,107 @@ def upsert_player_stats_from_boxscore(sb, game_id: int):
                 if isinstance(p, dict):
                     parse_statsapi_player(p, team_id, is_home)
 
+    return players_rows, stats_rows
+
+
+def upsert_player_stats_from_boxscore(sb, game_id: int) -> list[dict]:
+    """
+    Populate players + player_game_stats from gamecenter boxscore payload.
+    Returns the upserted player_game_stats rows.
+    """
+    players_rows, stats_rows = parse_boxscore(game_id, fetch_gamecenter_boxscore(game_id))
     if players_rows:
         sb_exec(sb.table("players").upsert(players_rows, on_conflict="player_id"), "upsert players")
     if stats_rows:
         sb_exec(sb.table("player_game_stats").upsert(stats_rows, on_conflict="game_id,player_id"), "upsert player_game_stats")
+    return stats_rows
+
+
+def upsert_play_by_play(sb, game_id: int) -> int:
+    """
+    Store a final game's play-by-play events (play_by_play_events + Parquet store) once.
+    Returns the number of events written (0 if already stored or not final yet).
+    """
+    # play_by_play pulls in numpy/pyarrow; only import it when the stage runs.
+    from play_by_play import ingest_play_by_play, pbp_is_final
+
+    stored = sb_exec(
+        sb.table("play_by_play_events").select("game_id").eq("game_id", int(game_id)).limit(1), "fetch play_by_play_events"
+    )
+    if stored.data:
+        return 0
+    payload = fetch_gamecenter_play_by_play(game_id)
+    if not pbp_is_final(payload):
+        return 0
+    return ingest_play_by_play(sb, int(game_id), payload)
+
+
+def flush_play_by_play():
+    """Write play-by-play buffered during the run to the Parquet store (one part per season)."""
+    from play_by_play import flush_store
+
+    n = flush_store()
+    if n:
+        print(f"[pbp] wrote {n} events to the Parquet store")
+
+
+# Per-game ingestion stages, each retried on its own through the retry queue.
+GAME_STAGES = (
+    ("game_results", upsert_game_results_from_gamecenter),
+    ("player_stats", upsert_player_stats_from_boxscore),
+    ("play_by_play", upsert_play_by_play),
+)
+
+
+def ingest_game(sb, game_id: int, ingested: dict, queue=None, stages: list[str] | None = None) -> bool:
+    """
+    Run the per-game stages, appending written rows to ingested and recording each stage's failure
+    or recovery in the retry queue. By default stages the queue has backing off or dead-lettered
+    are left alone; pass `stages` to run exactly those. Returns True if everything run succeeded.
+    """
+    if stages is None:
+        blocked = queue.blocked_stages(game_id) if queue is not None else set()
+        stages = [stage for stage, _ in GAME_STAGES if stage not in blocked]
+    ok = True
+    final = None
+    for stage, fn in GAME_STAGES:
+        if stage not in stages:
+            continue
+        if stage == "play_by_play" and final is False:
+            continue  # results just said the game isn't final; nothing to store yet
+        try:
+            out = fn(sb, game_id)
+        except Exception as e:
+            # Don't fail the whole run for one bad game payload
+            print(f"[{stage}] failed for game_id={game_id}: {e}")
+            if queue is not None:
+                queue.failed(game_id, stage, str(e))
+            ok = False
+            continue
+        if stage == "game_results":
+            final = out is not None
+            if out:
+                ingested["game_results"].append(out)
+        elif stage == "player_stats":
+            ingested["player_game_stats"].extend(out)
+        if queue is not None:
+            queue.succeeded(game_id, stage)
+    return ok
+
+
+def drain_retry_queue(sb, queue, claimer, ingested: dict) -> int:
+    """Retry due queue entries (claimed like any other game work). Returns games attempted."""
+    due = queue.due()
+    if not due:
+        return 0
+    print(f"[retry] {len(due)} game(s) due for retry")
+    attempted = 0
+    for batch in claimer.claim_batches(due):
+        done = [gid for gid in batch if ingest_game(sb, gid, ingested, queue, stages=due[gid])]
+        claimer.release(done)
+        claimer.release(set(batch) - set(done), completed=False)
+        attempted += len(batch)
+    return attempted
 
 
 def ensure_model_version(sb, model_version: str, description: str | None = None):
@@ -875,6 +1015,83 @@ def generate_poc_projections(sb, game_ids: list[int], model_version: str = "0.1.
         ), "upsert game_projection_lines")
 
 
+def run_ingestion(sb) -> dict:
+    """
+    Ingest schedule, results and player stats for yesterday..+2 and return what was written:
+    {"game_ids", "ingested_game_ids", "games", "game_results", "player_game_stats"}, so callers in
+    the same process can use the rows without reading them back. ingested_game_ids are the games
+    whose per-game rows are all in the lists; games another worker claimed, recently completed
+    or blocked in the retry queue are in game_ids only.
+    """
+    global _team_directory_refreshed_at
+    now = datetime.now(timezone.utc)
+    if _team_directory_refreshed_at is None or now - _team_directory_refreshed_at >= timedelta(hours=TEAM_DIRECTORY_TTL_HOURS):
+        try:
+            upsert_team_directory(sb)
+            _team_directory_refreshed_at = now
+        except Exception as e:
+            print(f"[teams] directory refresh failed: {e}")
+
+    # work_claims and retry_queue import this module's helpers, so they are imported at call time.
+    from retry_queue import RetryQueue
+    from work_claims import WorkClaimer
+
+    claimer = WorkClaimer(sb, "game_ingest", redo_after_seconds=GAME_INGEST_REDO_AFTER_SECONDS)
+    queue = RetryQueue(sb).load()
+
+    today = datetime.now(timezone.utc).date()
+    dates = [today + timedelta(days=i) for i in range(-1, 3)]  # yesterday..+2
+
+    all_game_ids: list[int] = []
+    # Games whose every per-game stage ran and succeeded here, so `ingested` holds all their rows.
+    ingested_game_ids: set[int] = set()
+    ingested: dict[str, list[dict]] = {"games": [], "game_results": [], "player_game_stats": []}
+
+    # Repair earlier failures first, whatever their date; games still failing stay queued.
+    drain_retry_queue(sb, queue, claimer, ingested)
+
+    for d in dates:
+        sched = fetch_schedule(d)
+
+        # extract teams from schedule JSON
+        teams = []
+
+        def scan(obj):
+            if isinstance(obj, dict):
+                if "homeTeam" in obj and isinstance(obj["homeTeam"], dict):
+                    teams.append(obj["homeTeam"])
+                if "awayTeam" in obj and isinstance(obj["awayTeam"], dict):
+                    teams.append(obj["awayTeam"])
+                for v in obj.values():
+                    scan(v)
+            elif isinstance(obj, list):
+                for v in obj:
+                    scan(v)
+
+        scan(sched)
+        upsert_teams(sb, teams)
+        games_rows, results_rows = upsert_games_and_results(sb, sched)
+        ingested["games"].extend(games_rows)
+        ingested["game_results"].extend(results_rows)
+
+        # game ids for this date from DB (more reliable than parsing)
+        g_rows = sb.table("games").select("game_id").eq("game_date", d.isoformat()).execute()
+        print(f"[games] {d.isoformat()} -> {len(g_rows.data or [])} games in DB")
+        # Backfill richer results for finals (SOG/PP/PIM/etc.), claiming games so overlapping
+        # workers split them instead of each doing all of them.
+        for batch in claimer.claim_batches(r["game_id"] for r in (g_rows.data or [])):
+            unblocked = {gid for gid in batch if not queue.blocked_stages(gid)}
+            done = [gid for gid in batch if ingest_game(sb, gid, ingested, queue)]
+            claimer.release(done)
+            claimer.release(set(batch) - set(done), completed=False)
+            ingested_game_ids.update(unblocked.intersection(done))
+
+        all_game_ids.extend([r["game_id"] for r in (g_rows.data or [])])
+
+    flush_play_by_play()
+    return {"game_ids": sorted(set(all_game_ids)), "ingested_game_ids": sorted(ingested_game_ids), **ingested}
+
+
 def main():
     print(f"[env] SUPABASE_URL={SUPABASE_URL}")
 
@@ -884,54 +1101,7 @@ def main():
     run_id = run.data[0]["run_id"] if run.data else None
 
     try:
-        try:
-            upsert_team_directory(sb)
-        except Exception as e:
-            print(f"[teams] directory refresh failed: {e}")
-
-        today = datetime.now(timezone.utc).date()
-        dates = [today + timedelta(days=i) for i in range(-1, 3)]  # yesterday..+2
-
-        all_game_ids: list[int] = []
-
-        for d in dates:
-            sched = fetch_schedule(d)
-
-            # extract teams from schedule JSON
-            teams = []
-
-            def scan(obj):
-                if isinstance(obj, dict):
-                    if "homeTeam" in obj and isinstance(obj["homeTeam"], dict):
-                        teams.append(obj["homeTeam"])
-                    if "awayTeam" in obj and isinstance(obj["awayTeam"], dict):
-                        teams.append(obj["awayTeam"])
-                    for v in obj.values():
-                        scan(v)
-                elif isinstance(obj, list):
-                    for v in obj:
-                        scan(v)
-
-            scan(sched)
-            upsert_teams(sb, teams)
-            upsert_games_and_results(sb, sched)
-
-            # game ids for this date from DB (more reliable than parsing)
-            g_rows = sb.table("games").select("game_id").eq("game_date", d.isoformat()).execute()
-            print(f"[games] {d.isoformat()} -> {len(g_rows.data or [])} games in DB")
-            # Backfill richer results for finals (SOG/PP/PIM/etc.)
-            for r in (g_rows.data or []):
-                gid = r["game_id"]
-                try:
-                    upsert_game_results_from_gamecenter(sb, gid)
-                    upsert_player_stats_from_boxscore(sb, gid)
-                except Exception as e:
-                    # Don't fail the whole run for one bad game payload
-                    print(f"[game_results] failed for game_id={gid}: {e}")
-
-            all_game_ids.extend([r["game_id"] for r in (g_rows.data or [])])
-
-        all_game_ids = sorted(set(all_game_ids))
+        all_game_ids = run_ingestion(sb)["game_ids"]
         enable_poc = os.environ.get("ENABLE_POC_PROJECTIONS") == "1"
         if all_game_ids and enable_poc:
             ensure_model_version(sb, "0.1.0")
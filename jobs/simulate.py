@@ -0,0 +1,292 @@
+"""
+Vectorized Monte Carlo game simulator for correlated markets.
+
+Draws N seeded outcomes per game from the run's goals_params (lam_home/lam_away) and player
+goal means, then prices markets that need the joint distribution: regulation vs OT results,
+puck lines, totals, team totals, player anytime goals and same-game combinations.
+
+    python jobs/simulate.py --run-id <projection_run_id> --sims 200000 --workers 4 --out sims.json
+    python jobs/simulate.py --bench
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import cast
+
+import numpy as np
+from supabase import create_client
+
+from model_pipeline import SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL, sb_exec
+
+DEFAULT_TOTAL_LINES = (5.5, 6.5)
+DEFAULT_TEAM_TOTAL_LINES = (2.5, 3.5)
+DEFAULT_SPREADS = (-1.5, 1.5)
+
+# Regular-season overtime: 5 minutes of 3v3, which scores faster than 5v5, then a shootout.
+OT_MINUTES = 5.0
+OT_RATE_MULTIPLIER = 1.6
+SHOOTOUT_HOME_WIN_PROB = 0.5
+
+BATCH_SIZE = 250_000
+
+
+def _prob(hits: int, n: int) -> dict:
+    p = hits / n if n else 0.0
+    return {"prob": p, "se": float(np.sqrt(p * (1.0 - p) / n)) if n else 0.0}
+
+
+def simulate_game(
+    lam_home: float,
+    lam_away: float,
+    n_sims: int,
+    seed: int | np.random.SeedSequence,
+    players: list[dict] | None = None,
+    total_lines: tuple[float, ...] = DEFAULT_TOTAL_LINES,
+    team_total_lines: tuple[float, ...] = DEFAULT_TEAM_TOTAL_LINES,
+    spreads: tuple[float, ...] = DEFAULT_SPREADS,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """
+    Simulate one game n_sims times in batches and return {market_key: {"prob", "se"}}.
+
+    players: [{"player_id", "is_home", "goals_mean"}]. Each team's goals (regulation plus any OT
+    winner; shootout goals are not credited) are split among its players with one multinomial draw,
+    player share goals_mean / team lambda and the remainder to unlisted skaters, so teammates never
+    outscore their team. Each player's marginal is still a binomial thinning of the team's goals.
+    Shares summing past 1 are scaled down to fit.
+    """
+    rng = np.random.default_rng(seed)
+    players = players or []
+    lam_total = lam_home + lam_away
+    p_ot_goal = 1.0 - np.exp(-lam_total * OT_RATE_MULTIPLIER * OT_MINUTES / 60.0)
+    p_ot_home = lam_home / lam_total if lam_total > 0 else 0.5
+
+    is_home_player = np.array([bool(p["is_home"]) for p in players], dtype=bool)
+    goal_means = np.array([p.get("goals_mean") or 0.0 for p in players], dtype=np.float64)
+    team_lams = np.where(is_home_player, lam_home, lam_away)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = np.clip(np.where(team_lams > 0, goal_means / team_lams, 0.0), 0.0, 1.0)
+    # Multinomial cell probabilities per side: listed players, then everyone else.
+    sides = []
+    for side in (True, False):
+        idx = np.flatnonzero(is_home_player == side)
+        side_shares = shares[idx]
+        if side_shares.sum() > 1.0:
+            side_shares = side_shares / side_shares.sum()
+        sides.append((side, idx, np.append(side_shares, max(0.0, 1.0 - side_shares.sum()))))
+
+    counts: dict[str, int] = {}
+
+    def add(key: str, mask: np.ndarray):
+        counts[key] = counts.get(key, 0) + int(np.count_nonzero(mask))
+
+    done = 0
+    while done < n_sims:
+        n = min(batch_size, n_sims - done)
+        done += n
+
+        reg_home = rng.poisson(lam_home, n)
+        reg_away = rng.poisson(lam_away, n)
+        tied = reg_home == reg_away
+
+        ot_goal = tied & (rng.random(n) < p_ot_goal)
+        ot_home_goal = ot_goal & (rng.random(n) < p_ot_home)
+        ot_away_goal = ot_goal & ~ot_home_goal
+        shootout = tied & ~ot_goal
+        so_home_win = shootout & (rng.random(n) < SHOOTOUT_HOME_WIN_PROB)
+
+        home_win = (reg_home > reg_away) | ot_home_goal | so_home_win
+        # Final scores as graded by books: the OT or shootout winner is credited one goal.
+        final_home = reg_home + (tied & home_win)
+        final_away = reg_away + (tied & ~home_win)
+        final_total = final_home + final_away
+        diff = final_home - final_away
+
+        add("moneyline:home", home_win)
+        add("moneyline:away", ~home_win)
+        add("regulation:home", reg_home > reg_away)
+        add("regulation:away", reg_away > reg_home)
+        add("regulation:tie", tied)
+        add("overtime:decided_in_ot", ot_goal)
+        add("overtime:shootout", shootout)
+        for line in spreads:
+            add(f"spread:home:{line:+g}", (diff + line) > 0)
+            add(f"spread:away:{-line:+g}", (diff + line) < 0)
+        for line in total_lines:
+            add(f"total:over:{line:g}", final_total > line)
+            add(f"total:under:{line:g}", final_total < line)
+        for line in team_total_lines:
+            add(f"team_total:home:over:{line:g}", final_home > line)
+            add(f"team_total:home:under:{line:g}", final_home < line)
+            add(f"team_total:away:over:{line:g}", final_away > line)
+            add(f"team_total:away:under:{line:g}", final_away < line)
+
+        if len(players):
+            player_goals = np.zeros((len(players), n), dtype=np.int64)
+            for side, idx, pvals in sides:
+                if len(idx):
+                    team_goals = (reg_home + ot_home_goal) if side else (reg_away + ot_away_goal)
+                    player_goals[idx] = rng.multinomial(team_goals, pvals)[:, :-1].T
+            scored = player_goals > 0
+            team_win = np.where(is_home_player[:, None], home_win[None, :], ~home_win[None, :])
+            for i, p in enumerate(players):
+                pid = int(p["player_id"])
+                add(f"player:{pid}:anytime_goal", scored[i])
+                add(f"player:{pid}:anytime_goal+team_win", scored[i] & team_win[i])
+                for line in total_lines:
+                    add(f"player:{pid}:anytime_goal+total_over:{line:g}", scored[i] & (final_total > line))
+
+    return {key: _prob(hits, n_sims) for key, hits in counts.items()}
+
+
+def _simulate_chunk(games: list[dict], n_sims: int, seed: int) -> list[dict]:
+    out: list[dict] = []
+    for g in games:
+        # Seed per game so results don't depend on how games were sharded across workers.
+        ss = np.random.SeedSequence([seed, int(g["game_id"])])
+        started = time.perf_counter()
+        markets = simulate_game(g["lam_home"], g["lam_away"], n_sims, ss, players=g.get("players"))
+        out.append(
+            {
+                "game_id": g["game_id"],
+                "n_sims": n_sims,
+                "seed": seed,
+                "seconds": round(time.perf_counter() - started, 4),
+                "markets": markets,
+            }
+        )
+    return out
+
+
+def simulate_games(games: list[dict], n_sims: int, seed: int = 0, workers: int | None = None) -> list[dict]:
+    """
+    Simulate many games across a process pool. games: [{"game_id", "lam_home", "lam_away", "players"?}].
+    """
+    if not games:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(games) == 1:
+        return _simulate_chunk(games, n_sims, seed)
+    chunks = [games[i::workers] for i in range(workers) if games[i::workers]]
+    results: list[dict] = []
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        for part in pool.map(_simulate_chunk, chunks, [n_sims] * len(chunks), [seed] * len(chunks)):
+            results.extend(part)
+    results.sort(key=lambda r: r["game_id"])
+    return results
+
+
+def load_run_inputs(sb, projection_run_id: str) -> list[dict]:
+    """
+    Build simulator inputs from a projection run: game lambdas from goals_params, player goal means
+    from player_projections.
+    """
+    gp = sb_exec(
+        sb.table("game_projections")
+        .select("game_id,home_goals_mean,away_goals_mean,goals_params")
+        .eq("projection_run_id", projection_run_id),
+        "fetch game_projections",
+    ).data or []
+    if not gp:
+        return []
+    game_ids = [int(r["game_id"]) for r in gp]
+    home_by_game = {
+        int(r["game_id"]): int(r["home_team_id"])
+        for r in (
+            sb_exec(sb.table("games").select("game_id,home_team_id").in_("game_id", game_ids), "fetch games").data or []
+        )
+    }
+    pp = sb_exec(
+        sb.table("player_projections")
+        .select("game_id,player_id,team_id,goals_mean")
+        .eq("projection_run_id", projection_run_id),
+        "fetch player_projections",
+    ).data or []
+
+    players_by_game: dict[int, list[dict]] = {}
+    for r in pp:
+        gid = int(r["game_id"])
+        if r.get("goals_mean") is None or r.get("team_id") is None or gid not in home_by_game:
+            continue
+        players_by_game.setdefault(gid, []).append(
+            {
+                "player_id": int(r["player_id"]),
+                "is_home": int(r["team_id"]) == home_by_game[gid],
+                "goals_mean": float(r["goals_mean"]),
+            }
+        )
+
+    games: list[dict] = []
+    for r in gp:
+        gid = int(r["game_id"])
+        params = r.get("goals_params") or {}
+        lam_home = params.get("lam_home", r.get("home_goals_mean"))
+        lam_away = params.get("lam_away", r.get("away_goals_mean"))
+        if lam_home is None or lam_away is None:
+            continue
+        games.append(
+            {
+                "game_id": gid,
+                "lam_home": float(lam_home),
+                "lam_away": float(lam_away),
+                "players": players_by_game.get(gid, []),
+            }
+        )
+    return games
+
+
+def bench(n_sims: int = 2_000_000, n_players: int = 0):
+    rng = np.random.default_rng(0)
+    players = [
+        {"player_id": i, "is_home": i % 2 == 0, "goals_mean": float(rng.uniform(0.05, 0.45))} for i in range(n_players)
+    ]
+    simulate_game(3.1, 2.9, 10_000, 1, players=players)  # warm-up
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    simulate_game(3.1, 2.9, n_sims, 1, players=players)
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    print(
+        f"[sim] {n_sims:,} games, {n_players} players: {wall:.3f}s wall, "
+        f"{n_sims / cpu / 1e6:.2f}M games/s per core"
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of a projection run.")
+    parser.add_argument("--run-id", help="projection_runs.run_id to simulate")
+    parser.add_argument("--sims", type=int, default=200_000, help="Simulations per game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--out", help="Write results JSON here instead of stdout")
+    parser.add_argument("--bench", action="store_true", help="Measure single-core throughput and exit")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench()
+        bench(n_sims=500_000, n_players=36)
+        return
+    if not args.run_id:
+        parser.error("--run-id is required unless --bench is given")
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    games = load_run_inputs(sb, args.run_id)
+    started = time.perf_counter()
+    results = simulate_games(games, args.sims, seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"[sim] simulated {len(results)} games x {args.sims:,} in {elapsed:.2f}s")
+
+    payload = {"projection_run_id": args.run_id, "n_sims": args.sims, "seed": args.seed, "games": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(payload, f)
+        print(f"[sim] wrote {args.out}")
+    else:
+        print(json.dumps(payload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Team rating fit: Poisson attack/defense regression over every game in the history window, with
+exponential time decay, written to team_ratings by as_of_date.
+
+    goals_for     ~ Poisson(exp(mu + home * is_home + attack[team] - defense[opp]))
+    pp_goals      ~ Poisson(pp_opps * exp(mu_pp + pp_attack[team] - pk_defense[opp]))
+    total shots   ~ Poisson(exp(mu_pace + pace[home] + pace[away]))
+
+Ratings are log-rate coefficients (0 = league average; positive defense = fewer goals allowed).
+Each model is solved by Newton/IRLS on a sparse design (a few column indices per observation),
+so the normal equations are accumulated with bincount instead of materializing the design matrix.
+A fit is warm-started from the previous as_of_date's ratings, so daily refits take a few iterations.
+
+    python jobs/team_ratings.py                                   # as of today
+    python jobs/team_ratings.py --as-of 2025-10-07 --through 2026-04-16
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import cast
+
+import numpy as np
+from supabase import create_client
+
+from model_pipeline import (
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+    TEAM_RATINGS_VERSION,
+    build_team_game_rows,
+    ensure_model_version,
+    fetch_game_results,
+    fetch_games,
+    sb_exec,
+    write_rows_chunked,
+)
+
+
+def fit_poisson_glm(
+    cols: np.ndarray,
+    vals: np.ndarray,
+    y: np.ndarray,
+    weights: np.ndarray,
+    n_params: int,
+    offset: np.ndarray | None = None,
+    ridge: np.ndarray | None = None,
+    beta0: np.ndarray | None = None,
+    max_iter: int = 50,
+    tol: float = 1e-7,
+) -> tuple[np.ndarray, int]:
+    """
+    Weighted Poisson regression with log link by Newton's method.
+
+    The design is sparse: observation o has nonzeros vals[o, a] in columns cols[o, a]. Gradient and
+    Hessian are accumulated with bincount, so each iteration costs O(n_obs * k^2 + n_params^3).
+    ridge is a per-parameter L2 penalty (it also pins the attack/defense level, which the
+    likelihood alone leaves free). Returns (beta, iterations).
+    """
+    n_obs, k = cols.shape
+    offset = np.zeros(n_obs) if offset is None else offset
+    ridge = np.zeros(n_params) if ridge is None else ridge
+    beta = np.zeros(n_params) if beta0 is None else beta0.astype(np.float64).copy()
+    flat_cols = cols.ravel()
+    pair_index = (cols[:, :, None] * n_params + cols[:, None, :]).ravel()
+    pair_vals = (vals[:, :, None] * vals[:, None, :]).reshape(n_obs, k * k)
+
+    for it in range(1, max_iter + 1):
+        lam = np.exp((beta[cols] * vals).sum(axis=1) + offset)
+        resid = weights * (y - lam)
+        grad = np.bincount(flat_cols, weights=(resid[:, None] * vals).ravel(), minlength=n_params) - ridge * beta
+        curv = (weights * lam)[:, None] * pair_vals
+        hess = np.bincount(pair_index, weights=curv.ravel(), minlength=n_params * n_params).reshape(n_params, n_params)
+        hess[np.diag_indices(n_params)] += ridge
+        step = np.linalg.solve(hess, grad)
+        beta += step
+        if np.max(np.abs(step)) < tol:
+            return beta, it
+    return beta, max_iter
+
+
+def decay_weights(game_ordinals: np.ndarray, as_of: date, half_life_days: float) -> np.ndarray:
+    age = as_of.toordinal() - game_ordinals
+    return np.power(0.5, age / half_life_days)
+
+
+def fit_team_ratings(
+    team_rows: list[dict],
+    team_ids: list[int],
+    as_of: date,
+    half_life_days: float = 60.0,
+    ridge: float = 1.0,
+    warm: dict | None = None,
+) -> dict:
+    """
+    Fit the goals, power-play and pace models on team_rows dated before as_of.
+
+    warm: a previous fit ({"team_ids", "goals", "pp", "pace"} coefficient vectors) or ratings loaded
+    from team_ratings; coefficients for teams it doesn't cover start at 0.
+    Returns {"team_ids", "goals", "pp", "pace", "iterations", "games"}.
+    """
+    n = len(team_ids)
+    slot = {tid: i for i, tid in enumerate(team_ids)}
+    rows = [
+        r
+        for r in team_rows
+        if r["game_date"] < as_of and r.get("goals_for") is not None and r["team_id"] in slot and r["opp_team_id"] in slot
+    ]
+    team = np.array([slot[r["team_id"]] for r in rows], dtype=np.int64)
+    opp = np.array([slot[r["opp_team_id"]] for r in rows], dtype=np.int64)
+    is_home = np.array([1.0 if r["is_home"] else 0.0 for r in rows])
+    w = decay_weights(np.array([r["game_date"].toordinal() for r in rows], dtype=np.int64), as_of, half_life_days)
+    ones = np.ones(len(rows))
+
+    def start(name: str, n_fixed: int, per_team: int, intercept: float) -> np.ndarray:
+        # Coefficient layout: n_fixed league terms, then per_team blocks of n team terms.
+        beta = np.zeros(n_fixed + per_team * n)
+        beta[0] = intercept
+        prev = (warm or {}).get(name)
+        if prev is None:
+            return beta
+        prev_slot = {tid: j for j, tid in enumerate(warm["team_ids"])}
+        n_prev = len(warm["team_ids"])
+        beta[:n_fixed] = prev[:n_fixed]
+        for tid, i in slot.items():
+            j = prev_slot.get(tid)
+            if j is not None:
+                for b in range(per_team):
+                    beta[n_fixed + b * n + i] = prev[n_fixed + b * n_prev + j]
+        return beta
+
+    iterations: dict[str, int] = {}
+
+    # Goals: [mu, home, attack[0..n), defense[0..n)]
+    y = np.array([float(r["goals_for"]) for r in rows])
+    cols = np.stack([np.zeros_like(team), np.ones_like(team), 2 + team, 2 + n + opp], axis=1)
+    vals = np.stack([ones, is_home, ones, -ones], axis=1)
+    penalty = np.r_[0.0, 0.0, np.full(2 * n, ridge)]
+    goals, iterations["goals"] = fit_poisson_glm(
+        cols, vals, y, w, 2 + 2 * n, ridge=penalty, beta0=start("goals", 2, 2, np.log(max(y.mean(), 1e-6)) if len(y) else 0.0)
+    )
+
+    # Power play: [mu_pp, pp_attack[0..n), pk_defense[0..n)], exposure = pp opportunities
+    opps = np.array([float(r.get("pp_opps") or 0) for r in rows])
+    m = opps > 0
+    y_pp = np.array([float(r.get("pp_goals") or 0) for r in rows])[m]
+    cols = np.stack([np.zeros(m.sum(), dtype=np.int64), 1 + team[m], 1 + n + opp[m]], axis=1)
+    vals = np.stack([ones[m], ones[m], -ones[m]], axis=1)
+    penalty = np.r_[0.0, np.full(2 * n, ridge)]
+    rate = y_pp.sum() / opps[m].sum() if m.any() else 0.2
+    pp, iterations["pp"] = fit_poisson_glm(
+        cols, vals, y_pp, w[m], 1 + 2 * n, offset=np.log(opps[m]), ridge=penalty, beta0=start("pp", 1, 2, np.log(max(rate, 1e-6)))
+    )
+
+    # Pace: total shots per game from the home row, [mu_pace, pace[0..n)]
+    h = (is_home == 1.0) & np.array([r.get("shots_for") is not None and r.get("shots_against") is not None for r in rows], dtype=bool)
+    y_shots = np.array([float((r.get("shots_for") or 0) + (r.get("shots_against") or 0)) for r in rows])[h]
+    cols = np.stack([np.zeros(h.sum(), dtype=np.int64), 1 + team[h], 1 + opp[h]], axis=1)
+    vals = np.stack([ones[h], ones[h], ones[h]], axis=1)
+    penalty = np.r_[0.0, np.full(n, ridge)]
+    pace, iterations["pace"] = fit_poisson_glm(
+        cols, vals, y_shots, w[h], 1 + n, ridge=penalty, beta0=start("pace", 1, 1, np.log(max(y_shots.mean(), 1e-6)) if h.any() else 0.0)
+    )
+
+    return {"team_ids": list(team_ids), "goals": goals, "pp": pp, "pace": pace, "iterations": iterations, "games": int(is_home.sum())}
+
+
+def ratings_rows(fit: dict, as_of: date, model_version: str, inputs_hash: str) -> list[dict]:
+    n = len(fit["team_ids"])
+    goals, pp, pace = fit["goals"], fit["pp"], fit["pace"]
+    now = datetime.now(timezone.utc).isoformat()
+    notes = json.dumps(
+        {
+            "intercepts": {"goals": float(goals[0]), "pp": float(pp[0]), "pace": float(pace[0])},
+            "iterations": fit["iterations"],
+            "games": fit["games"],
+        }
+    )
+    return [
+        {
+            "team_id": tid,
+            "model_version": model_version,
+            "as_of_date": as_of.isoformat(),
+            "generated_at": now,
+            "attack_rating": float(goals[2 + i]),
+            "defense_rating": float(goals[2 + n + i]),
+            "pp_attack_rating": float(pp[1 + i]),
+            "pk_defense_rating": float(pp[1 + n + i]),
+            "pace_rating": float(pace[1 + i]),
+            "home_ice_rating": float(goals[1]),
+            "inputs_hash": inputs_hash,
+            "notes": notes,
+        }
+        for i, tid in enumerate(fit["team_ids"])
+    ]
+
+
+def fetch_warm_start(sb, model_version: str, as_of: date) -> dict | None:
+    """Rebuild coefficient vectors from the latest team_ratings before as_of."""
+    latest = sb_exec(
+        sb.table("team_ratings")
+        .select("as_of_date")
+        .eq("model_version", model_version)
+        .lt("as_of_date", as_of.isoformat())
+        .order("as_of_date", desc=True)
+        .limit(1),
+        "fetch latest team_ratings date",
+    ).data
+    if not latest:
+        return None
+    rows = sb_exec(
+        sb.table("team_ratings")
+        .select("team_id,attack_rating,defense_rating,pp_attack_rating,pk_defense_rating,pace_rating,home_ice_rating,notes")
+        .eq("model_version", model_version)
+        .eq("as_of_date", latest[0]["as_of_date"]),
+        "fetch team_ratings",
+    ).data or []
+    if not rows:
+        return None
+    rows.sort(key=lambda r: int(r["team_id"]))
+    try:
+        intercepts = json.loads(rows[0].get("notes") or "{}").get("intercepts") or {}
+    except ValueError:
+        intercepts = {}
+
+    def col(name: str) -> list[float]:
+        return [float(r.get(name) or 0.0) for r in rows]
+
+    return {
+        "team_ids": [int(r["team_id"]) for r in rows],
+        "goals": np.array([intercepts.get("goals", 0.0), float(rows[0].get("home_ice_rating") or 0.0)] + col("attack_rating") + col("defense_rating")),
+        "pp": np.array([intercepts.get("pp", 0.0)] + col("pp_attack_rating") + col("pk_defense_rating")),
+        "pace": np.array([intercepts.get("pace", 0.0)] + col("pace_rating")),
+    }
+
+
+def inputs_hash_for(team_rows: list[dict], as_of: date, half_life_days: float, history_days: int) -> str:
+    used = [r for r in team_rows if r["game_date"] < as_of]
+    last = max((r["game_date"] for r in used), default=None)
+    key = f"{len(used)}|{last}|{as_of}|{half_life_days}|{history_days}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit team ratings and write team_ratings.")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="First as_of_date to fit (default today)")
+    parser.add_argument("--through", type=date.fromisoformat, default=None, help="Fit every day from --as-of through this date")
+    parser.add_argument("--half-life-days", type=float, default=float(os.environ.get("RATING_HALF_LIFE_DAYS", "60")))
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--ridge", type=float, default=float(os.environ.get("RATING_RIDGE", "1.0")))
+    parser.add_argument("--model-version", default=TEAM_RATINGS_VERSION)
+    args = parser.parse_args()
+
+    first = args.as_of or datetime.now(timezone.utc).date()
+    last = args.through or first
+    if last < first:
+        parser.error("--through must be on or after --as-of")
+
+    sb = create_client(cast(str, SUPABASE_URL), cast(str, SUPABASE_SERVICE_ROLE_KEY))
+    # Ratings are an input to projection models, not a model the pipeline scores, so not active.
+    ensure_model_version(sb, args.model_version, "Poisson attack/defense team ratings", is_active=False)
+
+    games = fetch_games(sb, first - timedelta(days=args.history_days), last - timedelta(days=1))
+    results = fetch_game_results(sb, [g["game_id"] for g in games])
+    team_rows = build_team_game_rows(games, results)
+    team_ids = sorted({int(r["team_id"]) for r in team_rows} | {int(r["opp_team_id"]) for r in team_rows})
+    if not team_ids:
+        print("[ratings] no completed games in the history window")
+        return
+    print(f"[ratings] {len(team_rows)} team-games, {len(team_ids)} teams")
+
+    warm = fetch_warm_start(sb, args.model_version, first)
+    day = first
+    rows: list[dict] = []
+    while day <= last:
+        window_rows = [r for r in team_rows if r["game_date"] >= day - timedelta(days=args.history_days)]
+        started = time.perf_counter()
+        fit = fit_team_ratings(window_rows, team_ids, day, args.half_life_days, args.ridge, warm=warm)
+        print(
+            f"[ratings] {day}: {fit['games']} games, iterations {fit['iterations']} "
+            f"({'warm' if warm else 'cold'}, {time.perf_counter() - started:.3f}s)"
+        )
+        rows.extend(
+            ratings_rows(fit, day, args.model_version, inputs_hash_for(window_rows, day, args.half_life_days, args.history_days))
+        )
+        warm = fit
+        day += timedelta(days=1)
+
+    write = write_rows_chunked(sb, "team_ratings", rows, on_conflict="team_id,model_version,as_of_date")
+    print(f"[ratings] wrote {write['rows'] - write['failed_rows']}/{write['rows']} team_ratings rows")
+    if write["failed_rows"]:
+        raise RuntimeError(f"[ratings] {write['failed_rows']} team_ratings rows failed to write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Lease-based game claiming (work_claims table + claim_work/heartbeat_work/release_work functions,
+see migrations/20261019_work_claims.sql), so overlapping ingestion runs on any number of processes
+or machines split games between them instead of each fetching and writing every game.
+
+Workers claim games in batches with a lease (WORK_CLAIM_LEASE_SECONDS). A background thread
+heartbeats the lease on everything still held; a worker that dies stops heartbeating and its games
+become claimable once the lease expires. Completed games are not redone by anyone for
+redo_after_seconds; failed games are released immediately for any worker to retry.
+
+Set WORK_CLAIMS=0 to run without claiming (single worker, e.g. before the migration is applied).
+"""
+import os
+import socket
+import threading
+import uuid
+from typing import Iterable, Iterator
+
+from run_jobs import sb_exec
+
+WORK_CLAIMS_ENABLED = os.environ.get("WORK_CLAIMS", "1") != "0"
+WORK_CLAIM_LEASE_SECONDS = int(os.environ.get("WORK_CLAIM_LEASE_SECONDS", "300"))
+WORK_CLAIM_BATCH_SIZE = int(os.environ.get("WORK_CLAIM_BATCH_SIZE", "8"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WorkClaimer:
+    def __init__(
+        self,
+        sb,
+        task: str,
+        worker_id: str | None = None,
+        lease_seconds: int = WORK_CLAIM_LEASE_SECONDS,
+        redo_after_seconds: int = 0,
+        enabled: bool = WORK_CLAIMS_ENABLED,
+    ):
+        self.sb = sb
+        self.task = task
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.redo_after_seconds = redo_after_seconds
+        self.enabled = enabled
+        self.held: set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _rpc(self, name: str, params: dict) -> list[int]:
+        rows = sb_exec(self.sb.rpc(name, params), f"{name} {self.task}").data or []
+        # SETOF bigint comes back as bare values or as {"<function>": value} depending on version.
+        return [int(r[name] if isinstance(r, dict) else r) for r in rows]
+
+    def claim(self, game_ids: Iterable[int]) -> list[int]:
+        """Claim what is available of game_ids; returns the ids this worker now holds."""
+        ids = sorted({int(g) for g in game_ids})
+        if not ids:
+            return []
+        if not self.enabled:
+            return ids
+        claimed = self._rpc(
+            "claim_work",
+            {
+                "p_task": self.task,
+                "p_game_ids": ids,
+                "p_worker": self.worker_id,
+                "p_lease_seconds": self.lease_seconds,
+                "p_redo_after_seconds": self.redo_after_seconds,
+            },
+        )
+        with self._lock:
+            self.held.update(claimed)
+        if claimed:
+            self._ensure_heartbeat()
+        return sorted(claimed)
+
+    def release(self, game_ids: Iterable[int], completed: bool = True):
+        ids = sorted({int(g) for g in game_ids})
+        if not ids or not self.enabled:
+            return
+        with self._lock:
+            self.held.difference_update(ids)
+        self._rpc(
+            "release_work",
+            {"p_task": self.task, "p_game_ids": ids, "p_worker": self.worker_id, "p_completed": completed},
+        )
+
+    def heartbeat(self) -> list[int]:
+        """Extend the lease on held games; drops any this worker has lost (lease expired and reclaimed)."""
+        with self._lock:
+            ids = sorted(self.held)
+        if not ids:
+            return []
+        still = set(
+            self._rpc(
+                "heartbeat_work",
+                {"p_task": self.task, "p_game_ids": ids, "p_worker": self.worker_id, "p_lease_seconds": self.lease_seconds},
+            )
+        )
+        lost = set(ids) - still
+        if lost:
+            print(f"[claims] {self.task}: lost lease on {len(lost)} game(s): {sorted(lost)}")
+            with self._lock:
+                self.held.difference_update(lost)
+        return sorted(still)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            if not self._stop.is_set():
+                return
+            self._heartbeat.join()  # stopping after close(); start a fresh one
+
+        def loop():
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    print(f"[claims] {self.task}: heartbeat failed: {e}")
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=loop, name=f"claims-heartbeat-{self.task}", daemon=True)
+        self._heartbeat.start()
+
+    def claim_batches(self, game_ids: Iterable[int], batch_size: int = WORK_CLAIM_BATCH_SIZE) -> Iterator[list[int]]:
+        """
+        Yield batches of claimed games from game_ids, skipping games other workers hold. The caller
+        releases each game as it finishes; anything still held when iteration stops (including on
+        an exception) is released as not completed.
+        """
+        ids = sorted({int(g) for g in game_ids})
+        skipped = 0
+        try:
+            for i in range(0, len(ids), batch_size):
+                chunk = ids[i : i + batch_size]
+                claimed = self.claim(chunk)
+                skipped += len(chunk) - len(claimed)
+                if claimed:
+                    yield claimed
+        finally:
+            self.close()
+            if skipped:
+                print(f"[claims] {self.task}: {skipped} game(s) held or recently done by other workers")
+
+    def close(self):
+        """Stop heartbeating and release anything still held as not completed."""
+        self._stop.set()
+        with self._lock:
+            leftover = sorted(self.held)
+        if leftover:
+            self.release(leftover, completed=False)
@@ -0,0 +1,40 @@
+-- Retry queue for per-game ingestion stages that failed (gamecenter results, boxscore player stats).
+-- NOTE: This file is for review/migration planning only.
+--
+-- One row per (game_id, stage) while the stage is failing. Runs drain rows whose next_attempt_at
+-- has passed, with exponential backoff between attempts; after the max attempts the row is kept
+-- with status 'dead' (the dead-letter list) until requeued. Rows are deleted once the stage succeeds.
+
+CREATE TABLE IF NOT EXISTS public.ingest_retry_queue (
+  game_id bigint NOT NULL,
+  stage text NOT NULL,
+  status text NOT NULL DEFAULT 'pending',
+  attempts integer NOT NULL DEFAULT 1,
+  last_error text,
+  first_failed_at timestamp with time zone NOT NULL DEFAULT now(),
+  last_failed_at timestamp with time zone NOT NULL DEFAULT now(),
+  next_attempt_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT ingest_retry_queue_pkey PRIMARY KEY (game_id, stage),
+  CONSTRAINT ingest_retry_queue_game_id_fkey FOREIGN KEY (game_id) REFERENCES public.games(game_id),
+  CONSTRAINT ingest_retry_queue_stage_check CHECK (stage IN ('game_results', 'player_stats')),
+  CONSTRAINT ingest_retry_queue_status_check CHECK (status IN ('pending', 'dead'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_retry_queue_due
+  ON public.ingest_retry_queue (next_attempt_at)
+  WHERE status = 'pending';
+
+ALTER TABLE public.ingest_retry_queue ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'ingest_retry_queue' AND policyname = 'select_authenticated_ingest_retry_queue'
+  ) THEN
+    CREATE POLICY select_authenticated_ingest_retry_queue
+      ON public.ingest_retry_queue
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
@@ -0,0 +1,7 @@
+-- Dedupe key for streamed market_lines ingestion (one row per book snapshot of a line).
+-- NULLS NOT DISTINCT so moneyline rows (no line_value_key/team/player/prop) still dedupe. Requires Postgres 15+.
+-- NOTE: This file is for review/migration planning only.
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_market_lines_snapshot
+  ON public.market_lines (game_id, book, market, side, line_value_key, as_of, team_id, player_id, prop)
+  NULLS NOT DISTINCT;
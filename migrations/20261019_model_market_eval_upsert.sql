@@ -0,0 +1,5 @@
+-- One evaluation per (projection run, market line) so market_eval reruns upsert instead of duplicating.
+-- NOTE: This file is for review/migration planning only.
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_model_market_eval_run_line
+  ON public.model_market_eval (projection_run_id, market_line_id);
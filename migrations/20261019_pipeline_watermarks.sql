@@ -0,0 +1,11 @@
+-- Indexes behind the model pipeline's watermark pre-check (single-row max lookups).
+-- NOTE: This file is for review/migration planning only.
+
+CREATE INDEX IF NOT EXISTS idx_game_results_updated_at
+  ON public.game_results (updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_player_game_stats_updated_at
+  ON public.player_game_stats (updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_ingestion_runs_status_finished_at
+  ON public.ingestion_runs (status, finished_at DESC);
+CREATE INDEX IF NOT EXISTS idx_projection_runs_model_generated_at
+  ON public.projection_runs (model_version, generated_at DESC);
@@ -0,0 +1,54 @@
+-- Play-by-play events decoded from the gamecenter play-by-play endpoint (jobs/play_by_play.py).
+-- NOTE: This file is for review/migration planning only.
+--
+-- Codes are small integers (see EVENT_TYPES, PERIOD_TYPES, ZONES, SHOT_TYPES in play_by_play.py);
+-- situation_code is the NHL four-digit strength code (away goalie, away skaters, home skaters,
+-- home goalie), e.g. 1551 for 5v5.
+
+CREATE TABLE IF NOT EXISTS public.play_by_play_events (
+  game_id bigint NOT NULL,
+  event_id integer NOT NULL,
+  season integer NOT NULL,
+  sort_order smallint NOT NULL,
+  period smallint NOT NULL,
+  period_type smallint NOT NULL,
+  period_seconds smallint NOT NULL,
+  event_type smallint NOT NULL,
+  zone smallint NOT NULL DEFAULT 0,
+  x real,
+  y real,
+  situation_code smallint NOT NULL DEFAULT -1,
+  home_skaters smallint NOT NULL DEFAULT -1,
+  away_skaters smallint NOT NULL DEFAULT -1,
+  team_id integer,
+  is_home boolean NOT NULL DEFAULT false,
+  player_id bigint,
+  goalie_id bigint,
+  shot_type smallint NOT NULL DEFAULT 0,
+  created_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT play_by_play_events_pkey PRIMARY KEY (game_id, event_id),
+  CONSTRAINT play_by_play_events_game_id_fkey FOREIGN KEY (game_id) REFERENCES public.games(game_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_play_by_play_events_season_type
+  ON public.play_by_play_events (season, event_type);
+
+ALTER TABLE public.play_by_play_events ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'play_by_play_events' AND policyname = 'select_authenticated_play_by_play_events'
+  ) THEN
+    CREATE POLICY select_authenticated_play_by_play_events
+      ON public.play_by_play_events
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
+
+-- play_by_play is a per-game ingestion stage with its own retry queue entries.
+ALTER TABLE public.ingest_retry_queue DROP CONSTRAINT IF EXISTS ingest_retry_queue_stage_check;
+ALTER TABLE public.ingest_retry_queue
+  ADD CONSTRAINT ingest_retry_queue_stage_check CHECK (stage IN ('game_results', 'player_stats', 'play_by_play'));
@@ -0,0 +1,39 @@
+-- Player prop ladders: model over/under probabilities per projection run, player, prop and line.
+-- NOTE: This file is for review/migration planning only.
+
+CREATE TABLE IF NOT EXISTS public.player_prop_lines (
+  projection_run_id uuid NOT NULL,
+  game_id bigint NOT NULL,
+  player_id integer NOT NULL,
+  prop text NOT NULL,
+  line_value_key integer NOT NULL,
+  line_value numeric NOT NULL,
+  over_prob real NOT NULL,
+  under_prob real NOT NULL,
+  dist text,
+  model_version text,
+  CONSTRAINT player_prop_lines_pkey PRIMARY KEY (projection_run_id, game_id, player_id, prop, line_value_key),
+  CONSTRAINT player_prop_lines_run_id_fkey FOREIGN KEY (projection_run_id) REFERENCES public.projection_runs(run_id),
+  CONSTRAINT player_prop_lines_game_id_fkey FOREIGN KEY (game_id) REFERENCES public.games(game_id),
+  CONSTRAINT player_prop_lines_prob_chk CHECK (
+    over_prob >= 0 AND over_prob <= 1 AND under_prob >= 0 AND under_prob <= 1
+  )
+);
+
+CREATE INDEX IF NOT EXISTS idx_player_prop_lines_game_player
+  ON public.player_prop_lines (game_id, player_id, prop);
+
+ALTER TABLE public.player_prop_lines ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'player_prop_lines' AND policyname = 'select_authenticated_player_prop_lines'
+  ) THEN
+    CREATE POLICY select_authenticated_player_prop_lines
+      ON public.player_prop_lines
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
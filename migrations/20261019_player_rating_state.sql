@@ -0,0 +1,65 @@
+-- Running aggregates behind player_ratings (jobs/player_ratings.py).
+-- NOTE: This file is for review/migration planning only.
+--
+-- player_rating_state holds one row per player and model_version: current-season totals (totals)
+-- and the last N game lines (recent), both keyed by stat name. last_game_id is the newest game
+-- folded in; games arriving in game_id order are added to the sums, anything older rebuilds the
+-- player. player_rating_watermarks records the latest player_game_stats.updated_at already folded.
+
+CREATE TABLE IF NOT EXISTS public.player_rating_state (
+  player_id integer NOT NULL,
+  model_version text NOT NULL,
+  season integer NOT NULL,
+  last_game_id bigint NOT NULL,
+  team_id integer,
+  position text,
+  is_goalie boolean NOT NULL DEFAULT false,
+  games integer NOT NULL DEFAULT 0,
+  totals jsonb NOT NULL DEFAULT '{}'::jsonb,
+  recent jsonb NOT NULL DEFAULT '[]'::jsonb,
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT player_rating_state_pkey PRIMARY KEY (player_id, model_version),
+  CONSTRAINT player_rating_state_player_id_fkey FOREIGN KEY (player_id) REFERENCES public.players(player_id),
+  CONSTRAINT player_rating_state_model_version_fkey FOREIGN KEY (model_version) REFERENCES public.model_versions(model_version)
+);
+
+CREATE TABLE IF NOT EXISTS public.player_rating_watermarks (
+  model_version text NOT NULL,
+  stats_updated_at timestamp with time zone NOT NULL,
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT player_rating_watermarks_pkey PRIMARY KEY (model_version),
+  CONSTRAINT player_rating_watermarks_model_version_fkey FOREIGN KEY (model_version) REFERENCES public.model_versions(model_version)
+);
+
+-- Latest as_of_date per player for consumers reading current ratings.
+CREATE INDEX IF NOT EXISTS idx_player_ratings_model_player_as_of
+  ON public.player_ratings (model_version, player_id, as_of_date DESC);
+
+ALTER TABLE public.player_rating_state ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.player_rating_watermarks ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'player_rating_state' AND policyname = 'select_authenticated_player_rating_state'
+  ) THEN
+    CREATE POLICY select_authenticated_player_rating_state
+      ON public.player_rating_state
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'player_rating_watermarks' AND policyname = 'select_authenticated_player_rating_watermarks'
+  ) THEN
+    CREATE POLICY select_authenticated_player_rating_watermarks
+      ON public.player_rating_watermarks
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
@@ -0,0 +1,10 @@
+-- Per-run write outcomes and timings for projection_runs.
+-- NOTE: This file is for review/migration planning only.
+
+ALTER TABLE public.projection_runs
+  ADD COLUMN IF NOT EXISTS finished_at timestamp with time zone;
+ALTER TABLE public.projection_runs
+  ADD COLUMN IF NOT EXISTS message text;
+-- Run metrics, e.g. {"writes": [{"table": ..., "rows": ..., "failed_rows": ..., "chunks": [...]}]}
+ALTER TABLE public.projection_runs
+  ADD COLUMN IF NOT EXISTS metrics jsonb;
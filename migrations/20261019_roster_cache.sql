@@ -0,0 +1,30 @@
+-- Roster cache for the model pipeline (one snapshot per team/season/day).
+-- NOTE: This file is for review/migration planning only.
+
+CREATE TABLE IF NOT EXISTS public.rosters (
+  team_id integer NOT NULL,
+  season text NOT NULL,
+  fetched_date date NOT NULL,
+  fetched_at timestamp with time zone NOT NULL DEFAULT now(),
+  player_ids integer[] NOT NULL DEFAULT '{}',
+  CONSTRAINT rosters_pkey PRIMARY KEY (team_id, season, fetched_date),
+  CONSTRAINT rosters_team_id_fkey FOREIGN KEY (team_id) REFERENCES public.teams(team_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rosters_fetched_at
+  ON public.rosters (team_id, season, fetched_at DESC);
+
+ALTER TABLE public.rosters ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'rosters' AND policyname = 'select_authenticated_rosters'
+  ) THEN
+    CREATE POLICY select_authenticated_rosters
+      ON public.rosters
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
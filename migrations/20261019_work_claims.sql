@@ -0,0 +1,102 @@
+-- Lease-based work claims so several ingestion workers can share games without double work.
+-- NOTE: This file is for review/migration planning only.
+--
+-- A claim row per (task, game_id). A worker may claim a game when nobody holds it, the holder's
+-- lease expired (crashed worker), the holder is itself, or the last completion is older than
+-- p_redo_after_seconds. Claiming, heartbeating and releasing go through the functions below so
+-- each is a single atomic statement.
+
+CREATE TABLE IF NOT EXISTS public.work_claims (
+  task text NOT NULL,
+  game_id bigint NOT NULL,
+  worker_id text NOT NULL,
+  claimed_at timestamp with time zone NOT NULL DEFAULT now(),
+  heartbeat_at timestamp with time zone NOT NULL DEFAULT now(),
+  lease_expires_at timestamp with time zone NOT NULL,
+  completed_at timestamp with time zone,
+  attempts integer NOT NULL DEFAULT 1,
+  CONSTRAINT work_claims_pkey PRIMARY KEY (task, game_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_work_claims_worker
+  ON public.work_claims (worker_id)
+  WHERE completed_at IS NULL;
+
+ALTER TABLE public.work_claims ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'work_claims' AND policyname = 'select_authenticated_work_claims'
+  ) THEN
+    CREATE POLICY select_authenticated_work_claims
+      ON public.work_claims
+      FOR SELECT TO authenticated
+      USING (true);
+  END IF;
+END $$;
+
+-- Claim whichever of p_game_ids are available; returns the game_ids now held by p_worker.
+CREATE OR REPLACE FUNCTION public.claim_work(
+  p_task text,
+  p_game_ids bigint[],
+  p_worker text,
+  p_lease_seconds integer DEFAULT 300,
+  p_redo_after_seconds integer DEFAULT 0
+) RETURNS SETOF bigint
+LANGUAGE sql
+AS $$
+  INSERT INTO public.work_claims AS c (task, game_id, worker_id, claimed_at, heartbeat_at, lease_expires_at)
+  SELECT p_task, g.game_id, p_worker, now(), now(), now() + make_interval(secs => p_lease_seconds)
+  FROM unnest(p_game_ids) AS g(game_id)
+  ON CONFLICT (task, game_id) DO UPDATE
+    SET worker_id = EXCLUDED.worker_id,
+        claimed_at = now(),
+        heartbeat_at = now(),
+        lease_expires_at = EXCLUDED.lease_expires_at,
+        completed_at = NULL,
+        attempts = c.attempts + 1
+    WHERE (c.completed_at IS NULL AND (c.lease_expires_at < now() OR c.worker_id = p_worker))
+       OR (c.completed_at IS NOT NULL AND c.completed_at < now() - make_interval(secs => p_redo_after_seconds))
+  RETURNING c.game_id;
+$$;
+
+-- Extend the lease on games still held by p_worker; returns the game_ids still held.
+CREATE OR REPLACE FUNCTION public.heartbeat_work(
+  p_task text,
+  p_game_ids bigint[],
+  p_worker text,
+  p_lease_seconds integer DEFAULT 300
+) RETURNS SETOF bigint
+LANGUAGE sql
+AS $$
+  UPDATE public.work_claims
+  SET heartbeat_at = now(),
+      lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+  WHERE task = p_task
+    AND game_id = ANY (p_game_ids)
+    AND worker_id = p_worker
+    AND completed_at IS NULL
+  RETURNING game_id;
+$$;
+
+-- Release games held by p_worker: completed ones are stamped (and not redone for
+-- p_redo_after_seconds), failed ones have their lease expired so any worker can retry them.
+CREATE OR REPLACE FUNCTION public.release_work(
+  p_task text,
+  p_game_ids bigint[],
+  p_worker text,
+  p_completed boolean DEFAULT true
+) RETURNS SETOF bigint
+LANGUAGE sql
+AS $$
+  UPDATE public.work_claims
+  SET completed_at = CASE WHEN p_completed THEN now() ELSE NULL END,
+      lease_expires_at = now()
+  WHERE task = p_task
+    AND game_id = ANY (p_game_ids)
+    AND worker_id = p_worker
+    AND completed_at IS NULL
+  RETURNING game_id;
+$$;